@@ -11,70 +11,196 @@ import re
 import sys
 import time
 import json
+import math
 import uuid
-import mutagen
+import heapq
+import base64
+import random
+import itertools
 import platform
+import shutil
 import hashlib
+import bisect
+import statistics
+import atexit
 import logging
+import logging.handlers
+import importlib
+import importlib.util
 import threading
 import subprocess
 import webbrowser
+import contextlib
+import contextvars
 import configparser
 import colorama
-from queue import Queue, Empty
+from queue import Empty, Full, Queue, SimpleQueue
+from collections import deque
 from datetime import datetime
+from urllib.parse import urlparse, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from colorama import init, Fore, Back, Style
 
-try:
-    import requests
-    import requests.exceptions
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "requests"])
-    import requests
-    import requests.exceptions
-
-try:
-    import spotipy
-    from spotipy.oauth2 import SpotifyClientCredentials
-    import spotipy.exceptions
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "spotipy"])
-    import spotipy
-    from spotipy.oauth2 import SpotifyClientCredentials
-    import spotipy.exceptions
-
-try:
-    import yt_dlp
-    import yt_dlp.utils
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "yt-dlp"])
-    import yt_dlp
-    import yt_dlp.utils
-
-try:
-    from colorama import init, Fore, Back, Style
-    init()
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "colorama"])
-    from colorama import init, Fore, Style
-    init()
-
-try:
-    from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TDRC, TRCK, TCON, USLT
-    from mutagen.mp3 import MP3
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "mutagen"])
-    from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TDRC, TRCK, TCON, USLT
-    from mutagen.mp3 import MP3
+init()
+
+class MissingDependencyError(ImportError):
+    pass
+
+class LazyModule:
+    # Stands in for a heavy dependency until an attribute is first used, so
+    # --version, --status and the menus start without importing it
+    def __init__(self, name, pip_name=None):
+        self._name = name
+        self._pip_name = pip_name or name.split('.')[0]
+        self._module = None
+        
+    def _load(self):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError as e:
+                raise MissingDependencyError(f"{self._name} is not installed, run: pip install {self._pip_name}") from e
+                
+        return self._module
+        
+    def available(self):
+        if self._module is not None:
+            return True
+            
+        try:
+            return importlib.util.find_spec(self._name.split('.')[0]) is not None
+        except (ImportError, ValueError):
+            return False
+            
+    def loaded(self):
+        # Cheap check for isinstance tests: an exception type can only have
+        # been raised if its module was imported
+        return self._module is not None or self._name in sys.modules
+        
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+asyncio = LazyModule('asyncio')
+requests = LazyModule('requests')
+spotipy = LazyModule('spotipy')
+yt_dlp = LazyModule('yt_dlp', 'yt-dlp')
+mutagen = LazyModule('mutagen')
+mutagen_id3 = LazyModule('mutagen.id3', 'mutagen')
+mutagen_mp3 = LazyModule('mutagen.mp3', 'mutagen')
+mutagen_mp4 = LazyModule('mutagen.mp4', 'mutagen')
+mutagen_flac = LazyModule('mutagen.flac', 'mutagen')
+mutagen_oggopus = LazyModule('mutagen.oggopus', 'mutagen')
+aiohttp = LazyModule('aiohttp')
 
 VERSION = "1.0.0"
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".spotifx")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.ini")
 CREDENTIALS_FILE = os.path.join(CONFIG_DIR, "credentials.json")
 DATABASE_FILE = os.path.join(CONFIG_DIR, "database.json")
+DB_SAVE_INTERVAL = 1.0
+LIBRARY_FILE = os.path.join(CONFIG_DIR, "library.json")
+LOUDNESS_FILE = os.path.join(CONFIG_DIR, "loudness.json")
+METRICS_FILE = os.path.join(CONFIG_DIR, "metrics.json")
+PROFILES_DIR = os.path.join(CONFIG_DIR, "profiles")
+LOG_FILE = os.path.join(CONFIG_DIR, "spotifx.log")
 CACHE_DIR = os.path.join(CONFIG_DIR, "cache")
 DEFAULT_DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "SpotiFX_Downloads")
 MAX_RETRY_COUNT = 3
 DEFAULT_TIMEOUT = 30
+JOB_LEASE_SECONDS = 300
+LEASE_CHECK_INTERVAL = 30
+PRIORITY_LEVELS = {'high': 0, 'normal': 1, 'low': 2}
+DEFAULT_PRIORITY = 'normal'
+JOB_TIME_SLICE = 10
+RETRY_BASE_DELAY = 5
+RATE_LIMIT_BASE_DELAY = 60
+RETRY_MAX_DELAY = 900
+
+ERROR_TRANSIENT = 'transient'
+ERROR_RATE_LIMIT = 'rate_limit'
+ERROR_NO_MATCH = 'no_match'
+ERROR_PERMANENT = 'permanent'
+RETRYABLE_ERRORS = (ERROR_TRANSIENT, ERROR_RATE_LIMIT)
+TERMINAL_STATUSES = ('completed', 'failed', 'canceled')
+CANCELABLE_STATUSES = ('pending', 'retrying', 'downloading')
+TRANSIENT_ERROR_MARKERS = (
+    'timed out', 'timeout', 'connection reset', 'connection aborted', 'connection refused',
+    'temporary failure', 'name resolution', 'incompleteread', 'incomplete read',
+    'remote end closed', 'http error 5', 'unable to download webpage', 'read error'
+)
+RATE_LIMIT_MARKERS = ('429', 'too many requests', 'rate limit', 'rate-limit')
+AUTOSCALE_INTERVAL = 30
+AUTOSCALE_DECREASE_FACTOR = 0.5
+CPU_SATURATION_THRESHOLD = 0.9
+
+PREFETCH_DEPTH = 5
+PREFETCH_WORKERS = 2
+PREFETCH_INTERVAL = 0.5
+
+BATCH_CHUNK_SIZE = 500
+BATCH_FLUSH_SECONDS = 1.0
+SPOTIFY_URL_PATTERN = re.compile(r'(?:open\.spotify\.com/(?:intl-[a-zA-Z-]+/)?|spotify:)(track|album|playlist)[/:]([a-zA-Z0-9]+)')
+
+STAGE_METRIC = 'spotifx_stage_seconds'
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PROFILE_SNAPSHOT_INTERVAL = 60
+PROFILE_FLUSH_INTERVAL = 30
+PROFILE_TRACEMALLOC_FRAMES = 10
+# cProfile sits on the process-wide sys.monitoring slot from 3.12 on, so only
+# one profiler can be enabled at a time there
+PROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+LOG_MAX_SIZE_MB = 10
+LOG_BACKUP_COUNT = 5
+
+PROGRESS_FIELDS = {'status', 'progress', 'note', 'error'}
+PROGRESS_FLUSH_INTERVAL = 0.5
+STATUS_EVENTS = {'pending': 'queued', 'downloading': 'started'}
+
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8765
+DAEMON_CLIENT_TIMEOUT = 5
+SSE_KEEPALIVE = 15
+SSE_BACKLOG = 1000
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+API_ITEM_FIELDS = ('id', 'type', 'spotify_id', 'status', 'progress', 'priority', 'source', 'note', 'error',
+                   'track_name', 'artist_name', 'album_name', 'playlist_name', 'added_at', 'completed_at')
+
+ENGINE_THREADS = 'threads'
+ENGINE_ASYNCIO = 'asyncio'
+ASYNC_SEARCH_THREADS = 8
+
+AUDIO_FORMATS = ('mp3', 'm4a', 'opus', 'flac')
+FFMPEG_COVER_FORMATS = ('mp3', 'm4a', 'flac')
+TAGGING_FFMPEG = 'ffmpeg'
+TAGGING_MUTAGEN = 'mutagen'
+
+NORMALIZE_REPLAYGAIN = 'replaygain'
+NORMALIZE_LOUDNORM = 'loudnorm'
+DEFAULT_LOUDNESS_TARGET = -18.0
+LOUDNORM_TRUE_PEAK = -1.5
+LOUDNORM_LRA = 11
+
+BANDWIDTH_BURST_SECONDS = 1.0
+BANDWIDTH_SCHEDULE_CHECK = 30
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+YOUTUBE_HOST = 'youtube.com'
+
+HEDGE_OFF = 'off'
+HEDGE_RESTART = 'restart'
+HEDGE_ALTERNATE = 'alternate'
+HEDGE_GRACE_SECONDS = 5
+HEDGE_SLOW_FACTOR = 0.25
+HEDGE_MIN_SAMPLES = 5
+HEDGE_RATE_WINDOW = 50
+HEDGE_ALTERNATES = 2
+HEDGE_HOST_SLOTS = 1
+SOCKET_TIMEOUT = 30
+
+RESOLVED_INFO_TTL = 1800
+RESOLVED_INFO_MARGIN = 120
+RESOLVED_INFO_LIMIT = 256
 
 LOGO_ASCII = """
 ▒█▀▀▀█ █▀▀█ █▀▀█ ▀▀█▀▀ ░▀░ █▀▀ ▀▄▒▄▀
@@ -82,42 +208,145 @@ LOGO_ASCII = """
 ▒█▄▄▄█ █▀▀▀ ▀▀▀▀ ░░▀░░ ▀▀▀ ▀░░ ▄▀▒▀▄
 """
 
+# Job the current thread or asyncio task is working on, attached to every
+# log record so the JSON log can be filtered per download
+log_job = contextvars.ContextVar('log_job', default=None)
+
+class ConsoleHandler(logging.StreamHandler):
+    # Colors are added here, at the console sink, and only for terminals
+    LEVEL_COLORS = {
+        logging.DEBUG: Fore.CYAN,
+        logging.INFO: Fore.GREEN,
+        logging.WARNING: Fore.YELLOW,
+        logging.ERROR: Fore.RED,
+        logging.CRITICAL: Fore.RED
+    }
+    
+    def format(self, record):
+        isatty = getattr(self.stream, 'isatty', None)
+        if not (isatty and isatty()):
+            return super().format(record)
+            
+        timestamp = self.formatter.formatTime(record, self.formatter.datefmt)
+        color = self.LEVEL_COLORS.get(record.levelno, '')
+        
+        return f"{Fore.CYAN}{timestamp}{Style.RESET_ALL} - {record.levelname} - {color}{record.getMessage()}{Style.RESET_ALL}"
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        
+        job_id = getattr(record, 'job_id', None)
+        if job_id:
+            entry['job_id'] = job_id
+            
+        return json.dumps(entry, ensure_ascii=False)
+
+# Callers only put records on a queue; one listener thread writes them to the
+# console and the rotating JSON log, so workers never block on handler locks
+# or disk I/O while logging
 class Logger:
     def __init__(self):
         self.logger = logging.getLogger("SpotiFX")
         self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
         
-        formatter = logging.Formatter(
-            f"{Fore.CYAN}%(asctime)s{Style.RESET_ALL} - %(levelname)s - %(message)s",
-            "%Y-%m-%d %H:%M:%S"
-        )
+        self.console_handler = ConsoleHandler(sys.stdout)
+        self.console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", "%Y-%m-%d %H:%M:%S"))
+        self.file_handler = self._file_handler()
         
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        self.queue = SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(self.queue))
+        self.listener = None
+        self._start_listener()
         
-        os.makedirs(CONFIG_DIR, exist_ok=True)
+        atexit.register(self.stop)
+        
+    def _file_handler(self, rotation='size', max_size_mb=LOG_MAX_SIZE_MB, backup_count=LOG_BACKUP_COUNT):
         try:
-            file_handler = logging.FileHandler(os.path.join(CONFIG_DIR, "spotifx.log"))
-            file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-            self.logger.addHandler(file_handler)
+            os.makedirs(CONFIG_DIR, exist_ok=True)
+            
+            if rotation == 'daily':
+                handler = logging.handlers.TimedRotatingFileHandler(LOG_FILE, when='midnight', backupCount=backup_count, encoding='utf-8')
+            else:
+                handler = logging.handlers.RotatingFileHandler(
+                    LOG_FILE, maxBytes=max_size_mb * 1024 * 1024, backupCount=backup_count, encoding='utf-8'
+                )
         except Exception:
-            pass
+            return None
+            
+        handler.setFormatter(JsonFormatter())
+        return handler
+        
+    def _start_listener(self):
+        handlers = [handler for handler in (self.console_handler, self.file_handler) if handler]
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        
+    def stop(self):
+        # Drains whatever is still queued before returning
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+            
+    def configure(self, config):
+        file_handler = None
+        if config.getboolean('General', 'save_log', True):
+            file_handler = self._file_handler(
+                config.get('Logging', 'rotation', 'size'),
+                max(1, config.getint('Logging', 'max_size_mb', LOG_MAX_SIZE_MB)),
+                max(0, config.getint('Logging', 'backup_count', LOG_BACKUP_COUNT))
+            )
             
+        self.stop()
+        if self.file_handler:
+            self.file_handler.close()
+        self.file_handler = file_handler
+        self._start_listener()
+        
+    @contextlib.contextmanager
+    def job(self, job_id):
+        token = log_job.set(job_id)
+        try:
+            yield
+        finally:
+            log_job.reset(token)
+            
+    def _log(self, level, message):
+        self.logger.log(level, message, extra={'job_id': log_job.get()})
+        
     def info(self, message):
-        self.logger.info(f"{Fore.GREEN}{message}{Style.RESET_ALL}")
+        self._log(logging.INFO, message)
         
     def warning(self, message):
-        self.logger.warning(f"{Fore.YELLOW}{message}{Style.RESET_ALL}")
+        self._log(logging.WARNING, message)
         
     def error(self, message):
-        self.logger.error(f"{Fore.RED}{message}{Style.RESET_ALL}")
+        self._log(logging.ERROR, message)
         
     def debug(self, message):
-        self.logger.debug(f"{Fore.CYAN}{message}{Style.RESET_ALL}")
+        self._log(logging.DEBUG, message)
 
 logger = Logger()
 
+def format_log_line(line):
+    # JSON log records back to one readable line; older plain lines as is
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return line
+        
+    if not isinstance(entry, dict):
+        return line
+        
+    job = f" [{entry['job_id'][:8]}]" if entry.get('job_id') else ''
+    return f"{entry.get('ts', '')} - {entry.get('level', '')}{job} - {entry.get('message', '')}"
+
 def create_directories():
     directories = [CONFIG_DIR, CACHE_DIR, DEFAULT_DOWNLOAD_DIR]
     for directory in directories:
@@ -132,6 +361,639 @@ def sanitize_filename(filename):
 def generate_unique_id():
     return str(uuid.uuid4())
 
+def format_size(total_bytes):
+    if total_bytes < 1024:
+        return f"{total_bytes} B"
+    elif total_bytes < 1024 * 1024:
+        return f"{total_bytes/1024:.2f} KB"
+    elif total_bytes < 1024 * 1024 * 1024:
+        return f"{total_bytes/(1024*1024):.2f} MB"
+    else:
+        return f"{total_bytes/(1024*1024*1024):.2f} GB"
+
+def parse_spotify_url(url):
+    match = SPOTIFY_URL_PATTERN.search(url.strip())
+    if not match:
+        return None, None
+        
+    return match.group(1), match.group(2)
+
+class HedgeCanceled(Exception):
+    pass
+
+class JobCanceled(Exception):
+    pass
+
+class NoMatchError(ValueError):
+    pass
+
+class DownloadError(Exception):
+    def __init__(self, item):
+        super().__init__(item.get('error') or f"Download {item.get('status', 'failed')}")
+        self.item = item
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def classify_error(error):
+    # Returns (kind, retry_after); retry_after is the server supplied delay
+    # in seconds for rate limits, when there is one
+    if isinstance(error, NoMatchError):
+        return ERROR_NO_MATCH, None
+        
+    status = None
+    headers = {}
+    
+    if spotipy.loaded() and isinstance(error, spotipy.exceptions.SpotifyException):
+        status = error.http_status
+        headers = error.headers or {}
+    elif requests.loaded() and isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        headers = error.response.headers or {}
+    elif aiohttp.loaded() and isinstance(error, aiohttp.ClientResponseError):
+        status = error.status
+        headers = error.headers or {}
+        
+    if status == 429:
+        return ERROR_RATE_LIMIT, _parse_retry_after(headers.get('Retry-After'))
+    if status is not None:
+        return (ERROR_TRANSIENT if status >= 500 else ERROR_PERMANENT), None
+        
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return ERROR_TRANSIENT, None
+    if requests.loaded() and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return ERROR_TRANSIENT, None
+    if aiohttp.loaded() and isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return ERROR_TRANSIENT, None
+        
+    message = str(error).lower()
+    
+    if any(marker in message for marker in RATE_LIMIT_MARKERS):
+        return ERROR_RATE_LIMIT, None
+    if any(marker in message for marker in TRANSIENT_ERROR_MARKERS):
+        return ERROR_TRANSIENT, None
+        
+    return ERROR_PERMANENT, None
+
+class Metrics:
+    # Counters, gauges and fixed-bucket histograms keyed by name and labels.
+    # Cheap enough to leave on: one lock and a bisect per observation.
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.dump_thread = None
+        self.server = None
+        
+    def _key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+        
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+            
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'max': 0.0}
+                
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['max'] = max(histogram['max'], value)
+            
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+            
+    def percentile(self, histogram, pct):
+        # Linear interpolation inside the bucket that holds the rank
+        rank = histogram['count'] * pct / 100.0
+        seen = 0
+        lower = 0.0
+        
+        for upper, count in zip(self.buckets, histogram['buckets']):
+            if count and seen + count >= rank:
+                return min(histogram['max'], lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+            lower = upper
+            
+        return histogram['max']
+        
+    def snapshot(self):
+        def series(items):
+            return [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(items)]
+            
+        with self.lock:
+            return {
+                'timestamp': datetime.now().isoformat(),
+                'counters': series(self.counters.items()),
+                'gauges': series(self.gauges.items()),
+                'histograms': [
+                    {
+                        'name': name,
+                        'labels': dict(labels),
+                        'count': histogram['count'],
+                        'sum': round(histogram['sum'], 6),
+                        'max': round(histogram['max'], 6),
+                        'p50': round(self.percentile(histogram, 50), 6),
+                        'p95': round(self.percentile(histogram, 95), 6)
+                    }
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ]
+            }
+            
+    def _format_labels(self, labels, extra=None):
+        pairs = list(labels) + (extra or [])
+        if not pairs:
+            return ''
+            
+        escaped = [(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in pairs]
+        return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+        
+    def to_prometheus(self):
+        lines = []
+        
+        with self.lock:
+            for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for name, _ in series}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{name}{self._format_labels(labels)} {value}")
+                            
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), histogram in sorted(self.histograms.items()):
+                    if series_name != name:
+                        continue
+                        
+                    cumulative = 0
+                    for upper, count in zip(self.buckets, histogram['buckets']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._format_labels(labels, [('le', upper)])} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {histogram['count']}")
+                    
+        return '\n'.join(lines) + '\n'
+        
+    def dump(self, path=METRICS_FILE):
+        try:
+            temp_file = f"{path}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(temp_file, path)
+        except Exception as e:
+            logger.debug(f"Failed to write metrics to {path}: {e}")
+            
+    def start_dumping(self, interval, path=METRICS_FILE):
+        if interval <= 0 or self.dump_thread:
+            return
+            
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+                
+        self.dump_thread = threading.Thread(target=loop, daemon=True)
+        self.dump_thread.start()
+        
+    def start_server(self, port, host='127.0.0.1'):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        if self.server:
+            return self.server
+            
+        metrics = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+                
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    body, content_type = metrics.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+                elif self.path.split('?')[0] == '/metrics.json':
+                    body, content_type = json.dumps(metrics.snapshot()).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                    
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{self.server.server_address[1]}/metrics")
+        
+        return self.server
+
+metrics = Metrics()
+
+class Profiler:
+    # Opt-in cProfile per (stage, thread) plus periodic tracemalloc snapshots,
+    # written to ~/.spotifx/profiles/<run>/. Stages do not nest: an inner
+    # stage runs inside the outer one's profile. From 3.12 on a single
+    # process-wide profile covers the whole run instead (see PROFILE_PER_THREAD).
+    def __init__(self):
+        self.enabled = False
+        self.run_dir = None
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.process_profile = None
+        self.local = threading.local()
+        self.snapshot_count = 0
+        
+    def start(self, snapshot_interval=PROFILE_SNAPSHOT_INTERVAL):
+        if self.enabled:
+            return self.run_dir
+            
+        import tracemalloc
+        
+        self.run_dir = os.path.join(PROFILES_DIR, datetime.now().strftime('%Y%m%d-%H%M%S'))
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.enabled = True
+        
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        
+        if not PROFILE_PER_THREAD:
+            self._start_process_profile()
+            
+        def snapshot_loop():
+            while self.enabled:
+                time.sleep(snapshot_interval)
+                if self.enabled:
+                    self.take_snapshot()
+                    self._flush_process_profile()
+                    
+        threading.Thread(target=snapshot_loop, daemon=True).start()
+        logger.info(f"Profiling enabled, writing to {self.run_dir}")
+        
+        return self.run_dir
+        
+    def take_snapshot(self):
+        import tracemalloc
+        
+        if not tracemalloc.is_tracing():
+            return
+            
+        with self.lock:
+            self.snapshot_count += 1
+            path = os.path.join(self.run_dir, f"heap-{self.snapshot_count:04d}.snap")
+            
+        try:
+            tracemalloc.take_snapshot().dump(path)
+        except Exception as e:
+            logger.debug(f"Failed to write heap snapshot: {e}")
+            
+    def _profile_path(self, stage, thread_name):
+        return os.path.join(self.run_dir, f"{stage}-{sanitize_filename(thread_name)}.prof")
+        
+    def _start_process_profile(self):
+        import cProfile
+        
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            logger.warning(f"CPU profiling disabled, another profiler is active: {e}")
+            return
+            
+        with self.lock:
+            self.process_profile = profile
+            
+    def _flush_process_profile(self, restart=True):
+        with self.lock:
+            profile = self.process_profile
+            if profile is None:
+                return
+                
+            # dump_stats switches the profile off, so it is re-enabled after
+            # writing; the lock keeps stop() from racing the restart
+            profile.disable()
+            self._dump_profile(('process', 'all'), profile)
+            if restart:
+                profile.enable()
+            else:
+                self.process_profile = None
+                
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled or not PROFILE_PER_THREAD or getattr(self.local, 'active', False):
+            yield
+            return
+            
+        import cProfile
+        
+        thread_name = threading.current_thread().name
+        key = (name, thread_name)
+        
+        with self.lock:
+            entry = self.profiles.get(key)
+            if entry is None:
+                entry = self.profiles[key] = {'profile': cProfile.Profile(), 'flushed_at': time.monotonic()}
+                
+        entry['profile'].enable()
+        self.local.active = True
+        try:
+            yield
+        finally:
+            entry['profile'].disable()
+            self.local.active = False
+            
+            # The owning thread flushes its own profile; dumping from another
+            # thread would switch off a profile that is running
+            if time.monotonic() - entry['flushed_at'] >= PROFILE_FLUSH_INTERVAL:
+                entry['flushed_at'] = time.monotonic()
+                self._dump_profile(key, entry['profile'])
+                
+    def _dump_profile(self, key, profile):
+        try:
+            profile.dump_stats(self._profile_path(*key))
+        except Exception as e:
+            logger.debug(f"Failed to write profile for {key[0]}: {e}")
+            
+    def stop(self):
+        if not self.enabled:
+            return
+            
+        import tracemalloc
+        
+        self.take_snapshot()
+        self.enabled = False
+        tracemalloc.stop()
+        
+        self._flush_process_profile(restart=False)
+        
+        with self.lock:
+            profiles = list(self.profiles.items())
+            
+        for key, entry in profiles:
+            self._dump_profile(key, entry['profile'])
+            
+        logger.info(f"Profiles written to {self.run_dir}")
+
+profiler = Profiler()
+
+def parse_rate(value):
+    # '2M', '512K', '1.5MB' or plain bytes per second; 0 means unlimited
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)B?\s*', str(value or '0'), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid rate: {value}")
+        
+    return int(float(match.group(1)) * RATE_UNITS[match.group(2).upper()])
+
+def parse_bandwidth_schedule(value):
+    # '08:00-18:00=1M, 23:00-07:00=0' -> [(start minute, end minute, rate)];
+    # windows may wrap past midnight
+    windows = []
+    
+    for entry in filter(None, (part.strip() for part in (value or '').split(','))):
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)', entry)
+        if not match:
+            raise ValueError(f"Invalid bandwidth window: {entry}")
+            
+        start = int(match.group(1)) * 60 + int(match.group(2))
+        end = int(match.group(3)) * 60 + int(match.group(4))
+        windows.append((start, end, parse_rate(match.group(5))))
+        
+    return windows
+
+# Process-wide token bucket shared by every audio download and cover fetch.
+# Callers take bytes after reading them and sleep off any overdraft, which
+# paces yt-dlp's read loop from its progress hook. The limit is
+# max_bandwidth, or that of the [Network] bandwidth_schedule window the
+# clock is in.
+class BandwidthLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.default_rate = 0
+        self.schedule = []
+        self.rate = 0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.checked = 0
+        
+    def configure(self, config):
+        try:
+            default_rate = parse_rate(config.get('Network', 'max_bandwidth', '0'))
+            schedule = parse_bandwidth_schedule(config.get('Network', 'bandwidth_schedule', ''))
+        except ValueError as e:
+            logger.warning(f"Ignoring bandwidth settings: {e}")
+            default_rate, schedule = 0, []
+            
+        with self.lock:
+            self.default_rate = default_rate
+            self.schedule = schedule
+            self.checked = 0
+            
+    def enabled(self):
+        return bool(self.default_rate or self.schedule)
+        
+    def _current_rate(self):
+        now = datetime.now()
+        minute = now.hour * 60 + now.minute
+        
+        for start, end, rate in self.schedule:
+            if start <= minute < end or (end <= start and (minute >= start or minute < end)):
+                return rate
+                
+        return self.default_rate
+        
+    def reserve(self, size):
+        # Takes size bytes from the bucket; returns how long to wait for them
+        with self.lock:
+            now = time.monotonic()
+            
+            if now - self.checked >= BANDWIDTH_SCHEDULE_CHECK:
+                self.checked = now
+                rate = self._current_rate()
+                if rate != self.rate:
+                    self.rate = rate
+                    self.tokens = rate * BANDWIDTH_BURST_SECONDS
+                    logger.info(f"Bandwidth limit: {format_size(rate) + '/s' if rate else 'none'}")
+                    
+            if not self.rate:
+                return 0.0
+                
+            self.tokens = min(self.rate * BANDWIDTH_BURST_SECONDS, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+            
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+            
+    def consume(self, size):
+        wait = self.reserve(size)
+        if wait:
+            metrics.inc('spotifx_throttled_seconds_total', wait, reason='bandwidth')
+            time.sleep(wait)
+            
+    def hook(self):
+        # yt-dlp progress hook charging each block the download reads
+        state = {'downloaded': 0}
+        
+        def throttle(info):
+            downloaded = info.get('downloaded_bytes') or 0
+            size = downloaded - state['downloaded']
+            state['downloaded'] = downloaded
+            if size > 0:
+                self.consume(size)
+                
+        return throttle
+
+bandwidth = BandwidthLimiter()
+
+# Caps concurrent connections per service, keyed by the last two labels of
+# the host name (i.scdn.co -> scdn.co), so raising the worker count does not
+# mean opening that many connections to one service
+class HostLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.default_limit = 0
+        self.limits = {}
+        self.semaphores = {}
+        
+    def configure(self, config):
+        limits = {}
+        for entry in filter(None, (part.strip() for part in config.get('Network', 'host_connections', '').split(','))):
+            host, _, limit = entry.partition('=')
+            try:
+                limits[self.key(host.strip())] = int(limit)
+            except ValueError:
+                logger.warning(f"Ignoring host connection limit: {entry}")
+                
+        with self.lock:
+            self.default_limit = max(0, config.getint('Network', 'max_connections_per_host', 0))
+            self.limits = limits
+            self.semaphores = {}
+            
+    def key(self, host_or_url):
+        host = urlparse(host_or_url).hostname if '//' in host_or_url else host_or_url
+        return '.'.join((host or '').lower().split('.')[-2:])
+        
+    def limit(self, host_or_url):
+        return self.limits.get(self.key(host_or_url), self.default_limit)
+        
+    @contextlib.contextmanager
+    def slot(self, host_or_url, hedge=False):
+        with self.hold(host_or_url, hedge):
+            yield
+            
+    @contextlib.contextmanager
+    def hold(self, host_or_url, hedge=False):
+        # Like slot(), but yields a release function for callers whose
+        # connection is done before the block is, e.g. a yt-dlp run that
+        # goes on to transcode and tag after the transfer. Hedges draw on a
+        # few slots of their own: the stragglers they race hold the regular
+        # ones.
+        key = self.key(host_or_url)
+        limit = self.limits.get(key, self.default_limit)
+        if hedge and limit > 0:
+            key, limit = f"{key}/hedge", HEDGE_HOST_SLOTS
+            
+        with self.lock:
+            semaphore = self.semaphores.get(key)
+            if semaphore is None and limit > 0:
+                semaphore = self.semaphores[key] = threading.BoundedSemaphore(limit)
+                
+        if semaphore is None:
+            yield lambda: None
+            return
+            
+        started = time.perf_counter()
+        semaphore.acquire()
+        waited = time.perf_counter() - started
+        if waited > 0.01:
+            metrics.inc('spotifx_throttled_seconds_total', waited, reason='host')
+            
+        held = [True]
+        release_lock = threading.Lock()
+        
+        def release():
+            with release_lock:
+                if held[0]:
+                    held[0] = False
+                    semaphore.release()
+                    
+        try:
+            yield release
+        finally:
+            release()
+
+host_slots = HostLimiter()
+
+def profile_report(run=None, limit=15, stream=None):
+    import pstats
+    import tracemalloc
+    
+    stream = stream or sys.stdout
+    
+    if not run or run == 'latest':
+        runs = sorted(os.listdir(PROFILES_DIR)) if os.path.isdir(PROFILES_DIR) else []
+        if not runs:
+            print(f"No profiles found in {PROFILES_DIR}. Run with --profile first.", file=stream)
+            return 1
+        run = runs[-1]
+        
+    run_dir = run if os.path.isdir(run) else os.path.join(PROFILES_DIR, run)
+    if not os.path.isdir(run_dir):
+        print(f"Profile run not found: {run}", file=stream)
+        return 1
+        
+    files = sorted(os.listdir(run_dir))
+    stages = {}
+    for name in files:
+        if name.endswith('.prof'):
+            stages.setdefault(name.split('-', 1)[0], []).append(os.path.join(run_dir, name))
+            
+    print(f"{Fore.YELLOW}Profile run {os.path.basename(run_dir)}{Style.RESET_ALL}", file=stream)
+    
+    for stage, paths in sorted(stages.items()):
+        stats = pstats.Stats(*paths, stream=stream)
+        scope = 'whole process' if stage == 'process' else f"across {len(paths)} threads"
+        print(f"\n{Fore.CYAN}Stage {stage}: {stats.total_calls} calls, {stats.total_tt:.2f}s {scope}{Style.RESET_ALL}", file=stream)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+        
+    snapshots = [os.path.join(run_dir, name) for name in files if name.endswith('.snap')]
+    if snapshots:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+        first = tracemalloc.Snapshot.load(snapshots[0]).filter_traces(ignore)
+        last = tracemalloc.Snapshot.load(snapshots[-1]).filter_traces(ignore)
+        
+        print(f"\n{Fore.CYAN}Top allocation sites ({os.path.basename(snapshots[-1])}):{Style.RESET_ALL}", file=stream)
+        for stat in last.statistics('lineno')[:limit]:
+            print(f"  {stat}", file=stream)
+            
+        if len(snapshots) > 1:
+            print(f"\n{Fore.CYAN}Growth since {os.path.basename(snapshots[0])}:{Style.RESET_ALL}", file=stream)
+            for stat in last.compare_to(first, 'lineno')[:limit]:
+                print(f"  {stat}", file=stream)
+                
+    return 0
+
 class ConfigManager:
     def __init__(self):
         self.config = configparser.ConfigParser()
@@ -154,6 +1016,13 @@ class ConfigManager:
         self.config['General'] = {
             'download_dir': DEFAULT_DOWNLOAD_DIR,
             'concurrent_downloads': '3',
+            'adaptive_concurrency': 'true',
+            'min_concurrent_downloads': '1',
+            'max_concurrent_downloads': '10',
+            'engine': ENGINE_THREADS,
+            'async_max_lookups': '200',
+            'prefetch_depth': str(PREFETCH_DEPTH),
+            'prefetch_workers': str(PREFETCH_WORKERS),
             'auto_update_check': 'true',
             'language': 'en',
             'save_log': 'true'
@@ -162,11 +1031,28 @@ class ConfigManager:
         self.config['Audio'] = {
             'audio_quality': '320',
             'audio_format': 'mp3',
+            'tagging': TAGGING_FFMPEG,
             'normalize_audio': 'true',
+            'normalization': NORMALIZE_REPLAYGAIN,
+            'normalize_target': str(DEFAULT_LOUDNESS_TARGET),
+            'analysis_workers': '0',
             'embed_cover_art': 'true',
             'embed_lyrics': 'true'
         }
         
+        self.config['Metrics'] = {
+            'port': '0',
+            'dump_interval': '0',
+            'profile': 'false',
+            'profile_snapshot_interval': str(PROFILE_SNAPSHOT_INTERVAL)
+        }
+        
+        self.config['Logging'] = {
+            'rotation': 'size',
+            'max_size_mb': str(LOG_MAX_SIZE_MB),
+            'backup_count': str(LOG_BACKUP_COUNT)
+        }
+        
         self.config['Spotify'] = {
             'region': 'US',
             'create_playlist_folders': 'true',
@@ -174,10 +1060,30 @@ class ConfigManager:
             'include_podcasts': 'false'
         }
         
+        self.config['Network'] = {
+            'max_bandwidth': '0',
+            'bandwidth_schedule': '',
+            'max_connections_per_host': '0',
+            'host_connections': ''
+        }
+        
+        self.config['Daemon'] = {
+            'host': DAEMON_HOST,
+            'port': str(DAEMON_PORT),
+            'token': ''
+        }
+        
+        self.config['Library'] = {
+            'reuse_mode': 'hardlink',
+            'fingerprint': 'false'
+        }
+        
         self.config['YouTube'] = {
             'max_search_results': '5',
             'prefer_official_audio': 'true',
             'force_ipv4': 'true',
+            'resolve_on_match': 'true',
+            'hedge': HEDGE_OFF,
             'use_proxy': 'false',
             'proxy': ''
         }
@@ -275,11 +1181,31 @@ class CredentialsManager:
         client_id, client_secret = self.get_spotify_credentials()
         return bool(client_id and client_secret)
 
+# Changes are written behind: save_database only marks the database dirty
+# and a background thread writes it at most every save_interval seconds, so
+# a burst of claims, checkpoints and progress updates costs one write. The
+# JSON is built under the lock and written to disk outside it. flush()
+# writes right away; it runs at exit too.
 class DatabaseManager:
-    def __init__(self):
-        self.db_file = DATABASE_FILE
+    def __init__(self, db_file=DATABASE_FILE, save_interval=DB_SAVE_INTERVAL):
+        self.db_file = db_file
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self.queue_listeners = []
         self.db = self._load_database()
         
+        # Queue items by ID, the same dicts as in the list, so heartbeats and
+        # progress writes find their item without scanning the whole queue
+        self.queue_index = {item.get('id'): item for item in self.db.get('queue', [])}
+        
+        self.save_interval = save_interval
+        self.dirty = False
+        self.version = 0
+        self.written_version = 0
+        self.save_requested = threading.Event()
+        self.saver = None
+        atexit.register(self.flush)
+        
     def _load_database(self):
         if os.path.exists(self.db_file):
             try:
@@ -303,28 +1229,74 @@ class DatabaseManager:
         }
         
     def save_database(self):
-        try:
-            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.db, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Failed to save database: {e}")
+        with self.lock:
+            self.dirty = True
+            if not self.save_interval:
+                self.flush()
+                return
+                
+            if self.saver is None:
+                self.saver = threading.Thread(target=self._save_loop, daemon=True, name='spotifx-db-save')
+                self.saver.start()
+                
+        self.save_requested.set()
+        
+    def _save_loop(self):
+        while True:
+            self.save_requested.wait()
+            self.save_requested.clear()
+            self.flush()
+            time.sleep(self.save_interval)
+            
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.version += 1
+            version = self.version
             
+            # No indent: only then does json use its C encoder
+            with metrics.timed(STAGE_METRIC, stage='db_serialize'):
+                data = json.dumps(self.db, ensure_ascii=False)
+                
+        with self.write_lock:
+            # A later snapshot already made it to disk
+            if version < self.written_version:
+                return
+                
+            try:
+                os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+                
+                # Write to a temp file and swap it in so a crash mid-write
+                # never leaves a truncated database behind
+                temp_file = f"{self.db_file}.tmp"
+                with metrics.timed(STAGE_METRIC, stage='db_save'), profiler.stage('db_save'):
+                    with open(temp_file, 'w', encoding='utf-8') as f:
+                        f.write(data)
+                    os.replace(temp_file, self.db_file)
+                self.written_version = version
+            except Exception as e:
+                logger.error(f"Failed to save database: {e}")
+                with self.lock:
+                    self.dirty = True
+                    
     def add_download_record(self, record):
-        if 'downloads' not in self.db:
-            self.db['downloads'] = []
-            
         if 'id' not in record:
             record['id'] = generate_unique_id()
             
         if 'timestamp' not in record:
             record['timestamp'] = datetime.now().isoformat()
             
-        self.db['downloads'].append(record)
-        
-        self._update_stats(record)
-        
-        self.save_database()
+        with self.lock:
+            if 'downloads' not in self.db:
+                self.db['downloads'] = []
+                
+            self.db['downloads'].append(record)
+            
+            self._update_stats(record)
+            
+            self.save_database()
         
     def _update_stats(self, record):
         if 'stats' not in self.db:
@@ -414,9 +1386,6 @@ class DatabaseManager:
         )
         
     def add_to_queue(self, item):
-        if 'queue' not in self.db:
-            self.db['queue'] = []
-            
         if 'id' not in item:
             item['id'] = generate_unique_id()
             
@@ -426,61 +1395,179 @@ class DatabaseManager:
         if 'status' not in item:
             item['status'] = 'pending'
             
-        self.db['queue'].append(item)
-        self.save_database()
+        with self.lock:
+            if 'queue' not in self.db:
+                self.db['queue'] = []
+                
+            self.db['queue'].append(item)
+            self.queue_index[item['id']] = item
+            self.save_database()
+            
+        self._notify_queue_listeners(item, item)
         
         return item['id']
         
+    def add_queue_listener(self, callback):
+        self.queue_listeners.append(callback)
+        
+    def _notify_queue_listeners(self, item, updates):
+        for callback in self.queue_listeners:
+            try:
+                callback(item, updates)
+            except Exception as e:
+                logger.debug(f"Queue listener failed: {e}")
+                
     def update_queue_item(self, item_id, updates):
         if 'queue' not in self.db:
             return False
             
-        for i, item in enumerate(self.db['queue']):
-            if item.get('id') == item_id:
-                self.db['queue'][i].update(updates)
-                self.save_database()
-                return True
+        with self.lock:
+            item = self.queue_index.get(item_id)
+            if item is None:
+                return False
                 
-        return False
+            item.update(updates)
+            self.save_database()
+            
+        # Listeners can block, e.g. on a --json-progress reader that falls
+        # behind, so like bulk_update_queue_items they run outside the lock
+        self._notify_queue_listeners(item, updates)
+        return True
         
-    def remove_from_queue(self, item_id):
+    def transition_queue_item(self, item_id, from_statuses, updates):
         if 'queue' not in self.db:
             return False
             
-        original_count = len(self.db['queue'])
-        
-        self.db['queue'] = [
-            item for item in self.db['queue'] 
-            if item.get('id') != item_id
-        ]
-        
-        if len(self.db['queue']) < original_count:
+        with self.lock:
+            item = self.queue_index.get(item_id)
+            if item is None or item.get('status', 'pending') not in from_statuses:
+                return False
+                
+            item.update(updates)
             self.save_database()
-            return True
+            
+        self._notify_queue_listeners(item, updates)
+        return True
         
-        return False
+    def get_queue_item(self, item_id):
+        with self.lock:
+            return self.queue_index.get(item_id)
         
-    def get_queue(self, status=None):
+    def bulk_update_queue_items(self, updates, skip_statuses=()):
+        # updates maps item IDs to fields; written with a single save
         if 'queue' not in self.db:
-            return []
-            
-        if status:
-            return [item for item in self.db['queue'] if item.get('status') == status]
-        else:
-            return self.db['queue']
+            return 0
             
-    def get_stats(self):
-        if 'stats' not in self.db:
-            self.db['stats'] = {
-                'total_tracks': 0,
-                'total_playlists': 0,
-                'total_bytes_downloaded': 0,
-                'first_download_date': None,
-                'last_download_date': None
-            }
+        changed = []
+        with self.lock:
+            for item_id, fields in updates.items():
+                item = self.queue_index.get(item_id)
+                if item is None or item.get('status', 'pending') in skip_statuses:
+                    continue
+                    
+                item.update(fields)
+                changed.append((item, fields))
+                
+            if changed:
+                self.save_database()
+                
+        for item, fields in changed:
+            self._notify_queue_listeners(item, fields)
             
-        return self.db['stats']
-
+        return len(changed)
+        
+    def cancel_queue_items(self, item_types=None, statuses=CANCELABLE_STATUSES, item_ids=None):
+        # Cancels matching unfinished items with a single save; returns their
+        # IDs mapped to the status they had
+        wanted = set(item_ids) if item_ids is not None else None
+        previous = {}
+        
+        for item in self.get_queue():
+            if item.get('status', 'pending') not in statuses:
+                continue
+            if item_types and item.get('type') not in item_types:
+                continue
+            if wanted is not None and item.get('id') not in wanted:
+                continue
+                
+            previous[item['id']] = item.get('status', 'pending')
+            
+        now = datetime.now().isoformat()
+        self.bulk_update_queue_items({
+            item_id: {'status': 'canceled', 'completed_at': now, 'lease_owner': None, 'lease_expires_at': None}
+            for item_id in previous
+        }, skip_statuses=TERMINAL_STATUSES)
+        
+        return previous
+        
+    def bulk_add_to_queue(self, items):
+        with self.lock:
+            if 'queue' not in self.db:
+                self.db['queue'] = []
+                
+            for item in items:
+                item.setdefault('id', generate_unique_id())
+                item.setdefault('added_at', datetime.now().isoformat())
+                item.setdefault('status', 'pending')
+                
+            self.db['queue'].extend(items)
+            self.queue_index.update((item['id'], item) for item in items)
+            self.save_database()
+            
+        for item in items:
+            self._notify_queue_listeners(item, item)
+            
+        return [item['id'] for item in items]
+        
+    def get_playlist_manifest(self, playlist_id):
+        return self.db.get('playlist_manifests', {}).get(playlist_id)
+        
+    def get_playlist_manifests(self):
+        return self.db.get('playlist_manifests', {})
+        
+    def set_playlist_manifest(self, playlist_id, manifest):
+        with self.lock:
+            if 'playlist_manifests' not in self.db:
+                self.db['playlist_manifests'] = {}
+                
+            self.db['playlist_manifests'][playlist_id] = manifest
+            self.save_database()
+            
+    def remove_from_queue(self, item_id):
+        with self.lock:
+            if self.queue_index.pop(item_id, None) is None:
+                return False
+                
+            self.db['queue'] = [
+                item for item in self.db['queue'] 
+                if item.get('id') != item_id
+            ]
+            self.save_database()
+            return True
+            
+    def get_queue(self, status=None):
+        if 'queue' not in self.db:
+            return []
+            
+        # A snapshot, so callers can iterate while workers add and remove
+        with self.lock:
+            if status:
+                return [item for item in self.db['queue'] if item.get('status') == status]
+            else:
+                return list(self.db['queue'])
+            
+    def get_stats(self):
+        if 'stats' not in self.db:
+            self.db['stats'] = {
+                'total_tracks': 0,
+                'total_playlists': 0,
+                'total_bytes_downloaded': 0,
+                'first_download_date': None,
+                'last_download_date': None
+            }
+            
+        return self.db['stats']
+
 class CacheManager:
     def __init__(self, cache_dir=CACHE_DIR):
         self.cache_dir = cache_dir
@@ -602,6 +1689,288 @@ class CacheManager:
                         
         return cleared_count
 
+# Writes a JSON file behind its owner's changes, like DatabaseManager does
+# for the database: mark() flags it dirty and a background thread writes it
+# at most every interval seconds; flush() writes right away and runs at
+# exit. snapshot() is called under the owner's lock and returns the JSON.
+class JsonWriteBehind:
+    def __init__(self, path, lock, snapshot, interval=DB_SAVE_INTERVAL, name='file'):
+        self.path = path
+        self.lock = lock
+        self.snapshot = snapshot
+        self.interval = interval
+        self.name = name
+        self.write_lock = threading.Lock()
+        self.dirty = False
+        self.version = 0
+        self.written_version = 0
+        self.save_requested = threading.Event()
+        self.saver = None
+        atexit.register(self.flush)
+        
+    def mark(self):
+        with self.lock:
+            self.dirty = True
+            if not self.interval:
+                self.flush()
+                return
+                
+            if self.saver is None:
+                self.saver = threading.Thread(target=self._save_loop, daemon=True, name=f"spotifx-{self.name.replace(' ', '-')}-save")
+                self.saver.start()
+                
+        self.save_requested.set()
+        
+    def _save_loop(self):
+        while True:
+            self.save_requested.wait()
+            self.save_requested.clear()
+            self.flush()
+            time.sleep(self.interval)
+            
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.version += 1
+            version = self.version
+            data = self.snapshot()
+            
+        with self.write_lock:
+            if version < self.written_version:
+                return
+                
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_file = f"{self.path}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(temp_file, self.path)
+                self.written_version = version
+            except Exception as e:
+                logger.error(f"Failed to save {self.name}: {e}")
+                with self.lock:
+                    self.dirty = True
+
+class LibraryIndex:
+    # Maps Spotify IDs, ISRCs and optional Chromaprint fingerprints to files
+    # already on disk so a track is only ever downloaded once, whatever
+    # folder or file name it was saved under
+    def __init__(self, index_file=LIBRARY_FILE, save_interval=DB_SAVE_INTERVAL):
+        self.index_file = index_file
+        self.lock = threading.RLock()
+        self.index = self._load_index()
+        self.writer = JsonWriteBehind(
+            index_file, self.lock, lambda: json.dumps(self.index, ensure_ascii=False),
+            interval=save_interval, name='library index'
+        )
+        
+    def _load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load library index: {e}")
+                
+        return {
+            'tracks': {},
+            'isrc': {},
+            'fingerprints': {}
+        }
+        
+    def save_index(self):
+        self.writer.mark()
+        
+    def flush(self):
+        self.writer.flush()
+        
+    def is_empty(self):
+        return not self.index.get('tracks')
+        
+    def add(self, spotify_id, file_path, isrc=None, fingerprint=None, save=True):
+        if not spotify_id or not file_path:
+            return
+            
+        with self.lock:
+            entry = self.index['tracks'].get(spotify_id, {})
+            entry.update({
+                'file_path': os.path.abspath(file_path),
+                'isrc': isrc or entry.get('isrc'),
+                'fingerprint': fingerprint or entry.get('fingerprint'),
+                'indexed_at': datetime.now().isoformat()
+            })
+            self.index['tracks'][spotify_id] = entry
+            
+            if entry['isrc']:
+                self.index['isrc'][entry['isrc']] = spotify_id
+            if entry['fingerprint']:
+                self.index['fingerprints'][entry['fingerprint']] = spotify_id
+                
+            if save:
+                self.save_index()
+                
+    def _existing_path(self, spotify_id):
+        entry = self.index['tracks'].get(spotify_id)
+        if not entry:
+            return None
+            
+        if os.path.exists(entry['file_path']):
+            return entry['file_path']
+            
+        # The file was moved or deleted behind our back
+        with self.lock:
+            self.index['tracks'].pop(spotify_id, None)
+            if self.index['isrc'].get(entry.get('isrc')) == spotify_id:
+                self.index['isrc'].pop(entry['isrc'], None)
+            if self.index['fingerprints'].get(entry.get('fingerprint')) == spotify_id:
+                self.index['fingerprints'].pop(entry['fingerprint'], None)
+            self.save_index()
+            
+        return None
+        
+    def lookup(self, spotify_id=None, isrc=None, fingerprint=None):
+        if spotify_id:
+            path = self._existing_path(spotify_id)
+            if path:
+                return path
+                
+        for key, value in (('isrc', isrc), ('fingerprints', fingerprint)):
+            if value and value in self.index[key]:
+                path = self._existing_path(self.index[key][value])
+                if path:
+                    return path
+                    
+        return None
+        
+    def link(self, existing_path, output_path, mode='hardlink'):
+        if mode == 'none' or os.path.abspath(existing_path) == os.path.abspath(output_path):
+            return existing_path
+            
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        try:
+            if mode == 'hardlink':
+                os.link(existing_path, output_path)
+            elif mode == 'symlink':
+                os.symlink(os.path.abspath(existing_path), output_path)
+            else:
+                shutil.copy2(existing_path, output_path)
+        except OSError as e:
+            # Hardlinks fail across filesystems, symlinks without privileges
+            # on Windows; a copy still beats a second download
+            logger.debug(f"Could not {mode} {existing_path} to {output_path}, copying instead: {e}")
+            shutil.copy2(existing_path, output_path)
+            
+        return output_path
+        
+    def fingerprint(self, file_path):
+        try:
+            output = subprocess.check_output(['fpcalc', '-plain', file_path], stderr=subprocess.DEVNULL, text=True, timeout=60)
+            return hashlib.sha1(output.strip().encode('utf-8')).hexdigest() if output.strip() else None
+        except (subprocess.SubprocessError, FileNotFoundError, OSError) as e:
+            logger.debug(f"Fingerprinting failed for {file_path}: {e}")
+            return None
+            
+    def rebuild(self, database):
+        added = 0
+        
+        for record in database.get_download_history():
+            entries = [record] if record.get('type') == 'track' else record.get('tracks', [])
+            
+            for entry in entries:
+                file_path = entry.get('file_path')
+                if entry.get('spotify_id') and file_path and os.path.exists(file_path):
+                    self.add(entry['spotify_id'], file_path, save=False)
+                    added += 1
+                    
+        self.save_index()
+        
+        return added
+
+# EBU R128 measurements from ffmpeg's loudnorm filter, cached by source
+# video ID so a track is only ever analyzed once. The conversion step needs
+# the result before it encodes, so analysis runs on the calling thread; the
+# number running at once is capped for the CPU rather than following the
+# network-bound worker count.
+class LoudnessAnalyzer:
+    def __init__(self, cache_file=LOUDNESS_FILE, workers=0, save_interval=DB_SAVE_INTERVAL):
+        self.cache_file = cache_file
+        self.lock = threading.RLock()
+        self.cache = self._load_cache()
+        self.slots = threading.BoundedSemaphore(workers or max(1, (os.cpu_count() or 2) // 2))
+        self.writer = JsonWriteBehind(
+            cache_file, self.lock, lambda: json.dumps(self.cache),
+            interval=save_interval, name='loudness cache'
+        )
+        
+    def _load_cache(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load loudness cache: {e}")
+                
+        return {}
+        
+    def flush(self):
+        self.writer.flush()
+        
+    def get(self, video_id):
+        return self.cache.get(video_id)
+        
+    def measure(self, video_id, file_path, duration=None, ffmpeg='ffmpeg'):
+        stats = self.get(video_id)
+        if stats:
+            metrics.inc('spotifx_loudness_cache_total', result='hit')
+            return stats
+            
+        metrics.inc('spotifx_loudness_cache_total', result='miss')
+        with self.slots:
+            stats = self._analyze(file_path, ffmpeg)
+        
+        if stats:
+            stats['duration'] = duration
+            with self.lock:
+                self.cache[video_id] = stats
+            self.writer.mark()
+            
+        return stats
+        
+    def _analyze(self, file_path, ffmpeg):
+        with metrics.timed(STAGE_METRIC, stage='loudness'):
+            result = subprocess.run(
+                [ffmpeg, '-hide_banner', '-nostats', '-i', file_path, '-af', 'loudnorm=print_format=json', '-f', 'null', '-'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors='replace'
+            )
+            
+        # The filter prints its JSON summary at the end of stderr
+        start, end = result.stderr.rfind('{'), result.stderr.rfind('}')
+        if result.returncode != 0 or start < 0 or end < start:
+            logger.debug(f"Loudness analysis failed for {file_path}: {result.stderr.strip()[-200:]}")
+            return None
+            
+        try:
+            report = json.loads(result.stderr[start:end + 1])
+            stats = {
+                'I': float(report['input_i']),
+                'TP': float(report['input_tp']),
+                'LRA': float(report['input_lra']),
+                'thresh': float(report['input_thresh']),
+                'offset': float(report['target_offset'])
+            }
+        except (ValueError, KeyError) as e:
+            logger.debug(f"Unreadable loudness report for {file_path}: {e}")
+            return None
+            
+        # Silence measures as -inf, which has no meaningful gain
+        if not all(math.isfinite(value) for value in stats.values()):
+            return None
+            
+        return stats
+
 class SpotifyClient:
     def __init__(self, client_id, client_secret, cache_manager=None):
         self.client_id = client_id
@@ -610,7 +1979,7 @@ class SpotifyClient:
         
         try:
             self.sp = spotipy.Spotify(
-                client_credentials_manager=SpotifyClientCredentials(
+                client_credentials_manager=spotipy.oauth2.SpotifyClientCredentials(
                     client_id=client_id,
                     client_secret=client_secret
                 )
@@ -635,19 +2004,25 @@ class SpotifyClient:
         
         cached_data = self.cache.get(cache_key, 86400)
         if cached_data:
+            metrics.inc('spotifx_cache_requests_total', result='hit')
             return cached_data
             
+        metrics.inc('spotifx_cache_requests_total', result='miss')
+        
         try:
             if track_id.startswith('http'):
                 track_id = self._extract_id_from_url(track_id, 'track')
                 
-            track = self.sp.track(track_id)
+            with metrics.timed(STAGE_METRIC, stage='spotify_lookup'), profiler.stage('spotify_lookup'):
+                track = self.sp.track(track_id)
             
             self.cache.set(cache_key, track)
             
             return track
         except Exception as e:
             logger.error(f"Failed to get track {track_id}: {e}")
+            if classify_error(e)[0] in RETRYABLE_ERRORS:
+                raise
             return None
             
     def get_album(self, album_id):
@@ -655,59 +2030,81 @@ class SpotifyClient:
         
         cached_data = self.cache.get(cache_key, 86400)
         if cached_data:
+            metrics.inc('spotifx_cache_requests_total', result='hit')
             return cached_data
             
+        metrics.inc('spotifx_cache_requests_total', result='miss')
+        
         try:
             if album_id.startswith('http'):
                 album_id = self._extract_id_from_url(album_id, 'album')
                 
-            album = self.sp.album(album_id)
-            
-            if 'tracks' in album and 'items' in album['tracks']:
-                results = album['tracks']
-                tracks = results['items']
+            with metrics.timed(STAGE_METRIC, stage='spotify_lookup'), profiler.stage('spotify_lookup'):
+                album = self.sp.album(album_id)
                 
-                while results['next']:
-                    results = self.sp.next(results)
-                    tracks.extend(results['items'])
+                if 'tracks' in album and 'items' in album['tracks']:
+                    results = album['tracks']
+                    tracks = results['items']
+                    
+                    while results['next']:
+                        results = self.sp.next(results)
+                        tracks.extend(results['items'])
+                        
+                    album['tracks']['items'] = tracks
                     
-                album['tracks']['items'] = tracks
-                
             self.cache.set(cache_key, album)
             
             return album
         except Exception as e:
             logger.error(f"Failed to get album {album_id}: {e}")
+            if classify_error(e)[0] in RETRYABLE_ERRORS:
+                raise
             return None
             
-    def get_playlist(self, playlist_id):
+    def get_playlist(self, playlist_id, use_cache=True):
         cache_key = f"spotify:playlist:{playlist_id}"
         
-        cached_data = self.cache.get(cache_key, 3600)
+        cached_data = self.cache.get(cache_key, 3600) if use_cache else None
         if cached_data:
+            metrics.inc('spotifx_cache_requests_total', result='hit')
             return cached_data
             
+        metrics.inc('spotifx_cache_requests_total', result='miss')
+        
         try:
             if playlist_id.startswith('http'):
                 playlist_id = self._extract_id_from_url(playlist_id, 'playlist')
                 
-            playlist = self.sp.playlist(playlist_id)
-            
-            if 'tracks' in playlist and 'items' in playlist['tracks']:
-                results = playlist['tracks']
-                tracks = results['items']
+            with metrics.timed(STAGE_METRIC, stage='spotify_lookup'), profiler.stage('spotify_lookup'):
+                playlist = self.sp.playlist(playlist_id)
                 
-                while results['next']:
-                    results = self.sp.next(results)
-                    tracks.extend(results['items'])
+                if 'tracks' in playlist and 'items' in playlist['tracks']:
+                    results = playlist['tracks']
+                    tracks = results['items']
+                    
+                    while results['next']:
+                        results = self.sp.next(results)
+                        tracks.extend(results['items'])
+                        
+                    playlist['tracks']['items'] = tracks
                     
-                playlist['tracks']['items'] = tracks
-                
             self.cache.set(cache_key, playlist)
             
             return playlist
         except Exception as e:
             logger.error(f"Failed to get playlist {playlist_id}: {e}")
+            if classify_error(e)[0] in RETRYABLE_ERRORS:
+                raise
+            return None
+            
+    def get_playlist_snapshot(self, playlist_id):
+        # Never cached: the snapshot is how a sync finds out something changed
+        try:
+            return self.sp.playlist(playlist_id, fields='snapshot_id').get('snapshot_id')
+        except Exception as e:
+            logger.error(f"Failed to get snapshot for playlist {playlist_id}: {e}")
+            if classify_error(e)[0] in RETRYABLE_ERRORS:
+                raise
             return None
             
     def search(self, query, search_type='track', limit=10):
@@ -727,6 +2124,19 @@ class SpotifyClient:
             logger.error(f"Failed to search for {query}: {e}")
             return None
             
+    def cached_track_ids(self, item_type, spotify_id):
+        # Track IDs of an album or playlist that is already cached, without
+        # making a request; None when it is not
+        data = self.cache.get(f"spotify:{item_type}:{spotify_id}", 86400 if item_type == 'album' else 3600)
+        if not data:
+            return None
+            
+        items = data.get('tracks', {}).get('items', [])
+        if item_type == 'playlist':
+            items = [entry.get('track') for entry in items]
+            
+        return [track['id'] for track in items if track and track.get('id')]
+        
     def _extract_id_from_url(self, url, resource_type):
         pattern = f"/{resource_type}/([a-zA-Z0-9]+)"
         match = re.search(pattern, url)
@@ -736,24 +2146,249 @@ class SpotifyClient:
         
         return url
 
+class AsyncSpotifyClient:
+    # Non-blocking counterpart of SpotifyClient for the asyncio engine. Shares
+    # the token, API prefix and cache keys of the wrapped client so both
+    # engines read and warm the same cache entries.
+    def __init__(self, spotify_client, max_connections=100):
+        self.spotify = spotify_client
+        self.cache = spotify_client.cache
+        self.max_connections = max_connections
+        self.slots = {}
+        self.session = None
+        
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT)
+            )
+            
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            
+    def _host_slot(self, url):
+        # aiohttp has a single limit_per_host, so every host gets its own
+        # semaphore to honour the [Network] host_connections overrides too
+        key = host_slots.key(url)
+        if key not in self.slots:
+            self.slots[key] = asyncio.Semaphore(host_slots.limit(url) or self.max_connections)
+            
+        return self.slots[key]
+        
+    async def _get_token(self):
+        auth_manager = getattr(self.spotify.sp, 'auth_manager', None)
+        if auth_manager is None:
+            return getattr(self.spotify.sp, '_auth', None)
+            
+        # Token refreshes are rare and spotipy caches the token in between
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: auth_manager.get_access_token(as_dict=False))
+        
+    async def _get_json(self, url):
+        await self.open()
+        
+        if not url.startswith('http'):
+            url = self.spotify.sp.prefix + url
+            
+        headers = {'Authorization': f"Bearer {await self._get_token()}"}
+        
+        for attempt in range(MAX_RETRY_COUNT + 1):
+            started = time.perf_counter()
+            async with self._host_slot(url), self.session.get(url, headers=headers) as response:
+                metrics.observe(STAGE_METRIC, time.perf_counter() - started, stage='spotify_lookup')
+                if response.status == 429 and attempt < MAX_RETRY_COUNT:
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After')) or RETRY_BASE_DELAY
+                    await asyncio.sleep(min(retry_after, RETRY_MAX_DELAY))
+                    continue
+                    
+                response.raise_for_status()
+                return await response.json()
+                
+    async def _get_all_items(self, results):
+        items = results['items']
+        
+        while results.get('next'):
+            results = await self._get_json(results['next'])
+            items.extend(results['items'])
+            
+        return items
+        
+    async def get_track(self, track_id):
+        cache_key = f"spotify:track:{track_id}"
+        
+        cached_data = self.cache.get(cache_key, 86400)
+        if cached_data:
+            return cached_data
+            
+        track = await self._get_json(f"tracks/{track_id}")
+        self.cache.set(cache_key, track)
+        
+        return track
+        
+    async def get_album(self, album_id):
+        cache_key = f"spotify:album:{album_id}"
+        
+        cached_data = self.cache.get(cache_key, 86400)
+        if cached_data:
+            return cached_data
+            
+        album = await self._get_json(f"albums/{album_id}")
+        if 'tracks' in album and 'items' in album['tracks']:
+            album['tracks']['items'] = await self._get_all_items(album['tracks'])
+            
+        self.cache.set(cache_key, album)
+        
+        return album
+        
+    async def get_playlist(self, playlist_id):
+        cache_key = f"spotify:playlist:{playlist_id}"
+        
+        cached_data = self.cache.get(cache_key, 3600)
+        if cached_data:
+            return cached_data
+            
+        playlist = await self._get_json(f"playlists/{playlist_id}")
+        if 'tracks' in playlist and 'items' in playlist['tracks']:
+            playlist['tracks']['items'] = await self._get_all_items(playlist['tracks'])
+            
+        self.cache.set(cache_key, playlist)
+        
+        return playlist
+        
+    async def fetch_bytes(self, url):
+        await self.open()
+        
+        started = time.perf_counter()
+        async with self._host_slot(url), self.session.get(url) as response:
+            response.raise_for_status()
+            data = await response.read()
+            
+        metrics.observe(STAGE_METRIC, time.perf_counter() - started, stage='cover_fetch')
+        
+        wait = bandwidth.reserve(len(data))
+        if wait:
+            metrics.inc('spotifx_throttled_seconds_total', wait, reason='bandwidth')
+            await asyncio.sleep(wait)
+            
+        return data
+
+# Sends yt-dlp's own output to our logger: quiet alone still lets some of it
+# through to stdout, which --json-progress keeps for events
+class YtDlpLogger:
+    def debug(self, message):
+        logger.debug(f"yt-dlp: {message}")
+        
+    def info(self, message):
+        logger.debug(f"yt-dlp: {message}")
+        
+    def warning(self, message):
+        logger.debug(f"yt-dlp: {message}")
+        
+    def error(self, message):
+        logger.debug(f"yt-dlp: {message}")
+
 class YouTubeDownloader:
     def __init__(self, config_manager=None):
         self.config = config_manager or ConfigManager()
         self.download_dir = self.config.get('General', 'download_dir', DEFAULT_DOWNLOAD_DIR)
-        self.progress_hooks = []
-        self.current_download = None
+        
+        # Video ID -> (unprocessed info dict, expiry) for matches resolved
+        # during the match phase, so the download skips a second extraction
+        self.resolved = {}
+        self.resolved_lock = threading.Lock()
+        self.cover_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='spotifx-cover')
+        
+        # Download rates of recent fetches, for spotting stragglers
+        self.rates = deque(maxlen=HEDGE_RATE_WINDOW)
+        self.rates_lock = threading.Lock()
+        
+        self.loudness = None
+        if self.config.getboolean('Audio', 'normalize_audio', True):
+            self.loudness = LoudnessAnalyzer(workers=self.config.getint('Audio', 'analysis_workers', 0))
         
         os.makedirs(self.download_dir, exist_ok=True)
         
-    def add_progress_hook(self, hook):
-        self.progress_hooks.append(hook)
+    def _ydl(self, opts):
+        # Every yt-dlp run goes through here
+        return yt_dlp.YoutubeDL(opts)
+        
+    def _network_opts(self):
+        opts = {'force_ipv4': self.config.getboolean('YouTube', 'force_ipv4', True)}
+        
+        if self.config.getboolean('YouTube', 'use_proxy', False):
+            proxy = self.config.get('YouTube', 'proxy', '')
+            if proxy:
+                opts['proxy'] = proxy
+                
+        return opts
+        
+    def _info_expiry(self, info):
+        # Stream URLs carry their own expire= timestamp; stop trusting the
+        # info a little before the earliest one
+        expiries = []
+        for fmt in info.get('formats') or []:
+            match = re.search(r'[?&/]expire[=/](\d+)', fmt.get('url') or '')
+            if match:
+                expiries.append(int(match.group(1)))
+                
+        if expiries:
+            return min(expiries) - RESOLVED_INFO_MARGIN
+            
+        return time.time() + RESOLVED_INFO_TTL
+        
+    def _store_resolved(self, video_id, info, expires_at):
+        now = time.time()
+        
+        with self.resolved_lock:
+            if len(self.resolved) >= RESOLVED_INFO_LIMIT:
+                self.resolved = {key: entry for key, entry in self.resolved.items() if entry[1] > now}
+                
+                while len(self.resolved) >= RESOLVED_INFO_LIMIT:
+                    self.resolved.pop(next(iter(self.resolved)))
+                    
+            self.resolved[video_id] = (info, expires_at)
+            
+    def _take_resolved(self, video_id):
+        with self.resolved_lock:
+            entry = self.resolved.pop(video_id, None)
+            
+        if not entry:
+            metrics.inc('spotifx_resolved_info_total', result='miss')
+            return None
+            
+        if entry[1] <= time.time():
+            metrics.inc('spotifx_resolved_info_total', result='expired')
+            return None
+            
+        metrics.inc('spotifx_resolved_info_total', result='hit')
+        return entry[0]
         
-    def _progress_hook(self, info):
-        self.current_download = info
+    def resolve(self, video_id):
+        # Full extraction (page, player, formats) without format selection or
+        # download; download_audio hands the result to process_ie_result
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'noplaylist': True
+        }
+        ydl_opts.update(self._network_opts())
         
-        for hook in self.progress_hooks:
-            hook(info)
+        try:
+            with metrics.timed(STAGE_METRIC, stage='resolve'), profiler.stage('resolve'), self._ydl(ydl_opts) as ydl:
+                info = ydl.extract_info(video_id, download=False, process=False)
+        except Exception as e:
+            logger.debug(f"Could not resolve {video_id} ahead of download: {e}")
+            return None
             
+        if info and info.get('formats'):
+            self._store_resolved(video_id, info, self._info_expiry(info))
+            
+        return info
+        
     def search_youtube(self, query, limit=5):
         try:
             ydl_opts = {
@@ -766,7 +2401,9 @@ class YouTubeDownloader:
                 'default_search': 'ytsearch'
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            metrics.inc('spotifx_search_queries_total')
+            
+            with metrics.timed(STAGE_METRIC, stage='youtube_search'), self._ydl(ydl_opts) as ydl:
                 results = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
                 
                 if not results or 'entries' not in results:
@@ -785,6 +2422,15 @@ class YouTubeDownloader:
             logger.error("Invalid track info provided")
             return None
             
+        with metrics.timed(STAGE_METRIC, stage='match'), profiler.stage('match'):
+            match = self._find_best_match(track_info)
+            
+        if match and self.config.getboolean('YouTube', 'resolve_on_match', True):
+            self.resolve(match['id'])
+            
+        return match
+            
+    def _find_best_match(self, track_info):
         try:
             artist_name = track_info['artists'][0]['name']
             track_name = track_info['name']
@@ -822,7 +2468,8 @@ class YouTubeDownloader:
                             key=lambda x: x.get('view_count', 0) if x.get('view_count') else 0,
                             reverse=True
                         )
-                        return filtered_results[0]
+                        # Runners-up, for hedging a straggling download
+                        return dict(filtered_results[0], alternates=[r['id'] for r in filtered_results[1:HEDGE_ALTERNATES + 1]])
                     
                     return results[0]
                     
@@ -833,45 +2480,284 @@ class YouTubeDownloader:
             logger.error(f"Failed to find YouTube match: {e}")
             return None
             
-    def download_audio(self, video_url, output_path=None, metadata=None):
+    def _record_rate(self, info):
+        if info['status'] == 'finished' and info.get('elapsed'):
+            size = info.get('total_bytes') or info.get('downloaded_bytes')
+            if size:
+                with self.rates_lock:
+                    self.rates.append(size / info['elapsed'])
+                    
+    def _straggler_eta(self, info):
+        # Seconds the fetch still needs at its current rate when it is far
+        # slower than the rolling median, 0 if unknown, None if it is fine
+        elapsed = info.get('elapsed') or 0
+        downloaded = info.get('downloaded_bytes') or 0
+        if elapsed < HEDGE_GRACE_SECONDS or not downloaded:
+            return None
+            
+        with self.rates_lock:
+            if len(self.rates) < HEDGE_MIN_SAMPLES:
+                return None
+            median = statistics.median(self.rates)
+            
+        rate = downloaded / elapsed
+        if rate >= median * HEDGE_SLOW_FACTOR:
+            return None
+            
+        total = info.get('total_bytes') or info.get('total_bytes_estimate')
+        return (total - downloaded) / rate if total and total > downloaded else 0
+        
+    def download_audio(self, video_url, output_path=None, metadata=None, progress=None, alternates=None):
+        # A fetch running far below the median rate gets a hedge: a second
+        # fetch of the same video's stream on a fresh connection, or of the
+        # runner-up match. Whichever stream arrives first is converted and
+        # tagged, once.
+        mode = self.config.get('YouTube', 'hedge', HEDGE_OFF)
+        
+        if mode not in (HEDGE_RESTART, HEDGE_ALTERNATE) or not output_path:
+            def hook(info):
+                self._record_rate(info)
+                if progress:
+                    progress(info)
+                    
+            return self._download_once(video_url, output_path, metadata, hook)
+            
+        race = {'lock': threading.Lock(), 'hedge': None, 'fetched': False, 'winner': None, 'eta': None}
+        canceled = threading.Event()
+        
+        def hook(info):
+            if canceled.is_set():
+                raise HedgeCanceled()
+                
+            self._record_rate(info)
+            if progress:
+                progress(info)
+                
+            # Once the primary has its stream the hedge can no longer win
+            if info['status'] == 'finished':
+                with race['lock']:
+                    if race['winner'] is None:
+                        race['fetched'] = True
+                        
+            if race['hedge'] is None and info['status'] == 'downloading':
+                eta = self._straggler_eta(info)
+                if eta is not None:
+                    target = alternates[0] if mode == HEDGE_ALTERNATE and alternates else video_url
+                    logger.info(f"Download of {video_url} is straggling, hedging with {target}")
+                    metrics.inc('spotifx_stragglers_total')
+                    race['eta'] = time.perf_counter() + eta if eta else None
+                    race['hedge'] = self._start_hedge(target, output_path, race, canceled)
+                    
+        error = None
+        try:
+            filename = self._download_once(video_url, output_path, metadata, hook, canceled)
+        except JobCanceled:
+            if race['hedge']:
+                self._stop_hedge(race['hedge'])
+            raise
+        except Exception as e:
+            filename, error = None, e
+            
+        with race['lock']:
+            # A primary that failed outright leaves the race to the hedge
+            if race['winner'] is None:
+                race['fetched'] = True
+                race['winner'] = 'primary' if filename else None
+            hedge = race['hedge']
+            
+        if not hedge:
+            if error:
+                raise error
+            return filename
+            
+        if race['winner'] == 'primary':
+            self._stop_hedge(hedge)
+            metrics.inc('spotifx_hedges_total', outcome='primary')
+            return filename
+            
+        hedge['thread'].join()
+        if not hedge['file']:
+            metrics.inc('spotifx_hedges_total', outcome='failed')
+            if error:
+                raise error
+            return filename
+            
+        # The hedge's stream goes where the primary's would have landed and a
+        # regular run converts and tags it; yt-dlp skips the transfer for a
+        # file that is already there
+        self._remove_partials(output_path)
+        os.replace(hedge['file'], os.path.splitext(output_path)[0] + os.path.splitext(hedge['file'])[1])
+        
+        metrics.inc('spotifx_hedges_total', outcome='hedge')
+        if race['eta'] and hedge['finished']:
+            metrics.observe('spotifx_hedge_saved_seconds', max(0.0, race['eta'] - hedge['finished']))
+            
+        return self._download_once(hedge['url'], output_path, metadata, progress)
+        
+    def _remove_partials(self, output_path):
+        # The losing fetch can leave its .part file behind
+        folder, stem = os.path.split(os.path.splitext(output_path)[0])
+        for name in os.listdir(folder or '.'):
+            if name.startswith(f"{stem}.") and name.endswith('.part'):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(folder, name))
+                    
+    def _start_hedge(self, video_url, output_path, race, primary_canceled):
+        stem, ext = os.path.splitext(output_path)
+        hedge = {'url': video_url, 'canceled': threading.Event(), 'file': None, 'finished': None}
+        
+        def hook(info):
+            if hedge['canceled'].is_set():
+                raise HedgeCanceled()
+                
+        def run():
+            filename = self._fetch_stream(video_url, f"{stem}.hedge", hook, hedge['canceled'])
+            
+            with race['lock']:
+                if filename and not race['fetched']:
+                    hedge['file'] = filename
+                    hedge['finished'] = time.perf_counter()
+                    race['winner'] = 'hedge'
+                    primary_canceled.set()
+                    return
+                    
+            if filename and os.path.exists(filename):
+                os.remove(filename)
+            self._remove_partials(f"{stem}.hedge{ext}")
+                
+        hedge['thread'] = threading.Thread(target=run, daemon=True, name='spotifx-hedge')
+        hedge['thread'].start()
+        
+        return hedge
+        
+    def _stop_hedge(self, hedge):
+        # The losing transfer stops at its next progress hook
+        hedge['canceled'].set()
+        hedge['thread'].join()
+        
+    def _fetch_stream(self, video_url, stem, progress, canceled):
+        # A hedge only fetches the audio stream, in the format the primary
+        # picked; the winner is converted and tagged afterwards
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'outtmpl': f"{stem}.%(ext)s",
+            'noplaylist': True,
+            'quiet': True,
+            'no_warnings': True,
+            'socket_timeout': SOCKET_TIMEOUT,
+            'noprogress': True,
+            'logger': YtDlpLogger(),
+            'progress_hooks': [progress]
+        }
+        if bandwidth.enabled():
+            ydl_opts['progress_hooks'].append(bandwidth.hook())
+        ydl_opts.update(self._network_opts())
+        
+        try:
+            with host_slots.slot(YOUTUBE_HOST, hedge=True), self._ydl(ydl_opts) as ydl:
+                info = ydl.extract_info(video_url, download=True)
+                
+            return info['requested_downloads'][0]['filepath'] if info and info.get('requested_downloads') else None
+        except Exception as e:
+            if not canceled.is_set():
+                logger.debug(f"Hedge fetch of {video_url} failed: {e}")
+            return None
+            
+    def _download_once(self, video_url, output_path=None, metadata=None, progress=None, canceled=None):
         try:
             audio_quality = self.config.get('Audio', 'audio_quality', '320')
             audio_format = self.config.get('Audio', 'audio_format', 'mp3')
+            tagging = self.config.get('Audio', 'tagging', TAGGING_FFMPEG)
             
             if output_path:
-                output_template = output_path
+                # yt-dlp names the download after the source format and the
+                # conversion swaps in the target extension
+                output_template = f"{os.path.splitext(output_path)[0]}.%(ext)s"
             else:
                 output_template = os.path.join(self.download_dir, '%(title)s.%(ext)s')
                 
             ydl_opts = {
                 'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': audio_format,
-                    'preferredquality': audio_quality,
-                }],
                 'outtmpl': output_template,
                 'noplaylist': True,
                 'quiet': True,
                 'no_warnings': True,
-                'progress_hooks': [self._progress_hook],
-                'force_ipv4': self.config.getboolean('YouTube', 'force_ipv4', True)
+                'socket_timeout': SOCKET_TIMEOUT,
+                'noprogress': True,
+                'logger': YtDlpLogger(),
+                'progress_hooks': [progress] if progress else []
             }
+            if bandwidth.enabled():
+                ydl_opts['progress_hooks'].append(bandwidth.hook())
+            ydl_opts.update(self._network_opts())
+            
+            # Cover art downloads while the audio does
+            cover = None
+            if metadata and not metadata.get('cover_data') and metadata.get('cover_url'):
+                cover = self.cover_pool.submit(self._fetch_cover, metadata['cover_url'])
+                
+            # In ffmpeg mode tags and cover are written by the same ffmpeg run
+            # that converts the audio, so the file is written once
+            tagging_pp = None
+            if metadata and tagging == TAGGING_FFMPEG:
+                tagging_pp = tagging_extract_audio_pp()(
+                    preferredcodec=audio_format,
+                    preferredquality=audio_quality,
+                    tags=ffmpeg_tags(metadata),
+                    cover=lambda: metadata.get('cover_data') or (cover.result() if cover else None),
+                    normalize=self._normalizer(video_url)
+                )
+            else:
+                ydl_opts['postprocessors'] = [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': audio_format,
+                    'preferredquality': audio_quality,
+                }]
             
-            if self.config.getboolean('YouTube', 'use_proxy', False):
-                proxy = self.config.get('YouTube', 'proxy', '')
-                if proxy:
-                    ydl_opts['proxy'] = proxy
+            # Postprocessor hooks split the yt-dlp run into download and transcode time
+            postprocess = {'seconds': 0.0}
+            
+            def postprocessor_hook(d):
+                if d['status'] == 'started':
+                    postprocess['started'] = time.perf_counter()
+                elif d['status'] == 'finished' and 'started' in postprocess:
+                    postprocess['seconds'] += time.perf_counter() - postprocess.pop('started')
                     
-            # Handle metadata properly - avoid passing it directly to FFmpegMetadataPP
-            # Instead, apply it after download using mutagen
+            ydl_opts['postprocessor_hooks'] = [postprocessor_hook]
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=True)
+            with self._ydl(ydl_opts) as ydl:
+                if tagging_pp:
+                    ydl.add_post_processor(tagging_pp, when='post_process')
+                    
+                started = time.perf_counter()
+                resolved = self._take_resolved(video_url)
+                
+                with host_slots.hold(YOUTUBE_HOST) as release_slot, profiler.stage('download'):
+                    # The slot covers the transfer only; yt-dlp reports
+                    # 'finished' before transcoding, tagging and loudness
+                    # analysis, which need no connection
+                    ydl.add_progress_hook(lambda d: release_slot() if d['status'] in ('finished', 'error') else None)
+                    # A file that is already there skips the transfer and
+                    # its hooks
+                    ydl.add_postprocessor_hook(lambda d: release_slot())
+                    
+                    info = None
+                    if resolved:
+                        try:
+                            info = ydl.process_ie_result(resolved, download=True)
+                        except yt_dlp.utils.DownloadError as e:
+                            # Most likely stream URLs that went stale anyway
+                            logger.debug(f"Resolved info for {video_url} failed, extracting again: {e}")
+                            
+                    if not info:
+                        info = ydl.extract_info(video_url, download=True)
                 
                 if not info:
                     return None
                     
+                metrics.observe(STAGE_METRIC, time.perf_counter() - started - postprocess['seconds'], stage='download')
+                metrics.observe(STAGE_METRIC, postprocess['seconds'], stage='transcode')
+                    
                 if 'requested_downloads' in info:
                     filename = info['requested_downloads'][0]['filepath']
                 else:
@@ -880,93 +2766,1203 @@ class YouTubeDownloader:
                     filename = f"{basename}.{audio_format}"
                 
                 if metadata and os.path.exists(filename):
-                    self._apply_metadata(filename, metadata)
+                    if tagging_pp and tagging_pp.tagged:
+                        # Formats ffmpeg cannot attach a picture to get the
+                        # cover from mutagen
+                        ext = os.path.splitext(filename)[1][1:].lower()
+                        remaining = {} if ext in FFMPEG_COVER_FORMATS else {'cover_data': tagging_pp.cover()}
+                    else:
+                        # Copied without conversion, or mutagen mode
+                        remaining = dict(metadata, cover_data=metadata.get('cover_data') or (cover.result() if cover else None))
+                        
+                    if any(remaining.values()):
+                        with profiler.stage('tagging'):
+                            self._apply_metadata(filename, remaining)
+                            
+                # Files that skipped the ffmpeg step get ReplayGain tags, which
+                # need no re-encode
+                if self.loudness and os.path.exists(filename) and not (tagging_pp and tagging_pp.tagged):
+                    stats = self.loudness.measure(info.get('id') or video_url, filename, info.get('duration'))
+                    if stats:
+                        self.write_replaygain(filename, replaygain_tags(stats, self._loudness_target()))
                     
                 return filename
         except Exception as e:
+            if isinstance(e, JobCanceled):
+                if output_path:
+                    self._remove_partials(output_path)
+                raise
+                
+            if canceled is not None and canceled.is_set():
+                logger.debug(f"Download of {video_url} canceled, the other fetch finished first")
+                return None
+                
             logger.error(f"YouTube download failed: {e}")
+            if classify_error(e)[0] in RETRYABLE_ERRORS:
+                raise
             return None
             
+    def _loudness_target(self):
+        return self.config.getfloat('Audio', 'normalize_target', DEFAULT_LOUDNESS_TARGET)
+        
+    def _normalizer(self, video_id):
+        # For the conversion step: measures the source (or reuses the cached
+        # measurement) and says how ffmpeg should apply it
+        if not self.loudness:
+            return None
+            
+        def normalize(source_path, duration, ffmpeg):
+            stats = self.loudness.measure(video_id, source_path, duration, ffmpeg)
+            if not stats:
+                return None
+                
+            return {
+                'stats': stats,
+                'mode': self.config.get('Audio', 'normalization', NORMALIZE_REPLAYGAIN),
+                'target': self._loudness_target()
+            }
+            
+        return normalize
+        
+    def write_replaygain(self, file_path, tags):
+        # Tag-only update; the audio is left as it is
+        try:
+            ext = os.path.splitext(file_path)[1][1:].lower()
+            
+            if ext == 'mp3':
+                audio = mutagen_mp3.MP3(file_path)
+                if not audio.tags:
+                    audio.tags = mutagen_id3.ID3()
+                for key, value in tags.items():
+                    audio.tags.add(mutagen_id3.TXXX(encoding=3, desc=key, text=value))
+            elif ext == 'm4a':
+                audio = mutagen_mp4.MP4(file_path)
+                if audio.tags is None:
+                    audio.add_tags()
+                for key, value in tags.items():
+                    audio.tags[f"----:com.apple.iTunes:{key}"] = [value.encode('utf-8')]
+            elif ext in ('flac', 'opus'):
+                audio = mutagen_flac.FLAC(file_path) if ext == 'flac' else mutagen_oggopus.OggOpus(file_path)
+                if audio.tags is None:
+                    audio.add_tags()
+                for key, value in tags.items():
+                    audio.tags[key] = [value]
+            else:
+                return
+                
+            audio.save()
+        except Exception as e:
+            logger.error(f"Failed to write ReplayGain tags to {file_path}: {e}")
+            
+    def apply_album_gain(self, tracks):
+        # tracks: (video ID, file path) pairs of one album. Album gain comes
+        # from the cached per-track measurements, so nothing is re-analyzed.
+        if not self.loudness or not tracks:
+            return
+            
+        album = album_loudness([self.loudness.get(video_id) for video_id, _ in tracks])
+        if not album:
+            return
+            
+        tags = replaygain_tags(album, self._loudness_target(), album=True)
+        for _, file_path in tracks:
+            if os.path.exists(file_path):
+                self.write_replaygain(file_path, tags)
+                
+    def _fetch_cover(self, cover_url):
+        try:
+            with host_slots.slot(cover_url), metrics.timed(STAGE_METRIC, stage='cover_fetch'):
+                response = requests.get(cover_url, timeout=DEFAULT_TIMEOUT)
+                
+            if response.status_code == 200:
+                bandwidth.consume(len(response.content))
+                return response.content
+        except Exception as e:
+            logger.debug(f"Failed to fetch cover art: {e}")
+            
+        return None
+        
     def _apply_metadata(self, file_path, metadata):
         try:
             if not os.path.exists(file_path):
                 return
                 
-            if file_path.lower().endswith('.mp3'):
-                audio = MP3(file_path)
+            ext = os.path.splitext(file_path)[1][1:].lower()
+            if ext not in AUDIO_FORMATS:
+                logger.debug(f"No tagging support for {file_path}")
+                return
+                
+            cover_data = metadata.get('cover_data')
+            if not cover_data and metadata.get('cover_url'):
+                cover_data = self._fetch_cover(metadata['cover_url'])
+                
+            started = time.perf_counter()
+            
+            if ext == 'mp3':
+                audio = mutagen_mp3.MP3(file_path)
                 
                 if not audio.tags:
-                    audio.tags = ID3()
+                    audio.tags = mutagen_id3.ID3()
                 
                 if 'title' in metadata:
-                    audio.tags.add(TIT2(encoding=3, text=metadata['title']))
+                    audio.tags.add(mutagen_id3.TIT2(encoding=3, text=metadata['title']))
                 
                 if 'artist' in metadata:
-                    audio.tags.add(TPE1(encoding=3, text=metadata['artist']))
+                    audio.tags.add(mutagen_id3.TPE1(encoding=3, text=metadata['artist']))
                 
                 if 'album' in metadata:
-                    audio.tags.add(TALB(encoding=3, text=metadata['album']))
+                    audio.tags.add(mutagen_id3.TALB(encoding=3, text=metadata['album']))
                 
                 if 'date' in metadata:
-                    audio.tags.add(TDRC(encoding=3, text=metadata['date']))
+                    audio.tags.add(mutagen_id3.TDRC(encoding=3, text=metadata['date']))
                 
                 if 'track_number' in metadata:
-                    audio.tags.add(TRCK(encoding=3, text=str(metadata['track_number'])))
+                    audio.tags.add(mutagen_id3.TRCK(encoding=3, text=str(metadata['track_number'])))
                 
                 if 'genre' in metadata:
-                    audio.tags.add(TCON(encoding=3, text=metadata['genre']))
+                    audio.tags.add(mutagen_id3.TCON(encoding=3, text=metadata['genre']))
                 
-                if 'cover_url' in metadata and metadata['cover_url']:
-                    try:
-                        response = requests.get(metadata['cover_url'])
-                        if response.status_code == 200:
-                            audio.tags.add(APIC(
-                                encoding=3,
-                                mime='image/jpeg',
-                                type=3,  # Cover image
-                                desc='Cover',
-                                data=response.content
-                            ))
-                    except Exception as e:
-                        logger.debug(f"Failed to add cover art: {e}")
+                if cover_data:
+                    audio.tags.add(mutagen_id3.APIC(
+                        encoding=3,
+                        mime='image/jpeg',
+                        type=3,  # Cover image
+                        desc='Cover',
+                        data=cover_data
+                    ))
                 
                 if 'lyrics' in metadata and metadata['lyrics']:
-                    audio.tags.add(USLT(
+                    audio.tags.add(mutagen_id3.USLT(
                         encoding=3,
                         lang='eng',
                         desc='',
                         text=metadata['lyrics']
                     ))
+                    
+            elif ext == 'm4a':
+                audio = mutagen_mp4.MP4(file_path)
+                
+                if audio.tags is None:
+                    audio.add_tags()
+                    
+                for key, field in (('title', '\xa9nam'), ('artist', '\xa9ART'), ('album', '\xa9alb'),
+                                   ('date', '\xa9day'), ('genre', '\xa9gen'), ('lyrics', '\xa9lyr')):
+                    if metadata.get(key):
+                        audio.tags[field] = [str(metadata[key])]
+                        
+                if metadata.get('track_number'):
+                    number, _, total = str(metadata['track_number']).partition('/')
+                    audio.tags['trkn'] = [(int(number or 0), int(total or 0))]
+                    
+                if metadata.get('disc_number'):
+                    audio.tags['disk'] = [(int(metadata['disc_number']), 0)]
+                    
+                if cover_data:
+                    audio.tags['covr'] = [mutagen_mp4.MP4Cover(cover_data, imageformat=mutagen_mp4.MP4Cover.FORMAT_JPEG)]
+                    
+            else:
+                # FLAC and Opus both use Vorbis comments
+                audio = mutagen_flac.FLAC(file_path) if ext == 'flac' else mutagen_oggopus.OggOpus(file_path)
+                
+                if audio.tags is None:
+                    audio.add_tags()
+                    
+                for key, value in vorbis_tags(metadata).items():
+                    audio.tags[key] = value
+                    
+                if cover_data:
+                    picture = mutagen_flac.Picture()
+                    picture.type = 3
+                    picture.mime = 'image/jpeg'
+                    picture.desc = 'Cover'
+                    picture.data = cover_data
+                    
+                    if ext == 'flac':
+                        audio.clear_pictures()
+                        audio.add_picture(picture)
+                    else:
+                        audio.tags['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+                        
+            audio.save()
+            
+            metrics.observe(STAGE_METRIC, time.perf_counter() - started, stage='tagging')
+                
+        except Exception as e:
+            logger.error(f"Failed to apply metadata to {file_path}: {e}")
+
+def ffmpeg_tags(metadata):
+    tags = {}
+    for key, name in (('title', 'title'), ('artist', 'artist'), ('album', 'album'), ('date', 'date'),
+                      ('track_number', 'track'), ('disc_number', 'disc'), ('genre', 'genre'), ('lyrics', 'lyrics')):
+        if metadata.get(key):
+            tags[name] = str(metadata[key])
+            
+    return tags
+
+def replaygain_tags(stats, target, album=False):
+    scope = 'album' if album else 'track'
+    return {
+        f"replaygain_{scope}_gain": f"{target - stats['I']:+.2f} dB",
+        f"replaygain_{scope}_peak": f"{10 ** (stats['TP'] / 20):.6f}"
+    }
+
+def album_loudness(measurements):
+    # Integrated loudness of the album as one program: duration-weighted
+    # energy mean of the tracks, with the loudest peak
+    measurements = [stats for stats in measurements if stats]
+    if not measurements:
+        return None
+        
+    weights = [stats.get('duration') or 1 for stats in measurements]
+    energy = sum(weight * 10 ** (stats['I'] / 10) for weight, stats in zip(weights, measurements)) / sum(weights)
+    
+    return {'I': 10 * math.log10(energy), 'TP': max(stats['TP'] for stats in measurements)}
+
+def loudnorm_filter(stats, target):
+    # Second loudnorm pass fed the first pass's numbers, in linear mode
+    return (
+        f"loudnorm=I={target}:TP={LOUDNORM_TRUE_PEAK}:LRA={LOUDNORM_LRA}"
+        f":measured_I={stats['I']}:measured_TP={stats['TP']}:measured_LRA={stats['LRA']}"
+        f":measured_thresh={stats['thresh']}:offset={stats['offset']}:linear=true"
+    )
+
+def vorbis_tags(metadata):
+    tags = {}
+    for key, name in (('title', 'title'), ('artist', 'artist'), ('album', 'album'), ('date', 'date'),
+                      ('disc_number', 'discnumber'), ('genre', 'genre'), ('lyrics', 'lyrics')):
+        if metadata.get(key):
+            tags[name] = [str(metadata[key])]
+            
+    if metadata.get('track_number'):
+        number, _, total = str(metadata['track_number']).partition('/')
+        tags['tracknumber'] = [number]
+        if total:
+            tags['tracktotal'] = [total]
+            
+    return tags
+
+_tagging_pp_class = None
+
+def tagging_extract_audio_pp():
+    # The yt-dlp postprocessor is built on first use so importing SpotiFX
+    # does not import yt-dlp
+    global _tagging_pp_class
+    
+    if _tagging_pp_class is None:
+        from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP, FFmpegPostProcessorError
+        from yt_dlp.postprocessor.common import PostProcessingError
+        from yt_dlp.utils import prepend_extension
+        
+        # FFmpegExtractAudio that also writes tags and cover art in the same
+        # ffmpeg run, into a temp file renamed over the target when complete
+        class TaggingExtractAudioPP(FFmpegExtractAudioPP):
+            def __init__(self, downloader=None, preferredcodec=None, preferredquality=None, tags=None, cover=None, normalize=None):
+                super().__init__(downloader, preferredcodec, preferredquality)
+                self.tags = tags or {}
+                self.cover = cover or (lambda: None)
+                self.normalize = normalize
+                self.duration = None
+                self.tagged = False
+                
+            def run(self, information):
+                self.duration = information.get('duration')
+                return super().run(information)
+                
+            def run_ffmpeg(self, path, out_path, codec, more_opts):
+                ext = os.path.splitext(out_path)[1][1:].lower()
+                temp_path = prepend_extension(out_path, 'tagging')
+                cover_path = None
+                
+                inputs = [(path, [])]
+                opts = ['-map', '0:a']
+                
+                cover_data = self.cover() if ext in FFMPEG_COVER_FORMATS else None
+                if cover_data:
+                    cover_path = f"{out_path}.cover.jpg"
+                    with open(cover_path, 'wb') as f:
+                        f.write(cover_data)
+                        
+                    inputs.append((cover_path, []))
+                    opts += ['-map', '1:0', '-c:v', 'copy', '-disposition:v:0', 'attached_pic']
+                    
+                if codec:
+                    opts += ['-acodec', codec]
+                opts += list(more_opts)
+                
+                tags = dict(self.tags)
+                normalization = self.normalize(path, self.duration, self.executable) if self.normalize else None
+                
+                if normalization:
+                    # A stream copy cannot be filtered, so it gets tags instead
+                    if normalization['mode'] == NORMALIZE_LOUDNORM and codec != 'copy':
+                        opts += ['-af', loudnorm_filter(normalization['stats'], normalization['target'])]
+                        # loudnorm upsamples to 192 kHz internally
+                        opts += ['-ar', '48000' if ext == 'opus' else '44100']
+                    else:
+                        tags.update(replaygain_tags(normalization['stats'], normalization['target']))
+                        if ext == 'm4a':
+                            opts += ['-movflags', '+use_metadata_tags']
+                            
+                for key, value in tags.items():
+                    opts += ['-metadata', f"{key}={value}"]
+                    
+                if ext == 'mp3':
+                    opts += ['-id3v2_version', '3']
+                    
+                try:
+                    self.real_run_ffmpeg(inputs, [(temp_path, opts)])
+                    os.replace(temp_path, out_path)
+                    self.tagged = True
+                except FFmpegPostProcessorError as err:
+                    raise PostProcessingError(f'audio conversion failed: {err.msg}')
+                finally:
+                    for leftover in (temp_path, cover_path):
+                        if leftover and os.path.exists(leftover):
+                            os.remove(leftover)
+                            
+        _tagging_pp_class = TaggingExtractAudioPP
+        
+    return _tagging_pp_class
+
+# Priority queue with round-robin fair share between sources. Entries are
+# served by priority level first and then by a per-source virtual round, so a
+# source that queued thousands of tasks gets one turn per round next to a
+# source that queued one. Delayed entries wait in a separate heap until due.
+class JobScheduler:
+    def __init__(self):
+        self.heap = []
+        self.delayed = []
+        self.counter = itertools.count()
+        self.source_rounds = {}
+        self.current_rounds = {}
+        self.unfinished_tasks = 0
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.all_tasks_done = threading.Condition(self.mutex)
+        
+    def _push(self, task, priority, source):
+        level = PRIORITY_LEVELS.get(priority, priority) if task is not None else -1
+        key = (level, source)
+        
+        current = self.current_rounds.get(level, 0)
+        round_number = max(self.source_rounds.get(key, -1) + 1, current)
+        self.source_rounds[key] = round_number
+        
+        heapq.heappush(self.heap, (level, round_number, next(self.counter), source, task))
+        
+    def put(self, task, priority=DEFAULT_PRIORITY, source='default', delay=0):
+        with self.mutex:
+            if delay > 0:
+                heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.counter), priority, source, task))
+            else:
+                self._push(task, priority, source)
+                
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+            
+    def _promote_due(self):
+        now = time.monotonic()
+        
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, priority, source, task = heapq.heappop(self.delayed)
+            self._push(task, priority, source)
+            
+    def _wait_time(self, deadline=None):
+        wait = None
+        
+        if self.delayed:
+            wait = max(0, self.delayed[0][0] - time.monotonic())
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            wait = remaining if wait is None else min(wait, remaining)
+            
+        return wait
+        
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            self._promote_due()
+            
+            if not block:
+                if not self.heap:
+                    raise Empty
+            else:
+                deadline = time.monotonic() + timeout if timeout is not None else None
+                
+                while not self.heap:
+                    if deadline is not None and deadline - time.monotonic() <= 0:
+                        raise Empty
+                        
+                    self.not_empty.wait(self._wait_time(deadline))
+                    self._promote_due()
+                    
+            level, round_number, _, _, task = heapq.heappop(self.heap)
+            self.current_rounds[level] = round_number
+            
+            return task
+            
+    def get_nowait(self):
+        return self.get(block=False)
+        
+    def task_done(self):
+        with self.all_tasks_done:
+            unfinished = self.unfinished_tasks - 1
+            if unfinished < 0:
+                raise ValueError('task_done() called too many times')
+                
+            self.unfinished_tasks = unfinished
+            if unfinished == 0:
+                self.all_tasks_done.notify_all()
+                
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
+                
+    def has_waiting(self, priority, source):
+        # True when something queued would be served before this source's
+        # next turn, i.e. a long job holding a worker should step aside
+        level = PRIORITY_LEVELS.get(priority, priority)
+        
+        with self.mutex:
+            for entry_level, _, _, entry_source, task in self.heap:
+                if task is None:
+                    continue
+                    
+                if entry_level < level or (entry_level == level and entry_source != source):
+                    return True
+                    
+        return False
+        
+    def reprioritize(self, item_id, priority):
+        with self.mutex:
+            for i, entry in enumerate(self.delayed):
+                if entry[4] is not None and entry[4][0] == item_id:
+                    self.delayed[i] = entry[:2] + (priority,) + entry[3:]
+                    return True
+                    
+            matches = [entry for entry in self.heap if entry[4] is not None and entry[4][0] == item_id]
+            if not matches:
+                return False
+                
+            self.heap = [entry for entry in self.heap if entry not in matches]
+            heapq.heapify(self.heap)
+            
+            for _, _, _, source, task in matches:
+                self._push(task, priority, source)
+                
+            return True
+            
+    def remove(self, item_ids):
+        # Drops queued tasks for these items; returns how many were dropped
+        item_ids = set(item_ids)
+        
+        with self.mutex:
+            heap = [entry for entry in self.heap if entry[4] is None or entry[4][0] not in item_ids]
+            delayed = [entry for entry in self.delayed if entry[4] is None or entry[4][0] not in item_ids]
+            removed = len(self.heap) - len(heap) + len(self.delayed) - len(delayed)
+            
+            if removed:
+                self.heap, self.delayed = heap, delayed
+                heapq.heapify(self.heap)
+                heapq.heapify(self.delayed)
+                
+                self.unfinished_tasks -= removed
+                if not self.unfinished_tasks:
+                    self.all_tasks_done.notify_all()
+                    
+        return removed
+        
+    def peek(self, count):
+        # The next tasks get() would hand out, without removing them
+        with self.mutex:
+            return [entry[4] for entry in heapq.nsmallest(count, self.heap) if entry[4] is not None]
+            
+    def qsize(self):
+        with self.mutex:
+            return len(self.heap) + len(self.delayed)
+            
+    def empty(self):
+        with self.mutex:
+            return not self.heap and not self.delayed
+
+# Looks ahead in the download queue while workers are busy and resolves the
+# Spotify metadata and YouTube match of the next few track jobs, so a worker
+# that dequeues one goes straight to downloading audio. A worker that
+# dequeues a job still being prefetched waits for that work instead of
+# starting it over. At most `depth` jobs are held or in flight.
+class Prefetcher:
+    def __init__(self, manager, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS):
+        self.manager = manager
+        self.depth = depth
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='spotifx-prefetch')
+        self.thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self.thread.start()
+        
+    def _prefetch_loop(self):
+        while not self.stop_event.is_set():
+            self.wake.wait(PREFETCH_INTERVAL)
+            self.wake.clear()
+            
+            try:
+                self._schedule()
+            except Exception as e:
+                logger.debug(f"Prefetch scheduling failed: {e}")
+                
+    def _schedule(self):
+        upcoming = self.manager.download_queue.peek(self.depth)
+        
+        with self.lock:
+            # Jobs that left the queue without being taken (canceled, moved)
+            window = {task[0] for task in upcoming}
+            for item_id in [item_id for item_id in self.futures if item_id not in window]:
+                self.futures.pop(item_id).cancel()
+                
+            for item_id, task_type, task_data in upcoming:
+                if task_type != 'track' or not task_data.get('spotify_id') or item_id in self.futures:
+                    continue
+                if len(self.futures) >= self.depth:
+                    return
+                    
+                self.futures[item_id] = self.pool.submit(self._prefetch, item_id, task_data)
+                
+    def _prefetch(self, item_id, task_data):
+        try:
+            track_info = self.manager.spotify.get_track(task_data['spotify_id'])
+            if not track_info:
+                return {}
+                
+            resolved = {'track_info': track_info}
+            isrc = track_info.get('external_ids', {}).get('isrc')
+            
+            # Tracks the library already has need no search
+            if not self.manager.library.lookup(track_info.get('id'), isrc):
+                best_match = self.manager.youtube.find_best_match(track_info)
+                if best_match:
+                    resolved['best_match'] = best_match
+                    
+            return resolved
+        except Exception as e:
+            # The worker repeats the lookup and handles the error properly
+            logger.debug(f"Prefetch failed for {item_id}: {e}")
+            return {}
+            
+    def take(self, item_id):
+        with self.lock:
+            future = self.futures.pop(item_id, None)
+            
+        self.wake.set()
+        
+        resolved = {}
+        if future and not future.cancel():
+            try:
+                resolved = future.result()
+            except Exception:
+                resolved = {}
+                
+        metrics.inc('spotifx_prefetch_total', result='hit' if resolved else 'miss')
+        return resolved
+        
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        
+class JobHandle:
+    # Returned by the queue_* methods; resolves once the job reaches a
+    # terminal status (retries and time-slice yields do not count)
+    def __init__(self, item_id, item_type):
+        self.id = item_id
+        self.type = item_type
+        self.item = None
+        self._done = threading.Event()
+        
+    def _finish(self, item):
+        self.item = dict(item)
+        self._done.set()
+        
+    def done(self):
+        return self._done.is_set()
+        
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+        
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Download {self.id[:8]}... still running")
+            
+        if self.item.get('status') != 'completed':
+            raise DownloadError(self.item)
+            
+        return self.item
+        
+    def __repr__(self):
+        return f"<JobHandle {self.type} {self.id[:8]} {'done' if self.done() else 'running'}>"
+
+# Fan-in for download progress. Each download gets its own hook bound to its
+# queue item; hooks only store the item's latest value in a dict, and one
+# thread writes whatever changed to the database in a single save every
+# PROGRESS_FLUSH_INTERVAL seconds.
+class ProgressAggregator:
+    def __init__(self, db, interval=PROGRESS_FLUSH_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self.pending = {}
+        self.written = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+        
+    def report(self, item_id, progress):
+        self.pending[item_id] = progress
+        
+    def channel(self, item_id, start=30, end=80):
+        # yt-dlp progress hook for one download, mapping its bytes onto the
+        # item's start..end progress range
+        def hook(info):
+            if info['status'] == 'downloading':
+                downloaded = info.get('downloaded_bytes', 0)
+                total = info.get('total_bytes') or info.get('total_bytes_estimate', 0)
+                
+                if total > 0:
+                    self.report(item_id, int(start + (end - start) * min(1.0, downloaded / total)))
+                    
+            elif info['status'] == 'finished':
+                self.report(item_id, end)
+                
+        return hook
+        
+    def discard(self, item_id):
+        self.pending.pop(item_id, None)
+        self.written.pop(item_id, None)
+        
+    def flush(self):
+        updates = {}
+        
+        # popitem is atomic, so reports landing mid-flush are kept for the next one
+        while True:
+            try:
+                item_id, progress = self.pending.popitem()
+            except KeyError:
+                break
+                
+            if self.written.get(item_id) != progress:
+                updates[item_id] = {'progress': progress}
+                self.written[item_id] = progress
+                
+        if updates:
+            self.db.bulk_update_queue_items(updates, skip_statuses=TERMINAL_STATUSES)
+            
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Progress flush failed: {e}")
+                
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+        self.flush()
+        
+class DownloadManager:
+    def __init__(self, spotify_client, youtube_downloader, database, config, library=None):
+        self.spotify = spotify_client
+        self.youtube = youtube_downloader
+        self.db = database
+        self.config = config
+        
+        self.max_concurrent = self.config.getint('General', 'concurrent_downloads', 3)
+        self.min_workers = max(1, self.config.getint('General', 'min_concurrent_downloads', 1))
+        self.max_workers = max(self.min_workers, self.config.getint('General', 'max_concurrent_downloads', 10))
+        self.download_dir = self.config.get('General', 'download_dir', DEFAULT_DOWNLOAD_DIR)
+        self.audio_format = self.config.get('Audio', 'audio_format', 'mp3')
+        
+        self.download_queue = JobScheduler()
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.enqueue_lock = threading.Lock()
+        
+        # Unfinished jobs by the work they do, and tracks that a queued album
+        # or playlist will download, so repeat requests join those jobs
+        self.active_jobs = {}
+        self.covered_tracks = {}
+        self.job_tracks = {}
+        self.db.add_queue_listener(self._on_queue_change)
+        self.progress = ProgressAggregator(self.db)
+        self.library = library or LibraryIndex()
+        self.active_downloads = []
+        self.download_threads = []
+        self.worker_stops = []
+        self.pool_lock = threading.Lock()
+        self.shutdown_flag = threading.Event()
+        self.instance_id = generate_unique_id()
+        self.lease_renewals = {}
+        self.job_threads = {}
+        self.cancel_tokens = {}
+        
+        # Cleared while downloads are paused
+        self.running = threading.Event()
+        self.running.set()
+        
+        self.throughput_lock = threading.Lock()
+        self.throughput = {'tracks': 0, 'bytes': 0, 'throttled': 0}
+        self.last_sample = {'time': time.time(), 'rate': None, 'workers': self.max_concurrent}
+        
+        self.engine = None
+        engine_name = self.config.get('General', 'engine', ENGINE_THREADS)
+        
+        if engine_name == ENGINE_ASYNCIO:
+            if not aiohttp.available():
+                logger.warning("The asyncio engine needs aiohttp (pip install aiohttp); using the thread engine")
+            else:
+                self.engine = AsyncDownloadEngine(
+                    self,
+                    max_lookups=self.config.getint('General', 'async_max_lookups', 200),
+                    lookahead=self.config.getint('General', 'prefetch_depth', PREFETCH_DEPTH)
+                )
+                
+        if self.library.is_empty():
+            indexed = self.library.rebuild(self.db)
+            if indexed:
+                logger.info(f"Indexed {indexed} previously downloaded tracks")
+                
+        self._rehydrate_queue()
+        
+        # The asyncio engine looks ahead on its own event loop
+        self.prefetcher = None
+        prefetch_depth = self.config.getint('General', 'prefetch_depth', PREFETCH_DEPTH)
+        if not self.engine and prefetch_depth > 0:
+            self.prefetcher = Prefetcher(self, prefetch_depth, self.config.getint('General', 'prefetch_workers', PREFETCH_WORKERS))
+            
+        if self.engine:
+            self.engine.start()
+        else:
+            self.resize_workers(self.max_concurrent)
+            
+        self.lease_thread = threading.Thread(target=self._lease_monitor, daemon=True)
+        self.lease_thread.start()
+        
+        self.autoscale_thread = threading.Thread(target=self._autoscale_loop, daemon=True)
+        self.autoscale_thread.start()
+            
+        os.makedirs(self.download_dir, exist_ok=True)
+        
+    def resize_workers(self, count):
+        count = max(1, int(count))
+        metrics.set_gauge('spotifx_workers', count)
+        
+        if self.engine:
+            self.engine.resize_downloads(count)
+            self.max_concurrent = count
+            return count
+            
+        with self.pool_lock:
+            self.download_threads = [t for t in self.download_threads if t.is_alive()]
+            
+            while len(self.worker_stops) < count:
+                stop_event = threading.Event()
+                t = threading.Thread(target=self._download_worker, args=(stop_event,), daemon=True)
+                self.worker_stops.append(stop_event)
+                self.download_threads.append(t)
+                t.start()
+                
+            # Retired workers finish the job they are on before exiting
+            while len(self.worker_stops) > count:
+                self.worker_stops.pop().set()
+                
+            self.max_concurrent = count
+            
+        return count
+        
+    def get_worker_count(self):
+        if self.engine:
+            return self.engine.download_slots
+            
+        return len(self.worker_stops)
+        
+    def _record_throughput(self, tracks=0, file_size=0, throttled=0):
+        with self.throughput_lock:
+            self.throughput['tracks'] += tracks
+            self.throughput['bytes'] += file_size or 0
+            self.throughput['throttled'] += throttled
+            
+        if tracks:
+            metrics.inc('spotifx_tracks_downloaded_total', tracks)
+            metrics.inc('spotifx_bytes_downloaded_total', file_size or 0)
+        if throttled:
+            metrics.inc('spotifx_rate_limited_total', throttled)
+            
+    def _cpu_saturated(self):
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1) >= CPU_SATURATION_THRESHOLD
+        except (AttributeError, OSError):
+            return False
+            
+    def _autoscale_loop(self):
+        while not self.shutdown_flag.wait(AUTOSCALE_INTERVAL):
+            if not self.config.getboolean('General', 'adaptive_concurrency', True):
+                continue
+                
+            try:
+                self._autoscale()
+            except Exception as e:
+                logger.error(f"Worker autoscaler error: {e}")
+                
+    def _autoscale(self):
+        now = time.time()
+        elapsed = max(now - self.last_sample['time'], 1)
+        
+        with self.throughput_lock:
+            sample = dict(self.throughput)
+            self.throughput = {'tracks': 0, 'bytes': 0, 'throttled': 0}
+            
+        workers = self.get_worker_count()
+        tracks_per_minute = sample['tracks'] * 60 / elapsed
+        bytes_per_second = sample['bytes'] / elapsed
+        
+        # Bytes track real work best; fall back to tracks when files were
+        # skipped as already existing
+        rate = bytes_per_second if sample['bytes'] else tracks_per_minute
+        previous = self.last_sample
+        target = workers
+        reason = None
+        
+        if sample['throttled']:
+            target = int(workers * AUTOSCALE_DECREASE_FACTOR)
+            reason = f"{sample['throttled']} rate limit errors"
+        elif self._cpu_saturated():
+            target = int(workers * AUTOSCALE_DECREASE_FACTOR)
+            reason = "CPU saturated"
+        elif previous['rate'] is not None and previous['workers'] < workers and rate <= previous['rate']:
+            # The last step up bought nothing, the bottleneck is elsewhere
+            target = workers - 1
+            reason = "no throughput gain from extra workers"
+        elif self.download_queue.qsize() > 0 and sample['tracks']:
+            target = workers + 1
+            reason = "backlog waiting"
+            
+        target = max(self.min_workers, min(self.max_workers, target))
+        
+        self.last_sample = {'time': now, 'rate': rate, 'workers': workers}
+        
+        if target != workers:
+            logger.info(f"Adjusting download workers {workers} -> {target} ({reason}; "
+                        f"{tracks_per_minute:.1f} tracks/min, {bytes_per_second / 1024:.0f} KB/s)")
+            self.resize_workers(target)
+        
+    def _rehydrate_queue(self):
+        now = time.time()
+        resumed = 0
+        
+        for item in list(self.db.get_queue()):
+            status = item.get('status', 'pending')
+            
+            if status == 'downloading':
+                if (item.get('lease_expires_at') or 0) > now:
+                    continue
+                    
+                if not self.db.transition_queue_item(item['id'], ('downloading',), {
+                    'status': 'pending',
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'note': 'Resumed after restart'
+                }):
+                    continue
+            elif status == 'retrying':
+                self._schedule(item, delay=max(0, (item.get('next_retry_at') or 0) - now))
+                resumed += 1
+                continue
+            elif status != 'pending':
+                continue
+                
+            self._schedule(item)
+            resumed += 1
+            
+        if resumed:
+            logger.info(f"Resumed {resumed} unfinished downloads from the previous session")
+            
+    def _lease_monitor(self):
+        while not self.shutdown_flag.wait(LEASE_CHECK_INTERVAL):
+            try:
+                now = time.time()
+                
+                for item in list(self.db.get_queue('downloading')):
+                    if (item.get('lease_expires_at') or 0) > now:
+                        continue
+                        
+                    # Our own job on a live worker is slow or paused, not stuck
+                    worker = self.job_threads.get(item['id'])
+                    if item.get('lease_owner') == self.instance_id and worker and worker.is_alive():
+                        self._heartbeat(item['id'])
+                        continue
+                        
+                    if self.db.transition_queue_item(item['id'], ('downloading',), {
+                        'status': 'pending',
+                        'lease_owner': None,
+                        'lease_expires_at': None,
+                        'note': 'Reclaimed after lease expired'
+                    }):
+                        logger.warning(f"Reclaimed stuck download {item['id'][:8]}... (no heartbeat for {JOB_LEASE_SECONDS}s)")
+                        self._schedule(item)
+                        
+            except Exception as e:
+                logger.error(f"Lease monitor error: {e}")
+                
+    def _on_queue_change(self, item, updates):
+        if updates.get('status') not in TERMINAL_STATUSES:
+            return
+            
+        with self.jobs_lock:
+            handle = self.jobs.pop(item.get('id'), None)
+            
+            key = self._job_key(item)
+            if self.active_jobs.get(key) == item.get('id'):
+                del self.active_jobs[key]
+                
+            for track_id in self.job_tracks.pop(item.get('id'), ()):
+                if self.covered_tracks.get(track_id) == item.get('id'):
+                    del self.covered_tracks[track_id]
+                    
+        if handle:
+            handle._finish(item)
+            
+    def _job_key(self, item):
+        # Sync runs of a playlist are kept apart from plain downloads of it
+        return (item.get('type'), item.get('spotify_id'), bool(item.get('sync')), bool(item.get('prune')))
+        
+    def _find_active(self, item):
+        with self.jobs_lock:
+            item_id = self.active_jobs.get(self._job_key(item))
+            if not item_id and item.get('type') == 'track':
+                item_id = self.covered_tracks.get(item.get('spotify_id'))
                 
-                audio.save()
+            return self.jobs.get(item_id) if item_id else None
+            
+    def _cover_tracks(self, item_id, track_ids):
+        with self.jobs_lock:
+            if item_id not in self.jobs:
+                return
                 
-        except Exception as e:
-            logger.error(f"Failed to apply metadata to {file_path}: {e}")
-
-class DownloadManager:
-    def __init__(self, spotify_client, youtube_downloader, database, config):
-        self.spotify = spotify_client
-        self.youtube = youtube_downloader
-        self.db = database
-        self.config = config
+            self.job_tracks[item_id] = track_ids
+            for track_id in track_ids:
+                self.covered_tracks.setdefault(track_id, item_id)
+                
+    def _cover_from_cache(self, item):
+        # Albums and playlists whose track list is cached cover their tracks
+        # from the moment they are queued, not only once they start
+        if item.get('type') in ('album', 'playlist'):
+            track_ids = self.spotify.cached_track_ids(item['type'], item['spotify_id'])
+            if track_ids:
+                self._cover_tracks(item['id'], track_ids)
+                
+    def _attach(self, handle, item):
+        metrics.inc('spotifx_enqueue_dedup_total', type=item.get('type'))
         
-        self.max_concurrent = self.config.getint('General', 'concurrent_downloads', 3)
-        self.download_dir = self.config.get('General', 'download_dir', DEFAULT_DOWNLOAD_DIR)
+        if handle.type == item.get('type'):
+            logger.info(f"{item['type'].capitalize()} {item['spotify_id']} is already queued as {handle.id[:8]}...")
+        else:
+            logger.info(f"Track {item['spotify_id']} is part of queued {handle.type} {handle.id[:8]}...")
+            
+        # The repeat request can still raise the job's priority
+        existing = self.db.get_queue_item(handle.id) or {}
+        requested = PRIORITY_LEVELS.get(item.get('priority'), PRIORITY_LEVELS[DEFAULT_PRIORITY])
+        if requested < PRIORITY_LEVELS.get(existing.get('priority'), PRIORITY_LEVELS[DEFAULT_PRIORITY]):
+            self.set_priority(handle.id, item['priority'])
+            
+        return handle
         
-        self.download_queue = Queue()
-        self.active_downloads = []
-        self.download_threads = []
-        self.shutdown_flag = threading.Event()
+    def _enqueue(self, queue_item):
+        with self.enqueue_lock:
+            handle = self._find_active(queue_item)
+            if handle:
+                return self._attach(handle, queue_item)
+                
+            self.db.add_to_queue(queue_item)
+            handle = self._schedule(queue_item)
+            
+        self._cover_from_cache(queue_item)
         
-        for i in range(self.max_concurrent):
-            t = threading.Thread(target=self._download_worker, daemon=True)
-            self.download_threads.append(t)
-            t.start()
+        return handle
             
-        os.makedirs(self.download_dir, exist_ok=True)
+    def _schedule(self, item, delay=0):
+        with self.jobs_lock:
+            handle = self.jobs.setdefault(item['id'], JobHandle(item['id'], item.get('type')))
+            self.active_jobs.setdefault(self._job_key(item), item['id'])
+            
+        task_data = {'spotify_id': item.get('spotify_id')}
+        if item.get('sync'):
+            task_data.update({'sync': True, 'prune': item.get('prune', False)})
+            
+        self.download_queue.put(
+            (item['id'], item.get('type'), task_data),
+            priority=item.get('priority', DEFAULT_PRIORITY),
+            source=item.get('source', 'default'),
+            delay=delay
+        )
+        
+        return handle
+        
+    def _retry_delay(self, kind, attempt, retry_after=None):
+        if retry_after:
+            return min(retry_after, RETRY_MAX_DELAY)
+            
+        base = RATE_LIMIT_BASE_DELAY if kind == ERROR_RATE_LIMIT else RETRY_BASE_DELAY
+        delay = min(RETRY_MAX_DELAY, base * 2 ** (attempt - 1))
+        
+        # Equal jitter keeps a floor under the delay while spreading retries
+        # of jobs that failed together
+        return delay / 2 + random.uniform(0, delay / 2)
+        
+    def _schedule_retry(self, item_id, kind, error_message, retry_after=None, updates=None):
+        item = self.db.get_queue_item(item_id)
+        if not item or kind not in RETRYABLE_ERRORS:
+            return False
+            
+        attempt = item.get('attempts', 0) + 1
+        if attempt > MAX_RETRY_COUNT:
+            return False
+            
+        delay = self._retry_delay(kind, attempt, retry_after)
+        
+        fields = dict(updates or {})
+        fields.update({
+            'status': 'retrying',
+            'attempts': attempt,
+            'error': error_message,
+            'error_kind': kind,
+            'next_retry_at': time.time() + delay,
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'note': f"Retry {attempt}/{MAX_RETRY_COUNT} in {int(delay)}s ({kind.replace('_', ' ')})"
+        })
+        
+        if not self.db.transition_queue_item(item_id, ('downloading',), fields):
+            return False
+            
+        metrics.inc('spotifx_job_retries_total', kind=kind)
+        logger.warning(f"Retrying {item.get('type', 'item')} {item_id[:8]}... in {int(delay)}s after {kind.replace('_', ' ')} error: {error_message}")
+        self._schedule(item, delay=delay)
+        
+        return True
+        
+    def _handle_failure(self, item_id, error):
+        kind, retry_after = classify_error(error)
+        if kind == ERROR_RATE_LIMIT:
+            self._record_throughput(throttled=1)
+            
+        if self._schedule_retry(item_id, kind, str(error), retry_after):
+            return
+            
+        metrics.inc('spotifx_job_failures_total', kind=kind)
+        self.db.update_queue_item(item_id, {
+            'status': 'failed',
+            'error': str(error),
+            'error_kind': kind,
+            'dead_letter': True,
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'completed_at': datetime.now().isoformat()
+        })
+        
+    def _record_track_failure(self, track_failures, track, error):
+        kind, _ = classify_error(error)
+        if kind == ERROR_RATE_LIMIT:
+            self._record_throughput(throttled=1)
+            
+        track_failures[track['id']] = {
+            'track_name': track.get('name', ''),
+            'error': str(error),
+            'error_kind': kind
+        }
+        
+    def _retry_failed_tracks(self, item_id, track_failures, checkpoint):
+        retryable = [failure for failure in track_failures.values() if failure['error_kind'] in RETRYABLE_ERRORS]
+        if not retryable:
+            return False
+            
+        # Next pass walks the list from the top again, skipping finished tracks
+        # and the ones that failed for good
+        updates = dict(checkpoint)
+        updates['next_track_index'] = 0
+        
+        kind = ERROR_RATE_LIMIT if any(failure['error_kind'] == ERROR_RATE_LIMIT for failure in retryable) else ERROR_TRANSIENT
+        message = f"{len(retryable)} tracks failed, last error: {retryable[-1]['error']}"
+        
+        return self._schedule_retry(item_id, kind, message, updates=updates)
+        
+    def _yield_job(self, item_id, checkpoint):
+        # Give the worker back to waiting jobs; the checkpoint lets the job
+        # resume at the current track when it is picked up again
+        item = self.db.get_queue_item(item_id)
+        if not item or not self.download_queue.has_waiting(item.get('priority', DEFAULT_PRIORITY), item.get('source', 'default')):
+            return False
+            
+        updates = dict(checkpoint)
+        updates.update({
+            'status': 'pending',
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'note': f"Paused at track {checkpoint['next_track_index']+1} to let other jobs run"
+        })
+        
+        if not self.db.transition_queue_item(item_id, ('downloading',), updates):
+            return False
+            
+        self._schedule(item)
+        return True
+        
+    def _lease_fields(self, item_id):
+        now = time.time()
+        self.lease_renewals[item_id] = now
+        
+        return {
+            'lease_owner': self.instance_id,
+            'heartbeat_at': now,
+            'lease_expires_at': now + JOB_LEASE_SECONDS
+        }
+        
+    def _heartbeat(self, item_id):
+        # Progress hooks fire many times per second, so only renew the lease
+        # once a fraction of it has been used up
+        if time.time() - self.lease_renewals.get(item_id, 0) < LEASE_CHECK_INTERVAL:
+            return
+            
+        self.db.update_queue_item(item_id, self._lease_fields(item_id))
+        
+    def _claim_job(self, item_id):
+        updates = {'status': 'downloading', 'started_at': datetime.now().isoformat()}
+        updates.update(self._lease_fields(item_id))
+        
+        # The token exists before the item shows as downloading, so a cancel
+        # cannot slip in between; it goes again if the claim fails
+        token = threading.Event()
+        owned = self.cancel_tokens.setdefault(item_id, token) is token
+        if self.db.transition_queue_item(item_id, ('pending', 'retrying'), updates):
+            return True
+            
+        if owned:
+            self.cancel_tokens.pop(item_id, None)
+        return False
+        
+    def _load_checkpoint(self, item_id, total_tracks):
+        queue_item = self.db.get_queue_item(item_id) or {}
         
-    def _download_worker(self):
-        while not self.shutdown_flag.is_set():
+        return (
+            min(queue_item.get('next_track_index') or 0, total_tracks),
+            queue_item.get('completed_tracks', 0),
+            list(queue_item.get('tracks', [])),
+            dict(queue_item.get('track_failures', {}))
+        )
+        
+    def _download_worker(self, stop_event):
+        while not self.shutdown_flag.is_set() and not stop_event.is_set():
+            if not self.running.wait(timeout=1):
+                continue
+                
             try:
                 task = self.download_queue.get(timeout=1)
                 if task is None:
@@ -974,28 +3970,13 @@ class DownloadManager:
                     continue
                     
                 item_id, task_type, task_data = task
+                resolved = self.prefetcher.take(item_id) if self.prefetcher else {}
                 
-                self.db.update_queue_item(item_id, {'status': 'downloading'})
-                
-                try:
-                    if task_type == 'track':
-                        self._download_track(item_id, task_data)
-                    elif task_type == 'album':
-                        self._download_album(item_id, task_data)
-                    elif task_type == 'playlist':
-                        self._download_playlist(item_id, task_data)
-                    else:
-                        logger.error(f"Unknown task type: {task_type}")
-                        self.db.update_queue_item(item_id, {'status': 'failed', 'error': 'Unknown task type'})
-                        
-                except Exception as e:
-                    logger.error(f"Download failed for {task_type} {item_id}: {e}")
-                    self.db.update_queue_item(item_id, {
-                        'status': 'failed',
-                        'error': str(e),
-                        'completed_at': datetime.now().isoformat()
-                    })
-                
+                # Claim fails when the item was canceled, finished or already
+                # picked up by someone else
+                if self._claim_job(item_id):
+                    self._run_task(item_id, task_type, task_data, **resolved)
+                    
                 self.download_queue.task_done()
                 
             except Empty:
@@ -1004,13 +3985,114 @@ class DownloadManager:
                 logger.error(f"Download worker error: {e}")
                 time.sleep(1)
                 
-    def _download_track(self, item_id, track_data):
+    def _find_reusable(self, track, output_path):
+        isrc = track.get('external_ids', {}).get('isrc')
+        
+        if os.path.exists(output_path):
+            self.library.add(track.get('id'), output_path, isrc)
+            return output_path, 'existing'
+            
+        existing_path = self.library.lookup(track.get('id'), isrc)
+        if not existing_path:
+            return None, None
+            
+        reuse_mode = self.config.get('Library', 'reuse_mode', 'hardlink')
+        path = self.library.link(existing_path, output_path, reuse_mode)
+        logger.info(f"Reusing library file for {track.get('name', track.get('id'))}: {existing_path}")
+        
+        return path, 'linked'
+        
+    def _index_download(self, track, file_path):
+        fingerprint = None
+        if self.config.getboolean('Library', 'fingerprint', False):
+            fingerprint = self.library.fingerprint(file_path)
+            
+        # Same recording under a different Spotify ID and ISRC (single vs
+        # album release): keep one copy on disk and link the other to it
+        duplicate = self.library.lookup(fingerprint=fingerprint) if fingerprint else None
+        reuse_mode = self.config.get('Library', 'reuse_mode', 'hardlink')
+        if duplicate and os.path.abspath(duplicate) != os.path.abspath(file_path) and reuse_mode in ('hardlink', 'symlink'):
+            logger.info(f"{file_path} duplicates {duplicate}, linking instead of keeping both")
+            os.remove(file_path)
+            self.library.link(duplicate, file_path, reuse_mode)
+            
+        self.library.add(track.get('id'), file_path, track.get('external_ids', {}).get('isrc'), fingerprint)
+        
+    def _run_task(self, item_id, task_type, task_data, **resolved):
+        self.job_threads[item_id] = threading.current_thread()
+        
+        with logger.job(item_id):
+            try:
+                self._check_job(item_id)
+                
+                if task_type == 'track':
+                    self._download_track(item_id, task_data, **resolved)
+                elif task_type == 'album':
+                    self._download_album(item_id, task_data)
+                elif task_type == 'playlist':
+                    self._download_playlist(item_id, task_data)
+                else:
+                    logger.error(f"Unknown task type: {task_type}")
+                    self.db.update_queue_item(item_id, {'status': 'failed', 'error': 'Unknown task type', 'error_kind': ERROR_PERMANENT})
+                    
+            except JobCanceled:
+                # _complete_job ends up here too when the lease was reclaimed
+                # and the item went back to the queue
+                if self.db.transition_queue_item(item_id, ('canceled',), {'note': 'Canceled while downloading'}):
+                    logger.info(f"Stopped {task_type} {item_id}, it was canceled")
+                else:
+                    logger.info(f"Stopped {task_type} {item_id}, its lease was reclaimed")
+            except Exception as e:
+                logger.error(f"Download failed for {task_type} {item_id}: {e}")
+                self._handle_failure(item_id, e)
+            
+        self.progress.discard(item_id)
+        self.lease_renewals.pop(item_id, None)
+        self.job_threads.pop(item_id, None)
+        self.cancel_tokens.pop(item_id, None)
+        
+    def _check_job(self, item_id):
+        # Called between tracks and from the yt-dlp progress hook: blocks
+        # while downloads are paused and raises once the job is canceled,
+        # which aborts a transfer in progress
+        token = self.cancel_tokens.get(item_id)
+        
+        while not self.running.wait(timeout=0.5):
+            if self.shutdown_flag.is_set() or (token is not None and token.is_set()):
+                break
+            self._heartbeat(item_id)
+                
+        if token is not None and token.is_set():
+            raise JobCanceled(f"Job {item_id} was canceled")
+            
+    def _job_hook(self, item_id, report=False):
+        channel = self.progress.channel(item_id) if report else None
+        
+        def hook(info):
+            # Keeps the lease alive through long transfers on the thread
+            # engine, which has no heartbeat loop of its own
+            self._heartbeat(item_id)
+            self._check_job(item_id)
+            if channel:
+                channel(info)
+                
+        return hook
+        
+    def _complete_job(self, item_id, updates):
+        # Only a job still marked downloading may complete; one canceled in
+        # the meantime stays canceled and skips its download record
+        updates = dict(updates, status='completed')
+        if not self.db.transition_queue_item(item_id, ('downloading',), updates):
+            raise JobCanceled(f"Job {item_id} was canceled")
+            
+    def _download_track(self, item_id, track_data, track_info=None, best_match=None, cover_data=None):
         try:
             track_id = track_data.get('spotify_id')
             if not track_id:
                 raise ValueError("No Spotify track ID provided")
                 
-            track_info = self.spotify.get_track(track_id)
+            if not track_info:
+                track_info = self.spotify.get_track(track_id)
             if not track_info:
                 raise ValueError(f"Could not get track info for {track_id}")
                 
@@ -1021,16 +4103,6 @@ class DownloadManager:
                 'progress': 10
             })
             
-            best_match = self.youtube.find_best_match(track_info)
-            if not best_match:
-                raise ValueError(f"Could not find YouTube match for {track_info['name']}")
-                
-            self.db.update_queue_item(item_id, {
-                'youtube_id': best_match['id'],
-                'youtube_title': best_match['title'],
-                'progress': 20
-            })
-            
             album_art_url = None
             if track_info.get('album', {}).get('images'):
                 album_art_url = track_info['album']['images'][0]['url']
@@ -1044,33 +4116,43 @@ class DownloadManager:
             os.makedirs(album_dir, exist_ok=True)
             
             track_number = str(track_info.get('track_number', 0)).zfill(2)
-            filename = f"{track_number}. {track_name}.mp3"
+            filename = f"{track_number}. {track_name}.{self.audio_format}"
             output_path = os.path.join(album_dir, filename)
             
-            if os.path.exists(output_path):
-                self.db.update_queue_item(item_id, {
-                    'status': 'completed',
+            existing_path, existing_status = self._find_reusable(track_info, output_path)
+            if existing_path:
+                self._complete_job(item_id, {
                     'progress': 100,
-                    'file_path': output_path,
+                    'file_path': existing_path,
                     'completed_at': datetime.now().isoformat(),
-                    'note': 'File already exists'
+                    'note': 'File already exists' if existing_status == 'existing' else 'Reused from library'
                 })
                 
                 self.db.add_download_record({
                     'type': 'track',
                     'spotify_id': track_id,
-                    'youtube_id': best_match['id'],
                     'track_name': track_info['name'],
                     'artist_name': track_info['artists'][0]['name'],
                     'album_name': track_info['album']['name'],
-                    'file_path': output_path,
-                    'file_size': os.path.getsize(output_path),
+                    'file_path': existing_path,
+                    'file_size': os.path.getsize(existing_path),
                     'source': 'spotify',
-                    'status': 'existing'
+                    'status': existing_status
                 })
                 
                 return
                 
+            if not best_match:
+                best_match = self.youtube.find_best_match(track_info)
+            if not best_match:
+                raise NoMatchError(f"Could not find YouTube match for {track_info['name']}")
+                
+            self.db.update_queue_item(item_id, {
+                'youtube_id': best_match['id'],
+                'youtube_title': best_match['title'],
+                'progress': 20
+            })
+            
             release_date = track_info.get('album', {}).get('release_date', '')
             track_number = track_info.get('track_number', 0)
             disc_number = track_info.get('disc_number', 1)
@@ -1082,38 +4164,26 @@ class DownloadManager:
                 'date': release_date,
                 'track_number': f"{track_number}/{track_info['album']['total_tracks']}",
                 'disc_number': disc_number,
-                'cover_url': album_art_url
+                'cover_url': album_art_url,
+                'cover_data': cover_data
             }
             
-            def progress_hook(info):
-                if info['status'] == 'downloading':
-                    downloaded = info.get('downloaded_bytes', 0)
-                    total = info.get('total_bytes') or info.get('total_bytes_estimate', 0)
-                    
-                    if total > 0:
-                        progress = int(30 + (downloaded / total) * 50)
-                        self.db.update_queue_item(item_id, {'progress': progress})
-                        
-                elif info['status'] == 'finished':
-                    self.db.update_queue_item(item_id, {'progress': 80})
-                    
-            self.youtube.add_progress_hook(progress_hook)
-            
             downloaded_file = self.youtube.download_audio(
                 best_match['id'], 
                 output_path, 
-                metadata
+                metadata,
+                progress=self._job_hook(item_id, report=True),
+                alternates=best_match.get('alternates')
             )
             
-            self.youtube.progress_hooks.remove(progress_hook)
-            
             if not downloaded_file or not os.path.exists(downloaded_file):
                 raise ValueError(f"Download failed for {track_info['name']}")
                 
             file_size = os.path.getsize(downloaded_file)
+            self._record_throughput(tracks=1, file_size=file_size)
+            self._index_download(track_info, downloaded_file)
             
-            self.db.update_queue_item(item_id, {
-                'status': 'completed',
+            self._complete_job(item_id, {
                 'progress': 100,
                 'file_path': downloaded_file,
                 'file_size': file_size,
@@ -1134,13 +4204,10 @@ class DownloadManager:
             
             logger.info(f"Track downloaded: {track_info['name']}")
             
+        except JobCanceled:
+            raise
         except Exception as e:
             logger.error(f"Track download failed: {e}")
-            self.db.update_queue_item(item_id, {
-                'status': 'failed',
-                'error': str(e),
-                'completed_at': datetime.now().isoformat()
-            })
             raise
             
     def _download_album(self, item_id, album_data):
@@ -1162,9 +4229,13 @@ class DownloadManager:
             
             tracks = album_info['tracks']['items']
             total_tracks = len(tracks)
-            completed_tracks = 0
-            failed_tracks = 0
-            track_results = []
+            self._cover_tracks(item_id, [track['id'] for track in tracks if track.get('id')])
+            start_index, completed_tracks, track_results, track_failures = self._load_checkpoint(item_id, total_tracks)
+            done_ids = {result['spotify_id'] for result in track_results}
+            processed = 0
+            
+            if start_index:
+                logger.info(f"Resuming album {album_info['name']} at track {start_index+1}/{total_tracks}")
             
             artist_name = sanitize_filename(album_info['artists'][0]['name'])
             album_name = sanitize_filename(album_info['name'])
@@ -1172,40 +4243,60 @@ class DownloadManager:
             album_dir = os.path.join(artist_dir, album_name)
             os.makedirs(album_dir, exist_ok=True)
             
-            for i, track in enumerate(tracks):
+            for i, track in enumerate(tracks[start_index:], start_index):
+                failure = track_failures.get(track['id'])
+                if track['id'] in done_ids or (failure and failure['error_kind'] not in RETRYABLE_ERRORS):
+                    continue
+                    
                 track_progress = 5 + int((i / total_tracks) * 90)
-                self.db.update_queue_item(item_id, {
+                checkpoint = {
                     'progress': track_progress,
-                    'note': f"Downloading track {i+1}/{total_tracks}: {track['name']}"
-                })
+                    'note': f"Downloading track {i+1}/{total_tracks}: {track['name']}",
+                    'next_track_index': i,
+                    'completed_tracks': completed_tracks,
+                    'failed_tracks': len(track_failures),
+                    'tracks': list(track_results),
+                    'track_failures': dict(track_failures)
+                }
+                
+                self._check_job(item_id)
+                if processed and processed % JOB_TIME_SLICE == 0 and self._yield_job(item_id, checkpoint):
+                    return
+                    
+                processed += 1
+                track_failures.pop(track['id'], None)
+                checkpoint.update(self._lease_fields(item_id))
+                self.db.update_queue_item(item_id, checkpoint)
                 
                 try:
                     track_info = self.spotify.get_track(track['id'])
                     if not track_info:
                         logger.warning(f"Could not get details for track {track['id']}")
-                        continue
-                        
-                    best_match = self.youtube.find_best_match(track_info)
-                    if not best_match:
-                        logger.warning(f"Could not find YouTube match for {track_info['name']}")
-                        failed_tracks += 1
+                        self._record_track_failure(track_failures, track, ValueError(f"Could not get details for track {track['id']}"))
                         continue
                         
                     track_number = str(track_info.get('track_number', i+1)).zfill(2)
                     track_name = sanitize_filename(track_info['name'])
-                    filename = f"{track_number}. {track_name}.mp3"
+                    filename = f"{track_number}. {track_name}.{self.audio_format}"
                     output_path = os.path.join(album_dir, filename)
                     
-                    if os.path.exists(output_path):
+                    existing_path, existing_status = self._find_reusable(track_info, output_path)
+                    if existing_path:
                         completed_tracks += 1
                         track_results.append({
                             'spotify_id': track['id'],
                             'track_name': track['name'],
-                            'file_path': output_path,
-                            'status': 'existing'
+                            'file_path': existing_path,
+                            'status': existing_status
                         })
                         continue
                         
+                    best_match = self.youtube.find_best_match(track_info)
+                    if not best_match:
+                        logger.warning(f"Could not find YouTube match for {track_info['name']}")
+                        self._record_track_failure(track_failures, track, NoMatchError(f"Could not find YouTube match for {track_info['name']}"))
+                        continue
+                        
                     album_art_url = None
                     if album_info.get('images'):
                         album_art_url = album_info['images'][0]['url']
@@ -1224,12 +4315,14 @@ class DownloadManager:
                     downloaded_file = self.youtube.download_audio(
                         best_match['id'], 
                         output_path, 
-                        metadata
+                        metadata,
+                        progress=self._job_hook(item_id),
+                        alternates=best_match.get('alternates')
                     )
                     
                     if not downloaded_file or not os.path.exists(downloaded_file):
                         logger.warning(f"Download failed for {track_info['name']}")
-                        failed_tracks += 1
+                        self._record_track_failure(track_failures, track, ValueError(f"Download failed for {track_info['name']}"))
                         continue
                         
                     completed_tracks += 1
@@ -1241,19 +4334,38 @@ class DownloadManager:
                         'file_size': os.path.getsize(downloaded_file),
                         'status': 'downloaded'
                     })
+                    self._record_throughput(tracks=1, file_size=track_results[-1]['file_size'])
+                    self._index_download(track_info, downloaded_file)
                     
+                except JobCanceled:
+                    raise
                 except Exception as e:
                     logger.error(f"Failed to download track {track['name']}: {e}")
-                    failed_tracks += 1
+                    self._record_track_failure(track_failures, track, e)
                     
-            self.db.update_queue_item(item_id, {
-                'status': 'completed',
+            failed_tracks = len(track_failures)
+            
+            if self._retry_failed_tracks(item_id, track_failures, {
+                'completed_tracks': completed_tracks,
+                'failed_tracks': failed_tracks,
+                'tracks': list(track_results),
+                'track_failures': dict(track_failures)
+            }):
+                return
+                
+            self.youtube.apply_album_gain([
+                (result['youtube_id'], result['file_path'])
+                for result in track_results if result.get('youtube_id')
+            ])
+                
+            self._complete_job(item_id, {
                 'progress': 100,
                 'completed_tracks': completed_tracks,
                 'failed_tracks': failed_tracks,
+                'track_failures': dict(track_failures),
                 'dir_path': album_dir,
                 'completed_at': datetime.now().isoformat(),
-                'tracks': track_results
+                'tracks': list(track_results)
             })
             
             self.db.add_download_record({
@@ -1265,19 +4377,16 @@ class DownloadManager:
                 'completed_tracks': completed_tracks,
                 'failed_tracks': failed_tracks,
                 'dir_path': album_dir,
-                'tracks': track_results,
+                'tracks': list(track_results),
                 'source': 'spotify'
             })
             
             logger.info(f"Album downloaded: {album_info['name']} - {completed_tracks}/{total_tracks} tracks")
             
+        except JobCanceled:
+            raise
         except Exception as e:
             logger.error(f"Album download failed: {e}")
-            self.db.update_queue_item(item_id, {
-                'status': 'failed',
-                'error': str(e),
-                'completed_at': datetime.now().isoformat()
-            })
             raise
             
     def _download_playlist(self, item_id, playlist_data):
@@ -1286,7 +4395,28 @@ class DownloadManager:
             if not playlist_id:
                 raise ValueError("No Spotify playlist ID provided")
                 
-            playlist_info = self.spotify.get_playlist(playlist_id)
+            sync = playlist_data.get('sync', False)
+            manifest = self.db.get_playlist_manifest(playlist_id) if sync else None
+            
+            unchanged = (
+                manifest and manifest.get('complete')
+                and all(os.path.exists(path) for path in manifest.get('tracks', {}).values())
+                and self.spotify.get_playlist_snapshot(playlist_id) == manifest.get('snapshot_id')
+            )
+            
+            if unchanged:
+                self._complete_job(item_id, {
+                    'progress': 100,
+                    'playlist_name': manifest.get('name'),
+                    'completed_tracks': 0,
+                    'dir_path': manifest.get('dir_path'),
+                    'completed_at': datetime.now().isoformat(),
+                    'note': 'Playlist unchanged since last sync'
+                })
+                logger.info(f"Playlist {manifest.get('name', playlist_id)} unchanged since last sync")
+                return
+                
+            playlist_info = self.spotify.get_playlist(playlist_id, use_cache=not sync)
             if not playlist_info:
                 raise ValueError(f"Could not get playlist info for {playlist_id}")
                 
@@ -1297,11 +4427,25 @@ class DownloadManager:
                 'progress': 5
             })
             
-            tracks = [item['track'] for item in playlist_info['tracks']['items'] if item['track']]
+            tracks = [item['track'] for item in playlist_info['tracks']['items'] if item['track'] and item['track'].get('id')]
+            current_ids = {track['id'] for track in tracks}
+            synced = {}
+            removed = {}
+            
+            if manifest:
+                synced = {track_id: path for track_id, path in manifest.get('tracks', {}).items() if os.path.exists(path)}
+                removed = {track_id: path for track_id, path in synced.items() if track_id not in current_ids}
+                tracks = [track for track in tracks if track['id'] not in synced]
+                logger.info(f"Syncing playlist {playlist_info['name']}: {len(tracks)} new, {len(removed)} removed")
+                
             total_tracks = len(tracks)
-            completed_tracks = 0
-            failed_tracks = 0
-            track_results = []
+            self._cover_tracks(item_id, [track['id'] for track in tracks])
+            start_index, completed_tracks, track_results, track_failures = self._load_checkpoint(item_id, total_tracks)
+            done_ids = {result['spotify_id'] for result in track_results}
+            processed = 0
+            
+            if start_index:
+                logger.info(f"Resuming playlist {playlist_info['name']} at track {start_index+1}/{total_tracks}")
             
             playlist_dir = self.download_dir
             if self.config.getboolean('Spotify', 'create_playlist_folders', True):
@@ -1309,36 +4453,59 @@ class DownloadManager:
                 playlist_dir = os.path.join(self.download_dir, 'Playlists', playlist_name)
                 os.makedirs(playlist_dir, exist_ok=True)
                 
-            for i, track in enumerate(tracks):
+            if removed and playlist_data.get('prune'):
+                for track_id in self._prune_playlist_tracks(removed, playlist_dir):
+                    synced.pop(track_id, None)
+                    
+            for i, track in enumerate(tracks[start_index:], start_index):
+                failure = track_failures.get(track['id'])
+                if track['id'] in done_ids or (failure and failure['error_kind'] not in RETRYABLE_ERRORS):
+                    continue
+                    
                 track_progress = 5 + int((i / total_tracks) * 90)
-                self.db.update_queue_item(item_id, {
+                checkpoint = {
                     'progress': track_progress,
-                    'note': f"Downloading track {i+1}/{total_tracks}: {track['name']}"
-                })
+                    'note': f"Downloading track {i+1}/{total_tracks}: {track['name']}",
+                    'next_track_index': i,
+                    'completed_tracks': completed_tracks,
+                    'failed_tracks': len(track_failures),
+                    'tracks': list(track_results),
+                    'track_failures': dict(track_failures)
+                }
+                
+                self._check_job(item_id)
+                if processed and processed % JOB_TIME_SLICE == 0 and self._yield_job(item_id, checkpoint):
+                    return
+                    
+                processed += 1
+                track_failures.pop(track['id'], None)
+                checkpoint.update(self._lease_fields(item_id))
+                self.db.update_queue_item(item_id, checkpoint)
                 
                 try:
-                    best_match = self.youtube.find_best_match(track)
-                    if not best_match:
-                        logger.warning(f"Could not find YouTube match for {track['name']}")
-                        failed_tracks += 1
-                        continue
-                        
                     artist_name = sanitize_filename(track['artists'][0]['name'])
                     track_name = sanitize_filename(track['name'])
-                    filename = f"{artist_name} - {track_name}.mp3"
+                    filename = f"{artist_name} - {track_name}.{self.audio_format}"
                     output_path = os.path.join(playlist_dir, filename)
                     
-                    if os.path.exists(output_path):
+                    existing_path, existing_status = self._find_reusable(track, output_path)
+                    if existing_path:
                         completed_tracks += 1
                         track_results.append({
                             'spotify_id': track['id'],
                             'track_name': track['name'],
                             'artist_name': track['artists'][0]['name'],
-                            'file_path': output_path,
-                            'status': 'existing'
+                            'file_path': existing_path,
+                            'status': existing_status
                         })
                         continue
                         
+                    best_match = self.youtube.find_best_match(track)
+                    if not best_match:
+                        logger.warning(f"Could not find YouTube match for {track['name']}")
+                        self._record_track_failure(track_failures, track, NoMatchError(f"Could not find YouTube match for {track['name']}"))
+                        continue
+                        
                     album_art_url = None
                     if track.get('album', {}).get('images'):
                         album_art_url = track['album']['images'][0]['url']
@@ -1355,12 +4522,14 @@ class DownloadManager:
                     downloaded_file = self.youtube.download_audio(
                         best_match['id'], 
                         output_path, 
-                        metadata
+                        metadata,
+                        progress=self._job_hook(item_id),
+                        alternates=best_match.get('alternates')
                     )
                     
                     if not downloaded_file or not os.path.exists(downloaded_file):
                         logger.warning(f"Download failed for {track['name']}")
-                        failed_tracks += 1
+                        self._record_track_failure(track_failures, track, ValueError(f"Download failed for {track['name']}"))
                         continue
                         
                     completed_tracks += 1
@@ -1373,19 +4542,33 @@ class DownloadManager:
                         'file_size': os.path.getsize(downloaded_file),
                         'status': 'downloaded'
                     })
+                    self._record_throughput(tracks=1, file_size=track_results[-1]['file_size'])
+                    self._index_download(track, downloaded_file)
                     
+                except JobCanceled:
+                    raise
                 except Exception as e:
                     logger.error(f"Failed to download track {track['name']}: {e}")
-                    failed_tracks += 1
+                    self._record_track_failure(track_failures, track, e)
                     
-            self.db.update_queue_item(item_id, {
-                'status': 'completed',
+            failed_tracks = len(track_failures)
+            
+            if self._retry_failed_tracks(item_id, track_failures, {
+                'completed_tracks': completed_tracks,
+                'failed_tracks': failed_tracks,
+                'tracks': list(track_results),
+                'track_failures': dict(track_failures)
+            }):
+                return
+                
+            self._complete_job(item_id, {
                 'progress': 100,
                 'completed_tracks': completed_tracks,
                 'failed_tracks': failed_tracks,
+                'track_failures': dict(track_failures),
                 'dir_path': playlist_dir,
                 'completed_at': datetime.now().isoformat(),
-                'tracks': track_results
+                'tracks': list(track_results)
             })
             
             self.db.add_download_record({
@@ -1397,99 +4580,296 @@ class DownloadManager:
                 'completed_tracks': completed_tracks,
                 'failed_tracks': failed_tracks,
                 'dir_path': playlist_dir,
-                'tracks': track_results,
+                'tracks': list(track_results),
                 'source': 'spotify'
             })
             
+            # Tracks dropped from the playlist but not pruned stay in the
+            # manifest so a later --prune still knows about them
+            synced.update({result['spotify_id']: result['file_path'] for result in track_results})
+            self.db.set_playlist_manifest(playlist_id, {
+                'name': playlist_info['name'],
+                'snapshot_id': playlist_info.get('snapshot_id'),
+                'dir_path': playlist_dir,
+                'tracks': synced,
+                'complete': not failed_tracks,
+                'synced_at': datetime.now().isoformat()
+            })
+            
             logger.info(f"Playlist downloaded: {playlist_info['name']} - {completed_tracks}/{total_tracks} tracks")
             
+        except JobCanceled:
+            raise
         except Exception as e:
             logger.error(f"Playlist download failed: {e}")
-            self.db.update_queue_item(item_id, {
-                'status': 'failed',
-                'error': str(e),
-                'completed_at': datetime.now().isoformat()
-            })
             raise
             
-    def queue_track(self, track_id):
-        if track_id.startswith('http'):
-            match = re.search(r'/track/([a-zA-Z0-9]+)', track_id)
-            if match:
-                track_id = match.group(1)
+    def add_listener(self, callback):
+        # callback(event) gets a dict for every queue item change that matters
+        # to a watcher: status, progress, notes and errors, not lease heartbeats
+        def on_change(item, updates):
+            if not PROGRESS_FIELDS.intersection(updates):
+                return
+                
+            status = item.get('status', 'pending')
+            event = {
+                'ts': datetime.now().isoformat(),
+                'event': STATUS_EVENTS.get(status, status) if 'status' in updates else 'progress',
+                'id': item.get('id'),
+                'type': item.get('type'),
+                'spotify_id': item.get('spotify_id'),
+                'status': status,
+                'progress': item.get('progress', 0),
+                'name': item.get('track_name') or item.get('album_name') or item.get('playlist_name')
+            }
+            
+            for field in ('note', 'error', 'error_kind', 'file_path', 'completed_tracks', 'failed_tracks'):
+                if item.get(field) is not None:
+                    event[field] = item[field]
+                    
+            callback(event)
+            
+        self.db.add_queue_listener(on_change)
+        
+    def wait_all(self, timeout=None):
+        # Blocks until every job this manager has scheduled is finished,
+        # including ones scheduled while waiting; False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        while True:
+            with self.jobs_lock:
+                pending = list(self.jobs.values())
+                
+            if not pending:
+                return True
                 
-        queue_item = {
-            'type': 'track',
-            'spotify_id': track_id,
+            for handle in pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if not handle.wait(remaining):
+                    return False
+                    
+    def _new_queue_item(self, item_type, spotify_id, priority=DEFAULT_PRIORITY, source='default'):
+        return {
+            'id': generate_unique_id(),
+            'type': item_type,
+            'spotify_id': spotify_id,
             'status': 'pending',
             'progress': 0,
+            'priority': priority,
+            'source': source,
             'added_at': datetime.now().isoformat()
         }
         
-        item_id = self.db.add_to_queue(queue_item)
+    def queue_url(self, url, priority=DEFAULT_PRIORITY, source='default'):
+        item_type, spotify_id = parse_spotify_url(url)
+        
+        if item_type == 'track':
+            return item_type, self.queue_track(spotify_id, priority=priority, source=source)
+        elif item_type == 'album':
+            return item_type, self.queue_album(spotify_id, priority=priority, source=source)
+        elif item_type == 'playlist':
+            return item_type, self.queue_playlist(spotify_id, priority=priority, source=source)
+            
+        return 'unknown', None
+        
+    def queue_many(self, lines, priority=DEFAULT_PRIORITY, source='batch', chunk_size=BATCH_CHUNK_SIZE):
+        # Consumes lines lazily and commits them in chunks, one database write
+        # per chunk, so workers start on the first items while the rest are
+        # still being read. Returns per-type counts and the job handles.
+        counts = {'track': 0, 'album': 0, 'playlist': 0, 'unknown': 0, 'duplicate': 0}
+        handles = []
+        seen = set()
+        listed = set()
+        chunk = []
+        last_flush = time.monotonic()
+        
+        def attach(handle, queue_item):
+            counts['duplicate'] += 1
+            if handle.id not in listed:
+                listed.add(handle.id)
+                handles.append(self._attach(handle, queue_item))
+                
+        def flush():
+            with self.enqueue_lock:
+                # Checked again under the lock: another caller may have
+                # queued the same job since the line was read
+                fresh = []
+                for queue_item in chunk:
+                    handle = self._find_active(queue_item)
+                    if handle:
+                        counts[queue_item['type']] -= 1
+                        attach(handle, queue_item)
+                    else:
+                        fresh.append(queue_item)
+                        
+                self.db.bulk_add_to_queue(fresh)
+                handles.extend(self._schedule(item) for item in fresh)
+                listed.update(item['id'] for item in fresh)
+                
+            for item in fresh:
+                self._cover_from_cache(item)
+            chunk.clear()
+            
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+                
+            item_type, spotify_id = parse_spotify_url(line)
+            if not item_type:
+                logger.warning(f"Skipping unrecognized URL: {line}")
+                counts['unknown'] += 1
+                continue
+                
+            if (item_type, spotify_id) in seen:
+                counts['duplicate'] += 1
+                continue
+                
+            seen.add((item_type, spotify_id))
+            queue_item = self._new_queue_item(item_type, spotify_id, priority, source)
+            
+            # Already queued, by an earlier run or as part of an album or
+            # playlist: wait on that job instead
+            handle = self._find_active(queue_item)
+            if handle:
+                attach(handle, queue_item)
+                continue
+                
+            counts[item_type] += 1
+            chunk.append(queue_item)
+            
+            # Slow producers (a pipe on stdin) still get their items out promptly
+            if len(chunk) >= chunk_size or time.monotonic() - last_flush >= BATCH_FLUSH_SECONDS:
+                flush()
+                last_flush = time.monotonic()
+                
+        if chunk:
+            flush()
+            
+        return counts, handles
+        
+    def _prune_playlist_tracks(self, removed, playlist_dir):
+        pruned = []
         
-        self.download_queue.put((item_id, 'track', {'spotify_id': track_id}))
+        for track_id, file_path in removed.items():
+            # Only touch files this playlist owns, never shared album folders
+            if os.path.dirname(os.path.abspath(file_path)) != os.path.abspath(playlist_dir):
+                continue
+                
+            try:
+                os.remove(file_path)
+                pruned.append(track_id)
+                logger.info(f"Removed {file_path}, no longer in playlist")
+            except OSError as e:
+                logger.warning(f"Could not remove {file_path}: {e}")
+                
+        return pruned
         
-        return item_id
+    def queue_track(self, track_id, priority=DEFAULT_PRIORITY, source='default'):
+        if track_id.startswith('http'):
+            match = re.search(r'/track/([a-zA-Z0-9]+)', track_id)
+            if match:
+                track_id = match.group(1)
+                
+        return self._enqueue(self._new_queue_item('track', track_id, priority, source))
         
-    def queue_album(self, album_id):
+    def queue_album(self, album_id, priority=DEFAULT_PRIORITY, source='default'):
         if album_id.startswith('http'):
             match = re.search(r'/album/([a-zA-Z0-9]+)', album_id)
             if match:
                 album_id = match.group(1)
                 
-        queue_item = {
-            'type': 'album',
-            'spotify_id': album_id,
-            'status': 'pending',
-            'progress': 0,
-            'added_at': datetime.now().isoformat()
-        }
-        
-        item_id = self.db.add_to_queue(queue_item)
-        
-        self.download_queue.put((item_id, 'album', {'spotify_id': album_id}))
-        
-        return item_id
+        return self._enqueue(self._new_queue_item('album', album_id, priority, source))
         
-    def queue_playlist(self, playlist_id):
+    def queue_playlist(self, playlist_id, priority=DEFAULT_PRIORITY, source='default', sync=False, prune=False):
         if playlist_id.startswith('http'):
             match = re.search(r'/playlist/([a-zA-Z0-9]+)', playlist_id)
             if match:
                 playlist_id = match.group(1)
                 
-        queue_item = {
-            'type': 'playlist',
-            'spotify_id': playlist_id,
-            'status': 'pending',
-            'progress': 0,
-            'added_at': datetime.now().isoformat()
-        }
+        queue_item = self._new_queue_item('playlist', playlist_id, priority, source)
+        queue_item.update({'sync': sync, 'prune': prune})
         
-        item_id = self.db.add_to_queue(queue_item)
+        return self._enqueue(queue_item)
         
-        self.download_queue.put((item_id, 'playlist', {'spotify_id': playlist_id}))
+    def _resolve_item_id(self, item_id):
+        # Menus only show the first 8 characters of an ID
+        item_id = item_id.strip().rstrip('.')
+        matches = [item['id'] for item in self.db.get_queue() if item.get('id', '').startswith(item_id)]
         
-        return item_id
+        return matches[0] if item_id and len(matches) == 1 else item_id
         
     def cancel_download(self, item_id):
-        queue_items = self.db.get_queue()
-        found = False
+        return len(self.cancel_many(item_ids=[self._resolve_item_id(item_id)])) == 1
         
-        for item in queue_items:
-            if item.get('id') == item_id:
-                found = True
+    def cancel_many(self, item_types=None, statuses=CANCELABLE_STATUSES, item_ids=None):
+        canceled = self.db.cancel_queue_items(item_types, statuses, item_ids)
+        
+        # Running jobs stop at their next progress hook or track boundary,
+        # waiting ones leave the scheduler so workers never pick them up
+        for item_id, status in canceled.items():
+            token = self.cancel_tokens.get(item_id) if status == 'downloading' else None
+            if token:
+                token.set()
                 
-                if item.get('status') == 'pending':
-                    self.db.update_queue_item(item_id, {
-                        'status': 'canceled',
-                        'completed_at': datetime.now().isoformat()
-                    })
-                    return True
-                    
-                return False
+        self.download_queue.remove(canceled)
+        
+        if canceled:
+            logger.info(f"Canceled {len(canceled)} downloads")
+            
+        return list(canceled)
+        
+    def pause(self):
+        self.running.clear()
+        logger.info("Downloads paused")
+        
+    def resume(self):
+        self.running.set()
+        logger.info("Downloads resumed")
+        
+    def is_paused(self):
+        return not self.running.is_set()
+        
+    def retry_failed(self, item_type=None):
+        retried = 0
+        
+        for item in list(self.db.get_queue('failed')):
+            if item_type and item.get('type') != item_type:
+                continue
                 
-        return False
+            # Drop the per-track failures so a retried album or playlist walks
+            # every unfinished track again
+            if self.db.transition_queue_item(item['id'], ('failed',), {
+                'status': 'pending',
+                'attempts': 0,
+                'dead_letter': False,
+                'error': None,
+                'error_kind': None,
+                'next_track_index': 0,
+                'track_failures': {},
+                'progress': 0,
+                'note': 'Queued for retry'
+            }):
+                self._schedule(item)
+                retried += 1
+                
+        return retried
+        
+    def set_priority(self, item_id, priority):
+        if priority not in PRIORITY_LEVELS:
+            return False
+            
+        item_id = self._resolve_item_id(item_id)
+        item = self.db.get_queue_item(item_id)
+        if not item or item.get('status') not in ('pending', 'downloading', 'retrying'):
+            return False
+            
+        self.db.update_queue_item(item_id, {'priority': priority})
+        self.download_queue.reprioritize(item_id, priority)
+        
+        return True
         
     def get_queue_status(self):
         queue_items = self.db.get_queue()
@@ -1498,6 +4878,7 @@ class DownloadManager:
             'pending': 0,
             'downloading': 0,
             'completed': 0,
+            'retrying': 0,
             'failed': 0,
             'canceled': 0,
             'total': len(queue_items)
@@ -1524,8 +4905,215 @@ class DownloadManager:
             if thread.is_alive():
                 thread.join(timeout=2)
                 
+        if self.engine:
+            self.engine.stop()
+            
+        self.progress.stop()
+        if self.prefetcher:
+            self.prefetcher.stop()
+        
+        # Hand interrupted jobs back so the next start resumes them right away
+        # instead of waiting for their leases to expire
+        for item in list(self.db.get_queue('downloading')):
+            if item.get('lease_owner') == self.instance_id:
+                self.db.transition_queue_item(item['id'], ('downloading',), {
+                    'status': 'pending',
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'note': 'Interrupted by shutdown'
+                })
+                
+        profiler.stop()
+        
+        self.db.flush()
+        self.library.flush()
+        if self.youtube.loudness:
+            self.youtube.loudness.flush()
         logger.info("Download manager shutdown complete.")
 
+class AsyncDownloadEngine:
+    # Runs jobs on one event loop thread instead of one blocking thread per
+    # worker. Spotify lookups and cover art go through aiohttp, YouTube search
+    # and yt-dlp downloads run on small executors, and DB writes go to the
+    # loop's default executor so they never stall the loop.
+    def __init__(self, manager, max_lookups=200, lookahead=PREFETCH_DEPTH):
+        self.manager = manager
+        self.max_lookups = max_lookups
+        self.lookahead = lookahead
+        self.resolving = {}
+        self.client = AsyncSpotifyClient(manager.spotify, max_connections=max_lookups)
+        self.search_executor = ThreadPoolExecutor(max_workers=ASYNC_SEARCH_THREADS, thread_name_prefix='spotifx-search')
+        self.download_executor = ThreadPoolExecutor(max_workers=manager.max_concurrent, thread_name_prefix='spotifx-download')
+        self.download_slots = manager.max_concurrent
+        self.loop = None
+        self.thread = None
+        
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=4, thread_name_prefix='spotifx-io'))
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+        
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        
+        try:
+            self.loop.run_until_complete(self._dispatch())
+        except Exception as e:
+            logger.error(f"Async engine stopped: {e}")
+        finally:
+            self.loop.run_until_complete(self.client.close())
+            self.loop.close()
+            
+    def resize_downloads(self, count):
+        # Executors cannot shrink in place; new jobs go to a fresh pool while
+        # the old one drains
+        old_executor = self.download_executor
+        self.download_executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix='spotifx-download')
+        self.download_slots = count
+        old_executor.shutdown(wait=False)
+        
+    def stop(self, timeout=2):
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+            
+        self.search_executor.shutdown(wait=False)
+        self.download_executor.shutdown(wait=False)
+        
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        queue = self.manager.download_queue
+        running = set()
+        
+        while not self.manager.shutdown_flag.is_set():
+            if self.manager.is_paused():
+                await asyncio.sleep(0.5)
+                continue
+                
+            # Take a job off the scheduler only once a download slot is free,
+            # so priority and fair share still decide what runs next and no
+            # lease is claimed for a job that would just wait. Checked against
+            # download_slots each time so a resize takes effect right away.
+            if len(running) >= self.download_slots:
+                self._look_ahead()
+                await asyncio.wait(running, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                continue
+                
+            try:
+                task = await loop.run_in_executor(None, queue.get, True, 1)
+            except Empty:
+                continue
+                
+            if task is None:
+                queue.task_done()
+                continue
+                
+            job = asyncio.ensure_future(self._run_job(task))
+            running.add(job)
+            job.add_done_callback(running.discard)
+            
+        for resolving in self.resolving.values():
+            resolving.cancel()
+            
+        if running:
+            await asyncio.wait(running, timeout=2)
+            
+    def _look_ahead(self):
+        # Starts resolving the next few track jobs while every download slot
+        # is busy. Nothing is claimed, so the jobs stay in the scheduler and
+        # can still be overtaken, canceled or picked up elsewhere.
+        upcoming = self.manager.download_queue.peek(self.lookahead) if self.lookahead else []
+        
+        window = {task[0] for task in upcoming}
+        for item_id in [item_id for item_id in self.resolving if item_id not in window]:
+            self.resolving.pop(item_id).cancel()
+            
+        for item_id, task_type, task_data in upcoming:
+            if task_type == 'track' and task_data.get('spotify_id') and item_id not in self.resolving:
+                self.resolving[item_id] = asyncio.ensure_future(self._resolve_track(task_data))
+                # Errors resurface when the job awaits it; one dropped from
+                # the window must not log an unretrieved exception
+                self.resolving[item_id].add_done_callback(lambda future: future.cancelled() or future.exception())
+                
+    async def _run_job(self, task):
+        loop = asyncio.get_running_loop()
+        item_id, task_type, task_data = task
+        log_job.set(item_id)
+        
+        try:
+            if not await loop.run_in_executor(None, self.manager._claim_job, item_id):
+                return
+                
+            resolved = {}
+            
+            try:
+                if task_type == 'track':
+                    resolving = self.resolving.pop(item_id, None)
+                    resolved = await (resolving or self._resolve_track(task_data))
+                elif task_type == 'album':
+                    await self._warm_album(task_data)
+                elif task_type == 'playlist' and not task_data.get('sync'):
+                    await self.client.get_playlist(task_data.get('spotify_id'))
+            except Exception as e:
+                kind, _ = classify_error(e)
+                if kind in RETRYABLE_ERRORS:
+                    logger.error(f"Download failed for {task_type} {item_id}: {e}")
+                    await loop.run_in_executor(None, self.manager._handle_failure, item_id, e)
+                    # Never reaches _run_task, which drops the token otherwise
+                    self.manager.cancel_tokens.pop(item_id, None)
+                    return
+                    
+                # Leave anything else to the regular pipeline, which reports it
+                logger.debug(f"Async lookup failed for {task_type} {item_id}: {e}")
+                resolved = {}
+                
+            await loop.run_in_executor(
+                self.download_executor,
+                lambda: self.manager._run_task(item_id, task_type, task_data, **resolved)
+            )
+        finally:
+            self.manager.download_queue.task_done()
+            
+    async def _resolve_track(self, task_data):
+        loop = asyncio.get_running_loop()
+        track_info = await self.client.get_track(task_data.get('spotify_id'))
+        
+        # Already in the library: the worker will link it, no search needed
+        if self.manager.library.lookup(track_info.get('id'), track_info.get('external_ids', {}).get('isrc')):
+            return {'track_info': track_info}
+            
+        cover_url = None
+        if track_info.get('album', {}).get('images'):
+            cover_url = track_info['album']['images'][0]['url']
+            
+        # Cover art and the match search do not depend on each other
+        match_future = loop.run_in_executor(self.search_executor, self.manager.youtube.find_best_match, track_info)
+        cover_data = None
+        
+        if cover_url and self.manager.config.getboolean('Audio', 'embed_cover_art', True):
+            try:
+                cover_data = await self.client.fetch_bytes(cover_url)
+            except Exception as e:
+                logger.debug(f"Failed to fetch cover art: {e}")
+                
+        return {
+            'track_info': track_info,
+            'best_match': await match_future,
+            'cover_data': cover_data
+        }
+        
+    async def _warm_album(self, album_data):
+        album = await self.client.get_album(album_data.get('spotify_id'))
+        lookup_slots = asyncio.Semaphore(self.max_lookups)
+        
+        async def warm_track(track_id):
+            async with lookup_slots:
+                await self.client.get_track(track_id)
+                
+        # _download_album looks every track up again; with the cache warm
+        # those calls return without touching the network
+        await asyncio.gather(*[warm_track(track['id']) for track in album['tracks']['items'] if track.get('id')])
+
 class FancyProgressBar:
     def __init__(self, total=100, prefix='', suffix='', length=50, fill='█', empty='░', style='default'):
         self.total = total
@@ -1588,12 +5176,16 @@ class FancyProgressBar:
 
 class SpotiFXApp:
     def __init__(self):
-        create_directories()
-        
         self.config = ConfigManager()
-        self.credentials = CredentialsManager()
-        self.db = DatabaseManager()
-        self.cache = CacheManager()
+        logger.configure(self.config)
+        bandwidth.configure(self.config)
+        host_slots.configure(self.config)
+        
+        # Built on first use: a quick CLI call should not load the database
+        # or cache it never touches
+        self._credentials = None
+        self._db = None
+        self._cache = None
         
         self.main_menu_options = [
             "Download a track",
@@ -1606,6 +5198,24 @@ class SpotiFXApp:
             "Exit"
         ]
         
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            self._credentials = CredentialsManager()
+        return self._credentials
+        
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = DatabaseManager()
+        return self._db
+        
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = CacheManager()
+        return self._cache
+        
     def clear_screen(self):
         os.system('cls' if os.name == 'nt' else 'clear')
         
@@ -1677,6 +5287,19 @@ class SpotiFXApp:
             return False
             
     def _setup_downloader(self):
+        create_directories()
+        
+        if self.config.getboolean('Metrics', 'profile', False):
+            profiler.start(self.config.getint('Metrics', 'profile_snapshot_interval', PROFILE_SNAPSHOT_INTERVAL))
+            
+        metrics.start_dumping(self.config.getint('Metrics', 'dump_interval', 0))
+        metrics_port = self.config.getint('Metrics', 'port', 0)
+        if metrics_port:
+            try:
+                metrics.start_server(metrics_port)
+            except OSError as e:
+                logger.warning(f"Could not serve metrics on port {metrics_port}: {e}")
+                
         self.youtube = YouTubeDownloader(self.config)
         
         self.download_manager = DownloadManager(
@@ -1740,9 +5363,9 @@ class SpotiFXApp:
             print("=" * 60)
             
             if input("\nDo you want to download this track? (y/n): ").lower() == 'y':
-                item_id = self.download_manager.queue_track(track_id)
+                job = self.download_manager.queue_track(track_id)
                 
-                print(f"{Fore.GREEN}✓ Track added to download queue (ID: {item_id[:8]}...){Style.RESET_ALL}")
+                print(f"{Fore.GREEN}✓ Track added to download queue (ID: {job.id[:8]}...){Style.RESET_ALL}")
                 
         except Exception as e:
             print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
@@ -1805,9 +5428,9 @@ class SpotiFXApp:
                 print(f"{i}. {track['name']} ({minutes}:{seconds:02d})")
                 
             if input("\nDo you want to download this album? (y/n): ").lower() == 'y':
-                item_id = self.download_manager.queue_album(album_id)
+                job = self.download_manager.queue_album(album_id)
                 
-                print(f"{Fore.GREEN}✓ Album added to download queue (ID: {item_id[:8]}...){Style.RESET_ALL}")
+                print(f"{Fore.GREEN}✓ Album added to download queue (ID: {job.id[:8]}...){Style.RESET_ALL}")
                 
         except Exception as e:
             print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
@@ -1866,9 +5489,9 @@ class SpotiFXApp:
                 print(f"{Fore.YELLOW}Warning: This playlist contains {playlist_info['tracks']['total']} tracks. Downloading may take a while.{Style.RESET_ALL}")
                 
             if input("\nDo you want to download this playlist? (y/n): ").lower() == 'y':
-                item_id = self.download_manager.queue_playlist(playlist_id)
+                job = self.download_manager.queue_playlist(playlist_id)
                 
-                print(f"{Fore.GREEN}✓ Playlist added to download queue (ID: {item_id[:8]}...){Style.RESET_ALL}")
+                print(f"{Fore.GREEN}✓ Playlist added to download queue (ID: {job.id[:8]}...){Style.RESET_ALL}")
                 
         except Exception as e:
             print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
@@ -1888,9 +5511,12 @@ class SpotiFXApp:
         print(f"{Fore.CYAN}Pending:{Style.RESET_ALL} {queue_status.get('pending', 0)}")
         print(f"{Fore.CYAN}Downloading:{Style.RESET_ALL} {queue_status.get('downloading', 0)}")
         print(f"{Fore.CYAN}Completed:{Style.RESET_ALL} {queue_status.get('completed', 0)}")
+        print(f"{Fore.CYAN}Retrying:{Style.RESET_ALL} {queue_status.get('retrying', 0)}")
         print(f"{Fore.CYAN}Failed:{Style.RESET_ALL} {queue_status.get('failed', 0)}")
         print(f"{Fore.CYAN}Canceled:{Style.RESET_ALL} {queue_status.get('canceled', 0)}")
         print(f"{Fore.CYAN}Total:{Style.RESET_ALL} {queue_status.get('total', 0)}")
+        if self.download_manager.is_paused():
+            print(f"{Fore.YELLOW}Downloads are paused{Style.RESET_ALL}")
         print("=" * 60)
         
         active_queue = self.db.get_queue('downloading')
@@ -1928,11 +5554,15 @@ class SpotiFXApp:
                     except:
                         pass
                         
-                print(f"ID: {item.get('id', '')[:8]}... | {item.get('type', 'unknown').capitalize()} | Added: {added_at}")
+                print(f"ID: {item.get('id', '')[:8]}... | {item.get('type', 'unknown').capitalize()} | Priority: {item.get('priority', DEFAULT_PRIORITY).capitalize()} | Added: {added_at}")
                 
         print("\nOptions:")
         print("1. Refresh Queue")
         print("2. Cancel Download")
+        print("3. Change Priority")
+        print("4. Retry Failed Downloads")
+        print("5. Cancel Downloads by Type or Status")
+        print(f"6. {'Resume' if self.download_manager.is_paused() else 'Pause'} Downloads")
         print("0. Back to Main Menu")
         
         choice = input("\nEnter your choice: ")
@@ -1944,7 +5574,56 @@ class SpotiFXApp:
             if self.download_manager.cancel_download(item_id):
                 print(f"{Fore.GREEN}✓ Download canceled successfully{Style.RESET_ALL}")
             else:
-                print(f"{Fore.RED}Could not cancel download. It may be already in progress or completed.{Style.RESET_ALL}")
+                print(f"{Fore.RED}Could not cancel download. Check the ID; it may have already finished.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+            self.display_queue_menu()
+        elif choice == "3":
+            item_id = input("Enter the ID of the download to reprioritize: ")
+            priority = input(f"Enter new priority ({'/'.join(PRIORITY_LEVELS)}): ").lower()
+            if self.download_manager.set_priority(item_id, priority):
+                print(f"{Fore.GREEN}✓ Priority updated to {priority}{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.RED}Could not change priority. Check the ID and priority level.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+            self.display_queue_menu()
+        elif choice == "4":
+            failed_queue = self.db.get_queue('failed')
+            
+            if not failed_queue:
+                print(f"{Fore.YELLOW}No failed downloads to retry.{Style.RESET_ALL}")
+            else:
+                for item in failed_queue:
+                    print(f"ID: {item.get('id', '')[:8]}... | {item.get('type', 'unknown').capitalize()} | {item.get('error_kind') or 'unknown'}: {item.get('error', '')}")
+                    
+                item_type = input("\nRetry which type? (track/album/playlist, Enter for all): ").lower() or None
+                retried = self.download_manager.retry_failed(item_type)
+                print(f"{Fore.GREEN}✓ {retried} downloads queued for retry{Style.RESET_ALL}")
+                
+            input("\nPress Enter to continue...")
+            self.display_queue_menu()
+        elif choice == "5":
+            item_type = input("\nCancel which type? (track/album/playlist, Enter for all): ").lower() or None
+            status = input(f"Cancel which status? ({'/'.join(CANCELABLE_STATUSES)}, Enter for all): ").lower() or None
+            
+            if status and status not in CANCELABLE_STATUSES:
+                print(f"{Fore.RED}Only unfinished downloads can be canceled.{Style.RESET_ALL}")
+            elif input(f"{Fore.YELLOW}Cancel every matching download? (y/n): {Style.RESET_ALL}").lower() == 'y':
+                canceled = self.download_manager.cancel_many(
+                    item_types=[item_type] if item_type else None,
+                    statuses=(status,) if status else CANCELABLE_STATUSES
+                )
+                print(f"{Fore.GREEN}✓ {len(canceled)} downloads canceled{Style.RESET_ALL}")
+                
+            input("\nPress Enter to continue...")
+            self.display_queue_menu()
+        elif choice == "6":
+            if self.download_manager.is_paused():
+                self.download_manager.resume()
+                print(f"{Fore.GREEN}✓ Downloads resumed{Style.RESET_ALL}")
+            else:
+                self.download_manager.pause()
+                print(f"{Fore.GREEN}✓ Downloads paused; running transfers hold until you resume{Style.RESET_ALL}")
+                
             input("\nPress Enter to continue...")
             self.display_queue_menu()
             
@@ -2013,16 +5692,7 @@ class SpotiFXApp:
         print(f"{Fore.CYAN}Total Tracks Downloaded:{Style.RESET_ALL} {stats.get('total_tracks', 0)}")
         print(f"{Fore.CYAN}Total Playlists Downloaded:{Style.RESET_ALL} {stats.get('total_playlists', 0)}")
         
-        total_bytes = stats.get('total_bytes_downloaded', 0)
-        if total_bytes < 1024:
-            size_str = f"{total_bytes} B"
-        elif total_bytes < 1024 * 1024:
-            size_str = f"{total_bytes/1024:.2f} KB"
-        elif total_bytes < 1024 * 1024 * 1024:
-            size_str = f"{total_bytes/(1024*1024):.2f} MB"
-        else:
-            size_str = f"{total_bytes/(1024*1024*1024):.2f} GB"
-            
+        size_str = format_size(stats.get('total_bytes_downloaded', 0))
         print(f"{Fore.CYAN}Total Data Downloaded:{Style.RESET_ALL} {size_str}")
         
         first_date = stats.get('first_download_date', '')
@@ -2055,6 +5725,9 @@ class SpotiFXApp:
         
         print(f"{Fore.CYAN}Download Directory:{Style.RESET_ALL} {self.config.get('General', 'download_dir', DEFAULT_DOWNLOAD_DIR)}")
         print(f"{Fore.CYAN}Concurrent Downloads:{Style.RESET_ALL} {self.config.get('General', 'concurrent_downloads', '3')}")
+        print(f"{Fore.CYAN}Adaptive Concurrency:{Style.RESET_ALL} {'Yes' if self.config.getboolean('General', 'adaptive_concurrency', True) else 'No'}")
+        if hasattr(self, 'download_manager'):
+            print(f"{Fore.CYAN}Active Download Workers:{Style.RESET_ALL} {self.download_manager.get_worker_count()}")
         print(f"{Fore.CYAN}Audio Quality:{Style.RESET_ALL} {self.config.get('Audio', 'audio_quality', '320')} kbps")
         print(f"{Fore.CYAN}Audio Format:{Style.RESET_ALL} {self.config.get('Audio', 'audio_format', 'mp3')}")
         print(f"{Fore.CYAN}Create Playlist Folders:{Style.RESET_ALL} {'Yes' if self.config.getboolean('Spotify', 'create_playlist_folders', True) else 'No'}")
@@ -2067,6 +5740,7 @@ class SpotiFXApp:
         print("4. Toggle Playlist Folders")
         print("5. Clear Cache")
         print("6. Reset Settings")
+        print("7. Toggle Adaptive Concurrency")
         print("0. Back to Main Menu")
         
         choice = input("\nEnter your choice: ")
@@ -2091,8 +5765,11 @@ class SpotiFXApp:
             
             if new_value.isdigit() and 1 <= int(new_value) <= 10:
                 self.config.set('General', 'concurrent_downloads', new_value)
+                if hasattr(self, 'download_manager'):
+                    self.download_manager.resize_workers(int(new_value))
                 print(f"{Fore.GREEN}✓ Concurrent downloads updated{Style.RESET_ALL}")
-                print(f"{Fore.YELLOW}Note: This change will take effect after restarting the application.{Style.RESET_ALL}")
+                if self.config.getboolean('General', 'adaptive_concurrency', True):
+                    print(f"{Fore.YELLOW}Note: Adaptive concurrency will keep tuning the worker count from here.{Style.RESET_ALL}")
             else:
                 print(f"{Fore.RED}Invalid value. Please enter a number between 1 and 10.{Style.RESET_ALL}")
             
@@ -2153,6 +5830,16 @@ class SpotiFXApp:
             input("\nPress Enter to continue...")
             self.display_settings_menu()
             
+        elif choice == "7":
+            current = self.config.getboolean('General', 'adaptive_concurrency', True)
+            new_value = not current
+            
+            self.config.set('General', 'adaptive_concurrency', str(new_value).lower())
+            print(f"{Fore.GREEN}✓ Adaptive concurrency {'enabled' if new_value else 'disabled'}{Style.RESET_ALL}")
+            
+            input("\nPress Enter to continue...")
+            self.display_settings_menu()
+            
     def display_about_menu(self):
         self.clear_screen()
         self.print_logo()
@@ -2248,6 +5935,20 @@ class SpotiFXApp:
         print("  -a, --album URL     Download a Spotify album")
         print("  -p, --playlist URL  Download a Spotify playlist")
         print("  -d, --dir PATH      Set custom download directory")
+        print("  --priority LEVEL    Queue priority: high, normal or low")
+        print("  --sync              Only fetch tracks added since the last run")
+        print("  --prune             With --sync, delete tracks removed from playlists")
+        print("  -b, --batch FILE    Download every URL in FILE ('-' for stdin)")
+        print("  -w, --workers N     Concurrent downloads for this run")
+        print("  --no-banner         Skip the banner and screen clearing")
+        print("  --json-progress     Print progress events as JSON lines")
+        print("  --status            Show the queue and library totals")
+        print("  --cancel [FILTER]   Cancel unfinished downloads (by type, status or ID)")
+        print("  --daemon            Keep running and serve a local HTTP/JSON API")
+        print(f"  --api-port N        Port for --daemon (default {DAEMON_PORT})")
+        print("  --metrics-port N    Serve Prometheus metrics on localhost:N")
+        print("  --profile           Profile download stages into ~/.spotifx/profiles/")
+        print("  --profile-report    Summarize the latest profiling run")
         print("  -h, --help          Show this help message")
         print("  -v, --version       Show version information")
         
@@ -2255,6 +5956,10 @@ class SpotiFXApp:
         print("  python spotifx.py -t https://open.spotify.com/track/12345abcde")
         print("  python spotifx.py -a https://open.spotify.com/album/12345abcde")
         print("  python spotifx.py -p https://open.spotify.com/playlist/12345abcde -d /path/to/downloads")
+        print("  python spotifx.py --sync --prune")
+        print("  cat urls.txt | python spotifx.py --batch - --workers 8 --json-progress")
+        print("  python spotifx.py --daemon --api-port 8765")
+        print("  python spotifx.py --cancel playlist retrying")
         
         print("\nSpotify URLs:")
         print("SpotiFX accepts the following Spotify URL formats:")
@@ -2463,15 +6168,14 @@ class SpotiFXApp:
                     input("\nPress Enter to continue...")
                     return
                     
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    urls = [line.strip() for line in f if line.strip()]
-                    
-                if not urls:
-                    print(f"{Fore.RED}No URLs found in file.{Style.RESET_ALL}")
-                    input("\nPress Enter to continue...")
-                    return
-                    
-                print(f"{Fore.CYAN}Found {len(urls)} URLs in file.{Style.RESET_ALL}")
+                # Large files are queued in the background; downloads start
+                # with the first chunk instead of after the whole file
+                threading.Thread(target=self._ingest_batch_file, args=(file_path,), daemon=True).start()
+                
+                print(f"{Fore.GREEN}✓ Queuing URLs from {file_path} in the background.{Style.RESET_ALL}")
+                print("Check the download queue for progress.")
+                input("\nPress Enter to continue...")
+                return
                 
             elif choice == "2":
                 print("Paste multiple Spotify URLs (one per line, end with an empty line):")
@@ -2494,21 +6198,8 @@ class SpotiFXApp:
                 input("\nPress Enter to continue...")
                 return
                 
-            added_count = {'track': 0, 'album': 0, 'playlist': 0, 'unknown': 0}
-            
-            for url in urls:
-                if '/track/' in url or url.startswith('spotify:track:'):
-                    self.download_manager.queue_track(url)
-                    added_count['track'] += 1
-                elif '/album/' in url or url.startswith('spotify:album:'):
-                    self.download_manager.queue_album(url)
-                    added_count['album'] += 1
-                elif '/playlist/' in url or url.startswith('spotify:playlist:'):
-                    self.download_manager.queue_playlist(url)
-                    added_count['playlist'] += 1
-                else:
-                    added_count['unknown'] += 1
-                    
+            added_count, _ = self.download_manager.queue_many(urls)
+            
             print(f"{Fore.GREEN}✓ Added to download queue:{Style.RESET_ALL}")
             print(f"  - Tracks: {added_count['track']}")
             print(f"  - Albums: {added_count['album']}")
@@ -2516,11 +6207,23 @@ class SpotiFXApp:
             
             if added_count['unknown'] > 0:
                 print(f"{Fore.YELLOW}Skipped {added_count['unknown']} unknown URLs.{Style.RESET_ALL}")
+            if added_count['duplicate'] > 0:
+                print(f"{Fore.YELLOW}Skipped {added_count['duplicate']} duplicate URLs.{Style.RESET_ALL}")
                 
         except Exception as e:
             print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
             
         input("\nPress Enter to continue...")
+        
+    def _ingest_batch_file(self, file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                counts, _ = self.download_manager.queue_many(f)
+                
+            logger.info(f"Batch file {file_path}: queued {counts['track']} tracks, {counts['album']} albums, "
+                        f"{counts['playlist']} playlists; skipped {counts['unknown']} unknown, {counts['duplicate']} duplicate")
+        except Exception as e:
+            logger.error(f"Failed to queue batch file {file_path}: {e}")
     
     def display_troubleshooting_menu(self):
         self.clear_screen()
@@ -2535,6 +6238,7 @@ class SpotiFXApp:
         print("4. Clear cache")
         print("5. Reset configuration")
         print("6. Show logs")
+        print("7. Performance")
         print("0. Back to Main Menu")
         
         choice = input("\nEnter your choice: ")
@@ -2601,15 +6305,12 @@ class SpotiFXApp:
                                     bar = '█' * (percent // 5) + '░' * (20 - percent // 5)
                                     print(f"\r[{bar}] {percent}%", end='', flush=True)
                                     
-                        self.youtube.add_progress_hook(progress_callback)
-                        
                         downloaded_file = self.youtube.download_audio(
                             result['id'],
-                            test_path
+                            test_path,
+                            progress=progress_callback
                         )
                         
-                        self.youtube.progress_hooks.remove(progress_callback)
-                        
                         if downloaded_file and os.path.exists(downloaded_file):
                             print(f"\n{Fore.GREEN}✓ Download test successful!{Style.RESET_ALL}")
                             print(f"Downloaded to: {downloaded_file}")
@@ -2692,15 +6393,15 @@ class SpotiFXApp:
                     print("Please restart the application for changes to take effect.")
                     
             elif choice == "6":
-                log_file = os.path.join(CONFIG_DIR, "spotifx.log")
+                log_file = LOG_FILE
                 
                 if os.path.exists(log_file):
                     print(f"{Fore.CYAN}Last 20 lines of log file:{Style.RESET_ALL}\n")
                     
-                    with open(log_file, 'r', encoding='utf-8') as f:
+                    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
                         lines = f.readlines()
                         for line in lines[-20:]:
-                            print(line.strip())
+                            print(format_log_line(line.strip()))
                             
                     if input("\nDo you want to view the full log file? (y/n): ").lower() == 'y':
                         if os.name == 'nt':  # Windows
@@ -2710,6 +6411,30 @@ class SpotiFXApp:
                 else:
                     print(f"{Fore.YELLOW}No log file found.{Style.RESET_ALL}")
                     
+            elif choice == "7":
+                snapshot = metrics.snapshot()
+                stages = [h for h in snapshot['histograms'] if h['name'] == STAGE_METRIC]
+                
+                if not stages:
+                    print(f"{Fore.YELLOW}No timings recorded yet in this session.{Style.RESET_ALL}")
+                else:
+                    print(f"{Fore.CYAN}Time per stage this session:{Style.RESET_ALL}\n")
+                    print(f"{'Stage':<16} {'Count':>7} {'Avg ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'Max ms':>9} {'Total s':>9}")
+                    
+                    for stage in sorted(stages, key=lambda h: h['sum'], reverse=True):
+                        print(f"{stage['labels'].get('stage', ''):<16} {stage['count']:>7} "
+                              f"{stage['sum'] / stage['count'] * 1000:>9.1f} {stage['p50'] * 1000:>9.1f} "
+                              f"{stage['p95'] * 1000:>9.1f} {stage['max'] * 1000:>9.1f} {stage['sum']:>9.1f}")
+                              
+                if snapshot['counters'] or snapshot['gauges']:
+                    print(f"\n{Fore.CYAN}Counters:{Style.RESET_ALL}")
+                    for series in snapshot['counters'] + snapshot['gauges']:
+                        labels = ', '.join(f"{key}={value}" for key, value in series['labels'].items())
+                        print(f"  {series['name']}{f' ({labels})' if labels else ''}: {series['value']}")
+                        
+                if metrics.server:
+                    print(f"\nPrometheus endpoint: http://127.0.0.1:{metrics.server.server_address[1]}/metrics")
+                    
             else:
                 print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
                 
@@ -2718,6 +6443,299 @@ class SpotiFXApp:
             
         input("\nPress Enter to continue...")
 
+# Backend for --daemon: keeps the Spotify client, caches and download
+# manager warm between requests and serves a small JSON API plus a
+# server-sent events stream of queue changes. Meant for localhost; set
+# [Daemon] token to require "Authorization: Bearer <token>".
+class UnsupportedMediaType(ValueError):
+    pass
+
+class ApiServer:
+    def __init__(self, app, host=DAEMON_HOST, port=DAEMON_PORT, token=''):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.token = token
+        self.server = None
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.stopping = threading.Event()
+        
+    @property
+    def manager(self):
+        return self.app.download_manager
+        
+    def start(self):
+        from http.server import ThreadingHTTPServer
+        
+        self.manager.add_listener(self._broadcast)
+        
+        self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 128
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        
+        if self.host not in ('127.0.0.1', 'localhost', '::1') and not self.token:
+            logger.warning(f"API listening on {self.host} without a token; anyone who can reach it can queue downloads")
+        logger.info(f"API listening on http://{self.host}:{self.server.server_address[1]}/api/")
+        
+        return self.server
+        
+    def stop(self):
+        self.stopping.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            
+    def _subscribe(self):
+        events = Queue(maxsize=SSE_BACKLOG)
+        with self.subscribers_lock:
+            self.subscribers.append(events)
+            
+        return events
+        
+    def _unsubscribe(self, events):
+        with self.subscribers_lock:
+            if events in self.subscribers:
+                self.subscribers.remove(events)
+                
+    def _broadcast(self, event):
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+            
+        # A client that stops reading loses events rather than holding up
+        # the queue listeners
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except Full:
+                pass
+                
+    def _summary(self, item):
+        return {field: item.get(field) for field in API_ITEM_FIELDS if item.get(field) is not None}
+        
+    def _status(self, query):
+        return {
+            'queue': self.manager.get_queue_status(),
+            'paused': self.manager.is_paused(),
+            'workers': self.manager.get_worker_count(),
+            'active': [self._summary(item) for item in self.app.db.get_queue('downloading')],
+            'stats': self.app.db.get_stats()
+        }
+        
+    def _queue(self, query):
+        items = self.app.db.get_queue(query.get('status'))
+        if query.get('type'):
+            items = [item for item in items if item.get('type') == query['type']]
+            
+        limit = int(query.get('limit', 100))
+        offset = int(query.get('offset', 0))
+        
+        return {'total': len(items), 'items': [self._summary(item) for item in items[offset:offset + limit]]}
+        
+    def _history(self, query):
+        return {'items': self.app.db.get_download_history(limit=int(query.get('limit', 50)), offset=int(query.get('offset', 0)))}
+        
+    def _enqueue(self, body):
+        priority = body.get('priority', DEFAULT_PRIORITY)
+        if priority not in PRIORITY_LEVELS:
+            raise ValueError(f"Unknown priority: {priority}")
+            
+        source = body.get('source', 'api')
+        
+        if 'urls' in body:
+            counts, handles = self.manager.queue_many(body['urls'], priority=priority, source=source)
+            return 202, {'counts': counts, 'jobs': [{'id': handle.id, 'type': handle.type} for handle in handles]}
+            
+        item_type, handle = self.manager.queue_url(body.get('url', ''), priority=priority, source=source)
+        if not handle:
+            raise ValueError(f"Not a Spotify track, album or playlist URL: {body.get('url')}")
+            
+        return 202, {'id': handle.id, 'type': item_type}
+        
+    def _cancel(self, body):
+        statuses = tuple(body['status'] if isinstance(body.get('status'), list) else [body['status']]) if body.get('status') else CANCELABLE_STATUSES
+        item_types = body['type'] if isinstance(body.get('type'), list) else [body['type']] if body.get('type') else None
+        
+        canceled = self.manager.cancel_many(item_types=item_types, statuses=statuses, item_ids=body.get('ids'))
+        return {'canceled': len(canceled), 'ids': canceled}
+        
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+        
+        api = self
+        
+        class ApiHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, format, *args):
+                logger.debug(f"API {self.address_string()} {format % args}")
+                
+            def send_json(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                
+            def read_json(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if not length:
+                    return {}
+                    
+                # Browsers may send text/plain and form bodies cross-site
+                # without a preflight, application/json they may not
+                if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+                    raise UnsupportedMediaType('Request bodies must be sent as application/json')
+                    
+                body = json.loads(self.rfile.read(length).decode('utf-8'))
+                if not isinstance(body, dict):
+                    raise ValueError('Expected a JSON object')
+                    
+                return body
+                
+            def local_request(self):
+                # Any web page the user has open can reach a localhost port:
+                # refuse requests a browser marks as coming from another
+                # origin, and, on a loopback bind, Host names other than
+                # localhost (DNS rebinding)
+                origin = self.headers.get('Origin')
+                if origin is not None and urlparse(origin).hostname not in LOCAL_HOSTS:
+                    return False
+                    
+                host = urlparse(f"//{self.headers.get('Host', '')}").hostname
+                return api.host not in LOCAL_HOSTS or host in LOCAL_HOSTS
+                
+            def route(self, method):
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split('/') if part]
+                query = dict(parse_qsl(url.query))
+                
+                if not self.local_request():
+                    self.send_json(403, {'error': 'Requests from web pages are not accepted'})
+                    return
+                    
+                if api.token and self.headers.get('Authorization') != f"Bearer {api.token}":
+                    self.send_json(401, {'error': 'Missing or wrong token'})
+                    return
+                    
+                if parts[:1] != ['api']:
+                    self.send_json(404, {'error': 'Not found'})
+                    return
+                    
+                route = (method, '/'.join(parts[1:2]))
+                item_id = parts[2] if len(parts) > 2 else None
+                
+                try:
+                    if route == ('GET', 'events'):
+                        self.stream_events(query.get('id'))
+                    elif route == ('GET', 'status'):
+                        self.send_json(200, api._status(query))
+                    elif route == ('GET', 'queue') and item_id:
+                        item = api.app.db.get_queue_item(api.manager._resolve_item_id(item_id))
+                        self.send_json(200, item) if item else self.send_json(404, {'error': 'No such download'})
+                    elif route == ('GET', 'queue'):
+                        self.send_json(200, api._queue(query))
+                    elif route == ('POST', 'queue'):
+                        self.send_json(*api._enqueue(self.read_json()))
+                    elif route == ('DELETE', 'queue') and item_id:
+                        canceled = api.manager.cancel_download(item_id)
+                        self.send_json(200 if canceled else 409, {'canceled': canceled})
+                    elif route == ('POST', 'cancel'):
+                        self.send_json(200, api._cancel(self.read_json()))
+                    elif route == ('POST', 'pause'):
+                        api.manager.pause()
+                        self.send_json(200, {'paused': True})
+                    elif route == ('POST', 'resume'):
+                        api.manager.resume()
+                        self.send_json(200, {'paused': False})
+                    elif route == ('POST', 'retry'):
+                        self.send_json(200, {'retried': api.manager.retry_failed(self.read_json().get('type'))})
+                    elif route == ('GET', 'history'):
+                        self.send_json(200, api._history(query))
+                    else:
+                        self.send_json(404, {'error': 'Not found'})
+                except UnsupportedMediaType as e:
+                    self.send_json(415, {'error': str(e)})
+                except ValueError as e:
+                    self.send_json(400, {'error': str(e)})
+                except Exception as e:
+                    logger.error(f"API request {method} {self.path} failed: {e}")
+                    self.send_json(500, {'error': str(e)})
+                    
+            def stream_events(self, item_id=None):
+                events = api._subscribe()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                
+                try:
+                    self.wfile.write(b': connected\n\n')
+                    self.wfile.flush()
+                    
+                    while not api.stopping.is_set():
+                        try:
+                            event = events.get(timeout=SSE_KEEPALIVE)
+                        except Empty:
+                            self.wfile.write(b': keepalive\n\n')
+                            self.wfile.flush()
+                            continue
+                            
+                        if item_id and not event['id'].startswith(item_id):
+                            continue
+                            
+                        self.wfile.write(f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    api._unsubscribe(events)
+                    
+            def do_GET(self):
+                self.route('GET')
+                
+            def do_POST(self):
+                self.route('POST')
+                
+            def do_DELETE(self):
+                self.route('DELETE')
+                
+        return ApiHandler
+
+def run_daemon(app, host=None, port=None, out=sys.stdout):
+    import signal
+    
+    host = host or app.config.get('Daemon', 'host', DAEMON_HOST)
+    port = port if port is not None else app.config.getint('Daemon', 'port', DAEMON_PORT)
+    api = ApiServer(app, host, port, app.config.get('Daemon', 'token', ''))
+    
+    try:
+        api.start()
+    except OSError as e:
+        print(f"{Fore.RED}Could not listen on {host}:{port}: {e}{Style.RESET_ALL}", file=out)
+        app.download_manager.shutdown()
+        return 1
+        
+    print(f"{Fore.GREEN}SpotiFX daemon listening on http://{host}:{api.server.server_address[1]}/api/ (Ctrl+C to stop){Style.RESET_ALL}", file=out)
+    
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.stop()
+        app.download_manager.shutdown()
+        
+    return 0
+
 def parse_arguments():
     import argparse
     
@@ -2726,6 +6744,20 @@ def parse_arguments():
     parser.add_argument('-a', '--album', help='Download a Spotify album by URL or ID')
     parser.add_argument('-p', '--playlist', help='Download a Spotify playlist by URL or ID')
     parser.add_argument('-d', '--directory', help='Custom download directory')
+    parser.add_argument('--priority', choices=list(PRIORITY_LEVELS), default=DEFAULT_PRIORITY, help='Queue priority for downloads given on the command line')
+    parser.add_argument('--sync', action='store_true', help='Only download tracks added since the last run; with no --playlist, sync every known playlist')
+    parser.add_argument('--prune', action='store_true', help='With --sync, delete files of tracks removed from the playlist')
+    parser.add_argument('-b', '--batch', metavar='FILE', help="Download every Spotify URL in FILE, one per line ('-' reads stdin)")
+    parser.add_argument('-w', '--workers', type=int, help='Number of concurrent downloads for this run')
+    parser.add_argument('--no-banner', action='store_true', help='Do not clear the screen or print the banner')
+    parser.add_argument('--json-progress', action='store_true', help='Write progress events to stdout as JSON lines; logs go to stderr')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this local port for the run')
+    parser.add_argument('--profile', action='store_true', help='Profile download stages (cProfile + tracemalloc) into ~/.spotifx/profiles/')
+    parser.add_argument('--profile-report', nargs='?', const='latest', metavar='RUN', help='Summarize a profiling run (default: the latest) and exit')
+    parser.add_argument('--status', action='store_true', help='Print the download queue and library totals, then exit')
+    parser.add_argument('--daemon', action='store_true', help='Stay running and serve a local HTTP/JSON API with a server-sent events progress stream')
+    parser.add_argument('--api-port', type=int, help=f'Port for --daemon (default from config, {DAEMON_PORT})')
+    parser.add_argument('--cancel', nargs='*', metavar='FILTER', help='Cancel unfinished downloads in the saved queue, then exit; filters are types (track/album/playlist), statuses (pending/retrying/downloading) or IDs, none cancels all')
     parser.add_argument('-v', '--version', action='version', version=f'SpotiFX v{VERSION}')
     
     return parser.parse_args()
@@ -2745,7 +6777,7 @@ def check_system():
     return True
 
 def print_banner():
-    width = os.get_terminal_size().columns
+    width = shutil.get_terminal_size((60, 20)).columns
     
     print("\n" + "=" * width)
     print(Fore.CYAN + LOGO_ASCII + Style.RESET_ALL)
@@ -2753,52 +6785,246 @@ def print_banner():
     print(Fore.CYAN + f"  Version {VERSION} - Created by Amir.Void (GitHub: AmirVoid12)" + Style.RESET_ALL)
     print("=" * width + "\n")
 
+def print_status(db, as_json=False):
+    queue_items = db.get_queue()
+    counts = {}
+    for item in queue_items:
+        status = item.get('status', 'pending')
+        counts[status] = counts.get(status, 0) + 1
+        
+    active = [item for item in queue_items if item.get('status') in ('downloading', 'retrying')]
+    
+    if as_json:
+        print(json.dumps({
+            'queue': counts,
+            'active': [{field: item.get(field) for field in ('id', 'type', 'spotify_id', 'status', 'progress', 'note')} for item in active],
+            'stats': db.get_stats()
+        }, ensure_ascii=False))
+        return 0
+        
+    print(f"{Fore.YELLOW}Download Queue{Style.RESET_ALL}")
+    for status in ('pending', 'downloading', 'retrying', 'completed', 'failed', 'canceled'):
+        print(f"  {status.capitalize():<12} {counts.get(status, 0)}")
+        
+    for item in active:
+        name = item.get('track_name') or item.get('album_name') or item.get('playlist_name') or item.get('spotify_id')
+        print(f"  {Fore.CYAN}{item['id'][:8]}{Style.RESET_ALL} {item.get('type', '')} {name} - {item.get('progress', 0)}% {item.get('note', '')}")
+        
+    stats = db.get_stats()
+    print(f"\n{Fore.YELLOW}Library{Style.RESET_ALL}")
+    print(f"  Tracks       {stats.get('total_tracks', 0)}")
+    print(f"  Playlists    {stats.get('total_playlists', 0)}")
+    print(f"  Downloaded   {format_size(stats.get('total_bytes_downloaded', 0))}")
+    
+    return 0
+
+def daemon_request(config, method, path, body=None):
+    # Calls the --daemon configured in [Daemon]; returns None when nothing
+    # is listening there
+    import urllib.request
+    import urllib.error
+    
+    host = config.get('Daemon', 'host', DAEMON_HOST)
+    if host in ('', '0.0.0.0', '::'):
+        host = DAEMON_HOST
+    netloc = f"[{host}]" if ':' in host else host
+    
+    headers = {'Content-Type': 'application/json'}
+    token = config.get('Daemon', 'token', '')
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+        
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(f"http://{netloc}:{config.getint('Daemon', 'port', DAEMON_PORT)}{path}", data=data, headers=headers, method=method)
+    
+    # Never route a localhost call through the user's proxy
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    try:
+        with opener.open(request, timeout=DAEMON_CLIENT_TIMEOUT) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        raise ValueError(f"the daemon answered {e.code} {e.reason}") from e
+    except (urllib.error.URLError, OSError):
+        return None
+
+def cancel_queue(db, filters, as_json=False, config=None, out=sys.stdout):
+    item_types = [value for value in filters if value in ('track', 'album', 'playlist')]
+    statuses = tuple(value for value in filters if value in CANCELABLE_STATUSES) or CANCELABLE_STATUSES
+    prefixes = [value for value in filters if value not in item_types and value not in CANCELABLE_STATUSES]
+    
+    item_ids = None
+    if prefixes:
+        item_ids = [item['id'] for item in db.get_queue() if any(item.get('id', '').startswith(prefix) for prefix in prefixes)]
+        
+    # A daemon or session that is running holds the queue in memory and
+    # would write its own copy back over this one: cancel through the
+    # daemon's API, and refuse while another session owns live downloads
+    body = {'status': list(statuses)}
+    if item_types:
+        body['type'] = item_types
+    if item_ids is not None:
+        body['ids'] = item_ids
+        
+    try:
+        reply = daemon_request(config, 'POST', '/api/cancel', body) if config else None
+    except ValueError as e:
+        print(f"{Fore.RED}A SpotiFX daemon is running but refused the cancel: {e}{Style.RESET_ALL}", file=out)
+        return 1
+        
+    if reply is not None:
+        canceled = reply.get('ids', [])
+    else:
+        now = time.time()
+        live = [item for item in db.get_queue('downloading') if (item.get('lease_expires_at') or 0) > now]
+        if live:
+            print(f"{Fore.RED}Another SpotiFX session is downloading {len(live)} items and would undo the cancel; "
+                  f"cancel from its queue menu or stop it first{Style.RESET_ALL}", file=out)
+            return 1
+            
+        canceled = db.cancel_queue_items(item_types, statuses, item_ids)
+        db.flush()
+        
+    if as_json:
+        print(json.dumps({'canceled': list(canceled)}))
+    else:
+        print(f"{Fore.GREEN}✓ {len(canceled)} downloads canceled{Style.RESET_ALL}")
+        
+    return 0
+
+def read_batch_urls(path):
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    
+    try:
+        yield from stream
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
 def main():
     init_colorama()
     
     if not check_system():
         return 1
         
-    os.system('cls' if os.name == 'nt' else 'clear')
-    print_banner()
-    
     args = parse_arguments()
+    headless = args.track or args.album or args.playlist or args.sync or args.batch or args.daemon
     
+    # Keep stdout clean for the event stream; everything human goes to stderr
+    out = sys.stderr if args.json_progress else sys.stdout
+    if args.json_progress:
+        logger.console_handler.setStream(sys.stderr)
+        
+    if args.status:
+        return print_status(DatabaseManager(), as_json=args.json_progress)
+        
+    if args.cancel is not None:
+        return cancel_queue(DatabaseManager(), args.cancel, as_json=args.json_progress, config=ConfigManager(), out=out)
+        
+    if args.profile_report:
+        return profile_report(args.profile_report)
+        
+    if not args.no_banner and not args.json_progress:
+        if not headless:
+            os.system('cls' if os.name == 'nt' else 'clear')
+        print_banner()
+        
     app = SpotiFXApp()
     
+    if args.profile:
+        profiler.start(app.config.getint('Metrics', 'profile_snapshot_interval', PROFILE_SNAPSHOT_INTERVAL))
+        
     if args.directory:
         app.config.set('General', 'download_dir', args.directory)
         
-    if args.track or args.album or args.playlist:
+    if args.metrics_port:
+        try:
+            metrics.start_server(args.metrics_port)
+        except OSError as e:
+            print(f"{Fore.RED}Could not serve metrics on port {args.metrics_port}: {e}{Style.RESET_ALL}", file=out)
+            return 1
+            
+    if headless:
+        if args.batch and args.batch != '-' and not os.path.exists(args.batch):
+            print(f"{Fore.RED}File not found: {args.batch}{Style.RESET_ALL}", file=out)
+            return 1
+            
+        # Nobody is there to answer the credentials prompt
+        if not sys.stdin.isatty() and not app.credentials.has_spotify_credentials():
+            print(f"{Fore.RED}No Spotify credentials configured. Run SpotiFX interactively once to set them up.{Style.RESET_ALL}", file=out)
+            return 1
+            
         if not app._setup_spotify():
-            print(f"{Fore.RED}Failed to set up Spotify client. Exiting.{Style.RESET_ALL}")
+            print(f"{Fore.RED}Failed to set up Spotify client. Exiting.{Style.RESET_ALL}", file=out)
             return 1
             
         app._setup_downloader()
         
+        if args.json_progress:
+            write_lock = threading.Lock()
+            
+            def write_event(event):
+                with write_lock:
+                    sys.stdout.write(json.dumps(event, ensure_ascii=False) + '\n')
+                    sys.stdout.flush()
+                    
+            app.download_manager.add_listener(write_event)
+            
+        if args.workers:
+            # Pin the pool for this run without touching the saved config
+            app.download_manager.min_workers = app.download_manager.max_workers = max(1, args.workers)
+            app.download_manager.resize_workers(args.workers)
+            
+        jobs = []
+        
         if args.track:
-            print(f"{Fore.CYAN}Downloading track: {args.track}{Style.RESET_ALL}")
-            app.download_manager.queue_track(args.track)
+            print(f"{Fore.CYAN}Downloading track: {args.track}{Style.RESET_ALL}", file=out)
+            jobs.append(app.download_manager.queue_track(args.track, priority=args.priority, source='cli'))
             
         if args.album:
-            print(f"{Fore.CYAN}Downloading album: {args.album}{Style.RESET_ALL}")
-            app.download_manager.queue_album(args.album)
+            print(f"{Fore.CYAN}Downloading album: {args.album}{Style.RESET_ALL}", file=out)
+            jobs.append(app.download_manager.queue_album(args.album, priority=args.priority, source='cli'))
             
         if args.playlist:
-            print(f"{Fore.CYAN}Downloading playlist: {args.playlist}{Style.RESET_ALL}")
-            app.download_manager.queue_playlist(args.playlist)
+            print(f"{Fore.CYAN}Downloading playlist: {args.playlist}{Style.RESET_ALL}", file=out)
+            jobs.append(app.download_manager.queue_playlist(args.playlist, priority=args.priority, source='cli', sync=args.sync, prune=args.prune))
+            
+        elif args.sync:
+            playlist_ids = list(app.db.get_playlist_manifests())
+            print(f"{Fore.CYAN}Syncing {len(playlist_ids)} playlists{Style.RESET_ALL}", file=out)
+            for playlist_id in playlist_ids:
+                jobs.append(app.download_manager.queue_playlist(playlist_id, priority=args.priority, source='cli', sync=True, prune=args.prune))
+                
+        if args.batch:
+            counts, handles = app.download_manager.queue_many(read_batch_urls(args.batch), priority=args.priority)
+            jobs.extend(handles)
+            
+            print(f"{Fore.CYAN}Queued {counts['track']} tracks, {counts['album']} albums, {counts['playlist']} playlists{Style.RESET_ALL}", file=out)
+            if counts['unknown'] or counts['duplicate']:
+                print(f"{Fore.YELLOW}Skipped {counts['unknown']} unknown and {counts['duplicate']} duplicate URLs.{Style.RESET_ALL}", file=out)
+                
+        if args.daemon:
+            return run_daemon(app, port=args.api_port, out=out)
             
-        print(f"{Fore.YELLOW}Waiting for downloads to complete...{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}Waiting for downloads to complete...{Style.RESET_ALL}", file=out)
         
         try:
-            while not app.download_manager.download_queue.empty():
-                time.sleep(1)
-                
-            print(f"{Fore.GREEN}✓ Downloads completed!{Style.RESET_ALL}")
-        except:
-            pass
+            app.download_manager.wait_all()
+        finally:
+            app.download_manager.shutdown()
             
-        app.download_manager.shutdown()
+        failed = [job for job in jobs if job.item.get('status') != 'completed']
+        partial = [job for job in jobs if job.item.get('status') == 'completed' and job.item.get('failed_tracks')]
+        
+        if not failed and not partial:
+            print(f"{Fore.GREEN}✓ Downloads completed!{Style.RESET_ALL}", file=out)
+            return 0
+            
+        for job in failed:
+            print(f"{Fore.RED}✗ {job.type} {job.item.get('spotify_id')}: {job.item.get('error', job.item.get('status'))}{Style.RESET_ALL}", file=out)
+        for job in partial:
+            print(f"{Fore.YELLOW}! {job.type} {job.item.get('spotify_id')}: {job.item['failed_tracks']} tracks failed{Style.RESET_ALL}", file=out)
+            
+        return 2
         
     else:
         app.run()
@@ -0,0 +1,921 @@
+"""
+SpotiFX benchmarks
+
+Simulations and measurements used to check performance work on SpotiFX
+without touching Spotify or YouTube.
+
+    python spotifx_bench.py scheduler
+    python spotifx_bench.py engines
+    python spotifx_bench.py startup
+    python spotifx_bench.py scenarios --json baseline.json
+    python spotifx_bench.py scenarios --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import asyncio
+import hashlib
+import logging
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import configparser
+import itertools
+import urllib.parse
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import yt_dlp
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+
+import spotifx
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def simulate_scheduler(policy, workers=3, giant_jobs=4, giant_tracks=5000, small_jobs=200,
+                       horizon=2000.0, track_seconds=1.0, seed=1):
+    # Discrete event simulation in virtual time: giant playlists are queued at
+    # t=0 by a bulk source, single tracks trickle in from an interactive source
+    rng = random.Random(seed)
+    scheduler = spotifx.JobScheduler()
+    counter = itertools.count()
+    events = []
+
+    for job_id in range(giant_jobs):
+        heapq.heappush(events, (0.0, next(counter), 'arrive', ('giant', job_id, giant_tracks)))
+
+    for job_id in range(small_jobs):
+        heapq.heappush(events, (rng.uniform(0, horizon), next(counter), 'arrive', ('small', job_id, 1)))
+
+    def submit(job, now):
+        kind, job_id, remaining = job
+        if policy == 'fifo':
+            scheduler.put(job, source='default')
+        elif policy == 'fair':
+            scheduler.put(job, source='bulk' if kind == 'giant' else 'interactive')
+        else:
+            scheduler.put(job, priority='low' if kind == 'giant' else 'high',
+                          source='bulk' if kind == 'giant' else 'interactive')
+
+    arrived_at = {}
+    started_at = {}
+    finished_at = {}
+    idle_workers = workers
+
+    def run_slice(job, now):
+        kind, job_id, remaining = job
+        started_at.setdefault((kind, job_id), now)
+
+        if policy == 'fifo':
+            tracks = remaining
+        else:
+            tracks = min(remaining, spotifx.JOB_TIME_SLICE)
+
+        heapq.heappush(events, (now + tracks * track_seconds, next(counter), 'done', (kind, job_id, remaining - tracks)))
+
+    now = 0.0
+    while events:
+        now, _, event, job = heapq.heappop(events)
+        kind, job_id, remaining = job
+
+        if event == 'arrive':
+            arrived_at[(kind, job_id)] = now
+            submit(job, now)
+        elif remaining:
+            priority = 'low' if policy == 'priority' and kind == 'giant' else 'normal'
+            source = 'default' if policy == 'fifo' else 'bulk'
+
+            if policy != 'fifo' and scheduler.has_waiting(priority, source):
+                submit(job, now)
+                idle_workers += 1
+            else:
+                run_slice(job, now)
+        else:
+            finished_at[(kind, job_id)] = now
+            idle_workers += 1
+
+        while idle_workers and not scheduler.empty():
+            idle_workers -= 1
+            run_slice(scheduler.get_nowait(), now)
+
+    waits = [started_at[key] - arrived_at[key] for key in arrived_at if key[0] == 'small']
+    giant_finish = [finished_at[key] for key in finished_at if key[0] == 'giant']
+
+    return {
+        'policy': policy,
+        'p50': percentile(waits, 50),
+        'p99': percentile(waits, 99),
+        'max': max(waits) if waits else 0.0,
+        'giant_makespan': max(giant_finish) if giant_finish else 0.0
+    }
+
+
+def bench_scheduler(args):
+    print(f"{'policy':<10} {'p50 start':>12} {'p99 start':>12} {'max start':>12} {'giant done':>12}")
+
+    for policy in ('fifo', 'fair', 'priority'):
+        result = simulate_scheduler(
+            policy,
+            workers=args.workers,
+            giant_jobs=args.giant_jobs,
+            giant_tracks=args.giant_tracks,
+            small_jobs=args.small_jobs,
+            horizon=args.horizon,
+            seed=args.seed
+        )
+        print(f"{policy:<10} {result['p50']:>11.1f}s {result['p99']:>11.1f}s "
+              f"{result['max']:>11.1f}s {result['giant_makespan']:>11.1f}s")
+
+
+SAMPLE_FRAME = bytes([0xFF, 0xFB, 0x90, 0x44]) + bytes(413)
+SAMPLE_COVER = b'\xff\xd8\xff\xe0' + bytes(2048)
+
+
+def sample_mp3(size):
+    # Silent MPEG-1 Layer III frames, 128 kbps: enough for mutagen to tag
+    return SAMPLE_FRAME * max(1, size // len(SAMPLE_FRAME))
+
+
+def fake_track(track_id, base_url):
+    return {
+        'id': track_id,
+        'name': f"Track {track_id}",
+        'artists': [{'name': 'Bench Artist'}],
+        'album': {
+            'name': 'Bench Album',
+            'images': [{'url': f"{base_url}media/cover.jpg"}],
+            'total_tracks': 1,
+            'release_date': '2024-01-01'
+        },
+        'duration_ms': 180000,
+        'track_number': 1,
+        'disc_number': 1,
+        'external_ids': {'isrc': f"BENCH{track_id}"}
+    }
+
+
+def playlist_size(playlist_id):
+    # Playlist IDs end in their track count: benchlist500 has 500 tracks
+    digits = ''.join(itertools.takewhile(str.isdigit, reversed(playlist_id)))
+    return int(digits[::-1]) if digits else 0
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    # Spotify Web API under /v1/ (tracks and paginated playlists), a media
+    # server under /media/ standing in for YouTube audio and cover art, and
+    # counters of what was served under /stats
+    latency = 0.05
+    rate_limit = 0.0
+    straggler_rate = 0.0
+    straggler_seconds = 10.0
+    page_size = 100
+    media = sample_mp3(512 * 1024)
+    stats = {}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_slowly(self, body, content_type):
+        # A straggling connection: the body trickles out over straggler_seconds
+        chunk = 16 * 1024
+        delay = self.straggler_seconds / max(1, len(body) // chunk)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        try:
+            for offset in range(0, len(body), chunk):
+                self.wfile.write(body[offset:offset + chunk])
+                self.wfile.flush()
+                time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def playlist_page(self, playlist_id, offset, limit, base_url):
+        total = playlist_size(playlist_id)
+        end = min(total, offset + limit)
+
+        return {
+            'items': [{'track': fake_track(f"{playlist_id}t{i:06d}", base_url)} for i in range(offset, end)],
+            'offset': offset,
+            'limit': limit,
+            'total': total,
+            'next': f"{base_url}v1/playlists/{playlist_id}/tracks?offset={end}&limit={limit}" if end < total else None
+        }
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        query = dict(urllib.parse.parse_qsl(url.query))
+        base_url = f"http://{self.headers['Host']}/"
+
+        if parts[0] == 'stats':
+            with self.stats_lock:
+                body = dict(self.stats)
+            self.send_body(200, json.dumps(body).encode('utf-8'))
+            return
+
+        if parts[0] == 'media':
+            if parts[-1].endswith('.mp3') and self.straggler_rate and random.random() < self.straggler_rate:
+                self.send_slowly(self.media, 'audio/mpeg')
+            elif parts[-1].endswith('.mp3'):
+                self.send_body(200, self.media, 'audio/mpeg')
+            else:
+                self.send_body(200, SAMPLE_COVER, 'image/jpeg')
+            return
+
+        time.sleep(self.latency)
+
+        if self.rate_limit and random.random() < self.rate_limit:
+            self.count('rate_limited')
+            body = b'{"error": {"status": 429, "message": "API rate limit exceeded"}}'
+            self.send_body(429, body, headers={'Retry-After': '1'})
+            return
+
+        if len(parts) == 3 and parts[1] == 'tracks':
+            body = fake_track(parts[2], base_url)
+        elif len(parts) == 3 and parts[1] == 'playlists':
+            body = {
+                'id': parts[2],
+                'name': f"Bench Playlist {parts[2]}",
+                'snapshot_id': 'bench-snapshot',
+                'owner': {'display_name': 'Bench'},
+                'tracks': self.playlist_page(parts[2], 0, self.page_size, base_url)
+            }
+        elif len(parts) == 4 and parts[1] == 'playlists' and parts[3] == 'tracks':
+            body = self.playlist_page(parts[2], int(query.get('offset', 0)), int(query.get('limit', self.page_size)), base_url)
+        else:
+            self.send_body(404, b'{"error": {"status": 404, "message": "Not found"}}')
+            return
+
+        self.send_body(200, json.dumps(body).encode('utf-8'))
+
+
+def _serve_fake_services(options, port_queue):
+    handler = type('Handler', (FakeServiceHandler,), {
+        'latency': options['latency'],
+        'rate_limit': options['rate_limit'],
+        'straggler_rate': options['straggler_rate'],
+        'media': sample_mp3(options['media_size']),
+        'stats': {},
+        'stats_lock': threading.Lock()
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_fake_services(latency=0.05, rate_limit=0.0, media_size=512 * 1024, straggler_rate=0.0):
+    # Separate process so server threads do not count against the client;
+    # returns the process and the base URL (Spotify API lives under v1/)
+    port_queue = multiprocessing.Queue()
+    options = {'latency': latency, 'rate_limit': rate_limit, 'media_size': media_size, 'straggler_rate': straggler_rate}
+    process = multiprocessing.Process(target=_serve_fake_services, args=(options, port_queue), daemon=True)
+    process.start()
+
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}/"
+
+
+def fake_service_stats(base_url):
+    return spotifx.requests.get(f"{base_url}stats", timeout=10).json()
+
+
+def make_bench_client(prefix, cache_dir=None):
+    cache = spotifx.CacheManager(cache_dir or tempfile.mkdtemp(prefix='spotifx-bench-'))
+    client = spotifx.SpotifyClient('bench', 'bench', cache)
+    client.sp = spotifx.spotipy.Spotify(auth='bench-token', requests_timeout=30, retries=0)
+    client.sp.prefix = prefix
+
+    return client
+
+
+class ThreadSampler:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.01)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.peak
+
+
+def run_thread_lookups(prefix, track_ids, workers):
+    client = make_bench_client(prefix)
+    sampler = ThreadSampler()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(client.get_track, track_ids))
+
+    elapsed = time.perf_counter() - started
+    return elapsed, sampler.stop(), sum(1 for result in results if result)
+
+
+def run_async_lookups(prefix, track_ids, lookups):
+    client = spotifx.AsyncSpotifyClient(make_bench_client(prefix), max_connections=lookups)
+    sampler = ThreadSampler()
+
+    async def run():
+        slots = asyncio.Semaphore(lookups)
+
+        async def lookup(track_id):
+            async with slots:
+                return await client.get_track(track_id)
+
+        try:
+            return await asyncio.gather(*[lookup(track_id) for track_id in track_ids])
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+
+    elapsed = time.perf_counter() - started
+    return elapsed, sampler.stop(), sum(1 for result in results if result)
+
+
+def bench_engines(args):
+    if not spotifx.aiohttp.available():
+        print("The asyncio engine needs aiohttp: pip install aiohttp")
+        return 1
+
+    server, base_url = start_fake_services(args.latency)
+    prefix = base_url + 'v1/'
+    track_ids = [f"bench{i:06d}" for i in range(args.tracks)]
+
+    print(f"{args.tracks} metadata lookups, {args.latency * 1000:.0f} ms server latency\n")
+    print(f"{'engine':<22} {'seconds':>10} {'lookups/s':>12} {'peak threads':>14} {'ok':>6}")
+
+    runs = [(f"threads x{workers}", run_thread_lookups, workers) for workers in args.thread_workers]
+    runs.append((f"asyncio x{args.lookups}", run_async_lookups, args.lookups))
+
+    try:
+        for name, runner, concurrency in runs:
+            elapsed, peak_threads, ok = runner(prefix, track_ids, concurrency)
+            print(f"{name:<22} {elapsed:>10.2f} {len(track_ids) / elapsed:>12.1f} {peak_threads:>14} {ok:>6}")
+    finally:
+        server.terminate()
+
+
+def import_profile():
+    # -X importtime writes "self | cumulative | module" rows to stderr
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import spotifx'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=startup_env()
+    )
+    rows = []
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+
+        # Everything up to site is interpreter startup, not ours
+        if module.strip() == 'site':
+            rows = []
+
+    return rows
+
+
+def startup_env():
+    # A throwaway home so runs neither read nor write the real ~/.spotifx
+    home = tempfile.mkdtemp(prefix='spotifx-bench-home-')
+    return dict(os.environ, HOME=home, USERPROFILE=home)
+
+
+def time_command(args, runs):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spotifx.py')
+    env = startup_env()
+    timings = []
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, script] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+        timings.append(time.perf_counter() - started)
+
+    return timings
+
+
+def bench_startup(args):
+    rows = import_profile()
+    total = next((cumulative for cumulative, _, module in rows if module.strip() == 'spotifx'), 0)
+
+    print(f"import spotifx: {total / 1000:.1f} ms cumulative\n")
+    print(f"{'module':<40} {'cumulative ms':>14} {'self ms':>10}")
+    for cumulative, self_us, module in sorted(rows, reverse=True)[1:args.top + 1]:
+        print(f"{module.strip()[:40]:<40} {cumulative / 1000:>14.1f} {self_us / 1000:>10.1f}")
+
+    print(f"\n{'command':<26} {'p50 ms':>10} {'p90 ms':>10} {'max ms':>10}")
+    for command in (['--version'], ['--status'], ['--status', '--json-progress']):
+        timings = time_command(command, args.runs)
+        print(f"{' '.join(command):<26} {percentile(timings, 50) * 1000:>10.1f} "
+              f"{percentile(timings, 90) * 1000:>10.1f} {max(timings) * 1000:>10.1f}")
+
+
+class BenchConfig(spotifx.ConfigManager):
+    # Default settings plus overrides, saved in the scenario's scratch
+    # directory so runs never read or write ~/.spotifx
+    def __init__(self, workdir, overrides=None):
+        self.config = configparser.ConfigParser()
+        self.config_file = os.path.join(workdir, 'config.ini')
+        self._create_default_config()
+
+        for (section, option), value in (overrides or {}).items():
+            self.config.set(section, option, str(value))
+
+
+class BenchYoutubeDL(yt_dlp.YoutubeDL):
+    # yt-dlp with only its edges replaced: searches and extractions answer
+    # from memory after a fixed delay, pointing at a sample stream on the
+    # media server, and ffprobe/ffmpeg are a copy. Format selection, the
+    # HTTP download with its progress hooks and the postprocessors (SpotiFX's
+    # tagging one included) are the real ones.
+    def __init__(self, params, fake):
+        super().__init__(params)
+        self.fake = fake
+
+    def extract_info(self, url, download=True, ie_key=None, extra_info=None, process=True, force_generic_extractor=False):
+        if url.startswith('ytsearch'):
+            count, query = url[len('ytsearch'):].split(':', 1)
+            time.sleep(self.fake.search_latency)
+
+            video_id = hashlib.md5(query.encode('utf-8')).hexdigest()[:10]
+            return {
+                '_type': 'playlist',
+                'id': query,
+                'entries': [
+                    {'_type': 'url', 'id': f"{video_id}{i}", 'url': f"{video_id}{i}", 'title': query,
+                     'duration': 180, 'view_count': 1000 - i}
+                    for i in range(int(count or 1))
+                ]
+            }
+
+        time.sleep(self.fake.resolve_latency)
+
+        # Labelled as an Opus stream so the conversion to the target format
+        # runs; the bytes are MP3 frames, which the copy keeps valid
+        info = {
+            'id': url,
+            'title': f"Bench video {url}",
+            'duration': 180,
+            'extractor': 'bench',
+            'extractor_key': 'Bench',
+            'webpage_url': f"{self.fake.media_url}{url}",
+            'formats': [{
+                'format_id': 'opus',
+                'url': f"{self.fake.media_url}{url}.mp3",
+                'ext': 'webm',
+                'acodec': 'opus',
+                'vcodec': 'none',
+                'abr': 128
+            }]
+        }
+
+        if not process:
+            return info
+
+        return self.process_ie_result(info, download=download)
+
+    def run_pp(self, pp, infodict):
+        if isinstance(pp, FFmpegPostProcessor):
+            pp.get_audio_codec = lambda path: 'opus'
+            pp.real_run_ffmpeg = fake_ffmpeg
+
+        return super().run_pp(pp, infodict)
+
+
+def fake_ffmpeg(input_path_opts, output_path_opts, **kwargs):
+    shutil.copyfile(input_path_opts[0][0], output_path_opts[0][0])
+    return ''
+
+
+class FakeYouTubeDownloader(spotifx.YouTubeDownloader):
+    # The real downloader on top of BenchYoutubeDL, so matching, the
+    # resolved-info cache, host slots, hedging and tagging all run; no
+    # YouTube access or ffmpeg is needed
+    def __init__(self, config, media_url, search_latency=0.05, resolve_latency=0.1):
+        super().__init__(config)
+        self.media_url = media_url
+        self.search_latency = search_latency
+        self.resolve_latency = resolve_latency
+
+    def _ydl(self, opts):
+        return BenchYoutubeDL(opts, self)
+
+
+class JobTimer:
+    # Download manager listener: queued-to-finished latency per job and the
+    # time the first job completed
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.queued = {}
+        self.latencies = []
+        self.first_completion = None
+        self.completed = 0
+        self.failed = 0
+
+    def __call__(self, event):
+        now = time.perf_counter()
+
+        with self.lock:
+            if event['event'] == 'queued':
+                self.queued.setdefault(event['id'], now)
+            elif event['status'] in spotifx.TERMINAL_STATUSES:
+                queued = self.queued.pop(event['id'], None)
+                if queued is not None:
+                    self.latencies.append(now - queued)
+
+                if event['status'] == 'completed':
+                    self.completed += 1
+                    if self.first_completion is None:
+                        self.first_completion = now - self.started
+                else:
+                    self.failed += 1
+
+
+def build_manager(base_url, args, cache_dir=None):
+    workdir = tempfile.mkdtemp(prefix='spotifx-bench-')
+    config = BenchConfig(workdir, {
+        ('General', 'download_dir'): os.path.join(workdir, 'downloads'),
+        ('General', 'concurrent_downloads'): args.workers,
+        ('General', 'adaptive_concurrency'): 'false',
+        ('General', 'engine'): args.engine,
+        ('General', 'prefetch_depth'): args.prefetch_depth,
+        ('YouTube', 'resolve_on_match'): args.resolve_on_match,
+        ('YouTube', 'hedge'): args.hedge,
+        # Loudness analysis runs ffmpeg itself
+        ('Audio', 'normalize_audio'): 'false',
+        ('Network', 'max_bandwidth'): args.max_bandwidth,
+        ('Network', 'max_connections_per_host'): args.host_connections
+    })
+    spotifx.bandwidth.configure(config)
+    spotifx.host_slots.configure(config)
+
+    spotify = make_bench_client(base_url + 'v1/', cache_dir)
+    youtube = FakeYouTubeDownloader(config, base_url + 'media/', args.search_latency, args.resolve_latency)
+    db = spotifx.DatabaseManager(os.path.join(workdir, 'database.json'))
+    library = spotifx.LibraryIndex(os.path.join(workdir, 'library.json'))
+    manager = spotifx.DownloadManager(spotify, youtube, db, config, library)
+
+    timer = JobTimer()
+    manager.add_listener(timer)
+
+    return manager, timer
+
+
+def counter_total(snapshot, name, **labels):
+    return sum(
+        series['value'] for series in snapshot['counters']
+        if series['name'] == name and all(series['labels'].get(key) == value for key, value in labels.items())
+    )
+
+
+def summarize(name, timer, elapsed, extra=None):
+    snapshot = spotifx.metrics.snapshot()
+    tracks = counter_total(snapshot, 'spotifx_tracks_downloaded_total')
+    stages = {
+        series['labels']['stage']: series['p50']
+        for series in snapshot['histograms'] if series['name'] == spotifx.STAGE_METRIC
+    }
+
+    result = {
+        'scenario': name,
+        'seconds': round(elapsed, 3),
+        'jobs_completed': timer.completed,
+        'jobs_failed': timer.failed,
+        'tracks': tracks,
+        'tracks_per_second': round(tracks / elapsed, 2) if elapsed else 0.0,
+        'first_completion': round(timer.first_completion, 3) if timer.first_completion is not None else None,
+        'latency_p50': round(percentile(timer.latencies, 50), 3) if timer.latencies else None,
+        'latency_p95': round(percentile(timer.latencies, 95), 3) if timer.latencies else None,
+        'latency_p99': round(percentile(timer.latencies, 99), 3) if timer.latencies else None,
+        'stage_p50': stages,
+        'spotify_lookups': counter_total(snapshot, 'spotifx_cache_requests_total'),
+        'cache_misses': counter_total(snapshot, 'spotifx_cache_requests_total', result='miss'),
+        'rate_limited': counter_total(snapshot, 'spotifx_rate_limited_total'),
+        'retries': counter_total(snapshot, 'spotifx_job_retries_total'),
+        'stragglers': counter_total(snapshot, 'spotifx_stragglers_total'),
+        'hedges_won': counter_total(snapshot, 'spotifx_hedges_total', outcome='hedge'),
+        'hedge_saved_seconds': round(sum(
+            series['sum'] for series in snapshot['histograms'] if series['name'] == 'spotifx_hedge_saved_seconds'
+        ), 3)
+    }
+    result.update(extra or {})
+
+    return result
+
+
+def scenario_single(base_url, args):
+    manager, timer = build_manager(base_url, args)
+    started = time.perf_counter()
+
+    try:
+        manager.queue_track('benchsingle', source='bench')
+        manager.wait_all(timeout=args.timeout)
+    finally:
+        manager.shutdown()
+
+    return summarize('single', timer, time.perf_counter() - started)
+
+
+def scenario_playlist(base_url, args):
+    manager, timer = build_manager(base_url, args)
+    started = time.perf_counter()
+
+    try:
+        manager.queue_playlist(f"benchlist{args.playlist_size}", source='bench')
+        manager.wait_all(timeout=args.timeout)
+    finally:
+        manager.shutdown()
+
+    return summarize('playlist', timer, time.perf_counter() - started, {'playlist_size': args.playlist_size})
+
+
+def scenario_batch(base_url, args):
+    # A large batch file through the same path as --batch; throughput is
+    # measured over a fixed window rather than waiting for every line
+    path = os.path.join(tempfile.mkdtemp(prefix='spotifx-bench-'), 'batch.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(args.batch_size):
+            f.write(f"https://open.spotify.com/track/benchbatch{i:07d}\n")
+
+    manager, timer = build_manager(base_url, args)
+    started = time.perf_counter()
+
+    try:
+        manager.queue_many(spotifx.read_batch_urls(path), source='bench')
+        ingest_seconds = time.perf_counter() - started
+        finished = manager.wait_all(timeout=max(0.0, args.duration - ingest_seconds))
+    finally:
+        elapsed = time.perf_counter() - started
+        manager.shutdown()
+
+    return summarize('batch', timer, elapsed, {
+        'batch_size': args.batch_size,
+        'ingest_seconds': round(ingest_seconds, 3),
+        'drained': finished
+    })
+
+
+def scenario_cache(base_url, args):
+    # Same tracks twice with one Spotify cache directory and fresh
+    # downloads, so the second pass shows what a warm cache saves
+    cache_dir = tempfile.mkdtemp(prefix='spotifx-bench-cache-')
+    passes = {}
+
+    for name in ('cold', 'warm'):
+        spotifx.metrics = spotifx.Metrics()
+        manager, timer = build_manager(base_url, args, cache_dir)
+        started = time.perf_counter()
+
+        try:
+            for i in range(args.cache_tracks):
+                manager.queue_track(f"benchcache{i:05d}", source='bench')
+            manager.wait_all(timeout=args.timeout)
+        finally:
+            manager.shutdown()
+
+        passes[name] = summarize(name, timer, time.perf_counter() - started)
+
+    result = dict(passes['warm'], scenario='cache')
+    result['cold_seconds'] = passes['cold']['seconds']
+    result['cold_cache_misses'] = passes['cold']['cache_misses']
+
+    return result
+
+
+SCENARIOS = {
+    'single': scenario_single,
+    'playlist': scenario_playlist,
+    'batch': scenario_batch,
+    'cache': scenario_cache
+}
+
+
+def _run_scenario(name, base_url, args, result_queue):
+    if not args.verbose:
+        spotifx.logger.logger.setLevel(logging.CRITICAL)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    result = SCENARIOS[name](base_url, args)
+
+    if args.tracemalloc:
+        result['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+    if resource:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+    result_queue.put(result)
+
+
+def run_scenario(name, base_url, args):
+    # Each scenario runs in its own process so peak memory is its own
+    result_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_scenario, args=(name, base_url, args, result_queue))
+    before = fake_service_stats(base_url)
+    process.start()
+
+    try:
+        result = result_queue.get()
+    finally:
+        process.join()
+
+    # spotipy retries 429s itself and only the last one reaches SpotiFX's
+    # counter, so the 429s column comes from the fake service
+    result['client_rate_limited'] = result['rate_limited']
+    result['rate_limited'] = fake_service_stats(base_url).get('rate_limited', 0) - before.get('rate_limited', 0)
+
+    return result
+
+
+def compare_results(results, baseline, tolerance):
+    # Regressions beyond the tolerance: throughput drops and p95 latency rises
+    regressions = []
+    previous = {result['scenario']: result for result in baseline}
+
+    for result in results:
+        before = previous.get(result['scenario'])
+        if not before:
+            continue
+
+        if before.get('tracks_per_second') and result['tracks_per_second'] < before['tracks_per_second'] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: throughput {before['tracks_per_second']} -> {result['tracks_per_second']} tracks/s")
+        if before.get('latency_p95') and result['latency_p95'] and result['latency_p95'] > before['latency_p95'] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p95 latency {before['latency_p95']} -> {result['latency_p95']} s")
+
+    return regressions
+
+
+def format_seconds(value):
+    return f"{value:.3f}" if value is not None else '-'
+
+
+def bench_scenarios(args):
+    names = args.only or list(SCENARIOS)
+    server, base_url = start_fake_services(args.latency, args.rate_limit, args.media_size, args.straggler_rate)
+    results = []
+
+    print(f"{args.latency * 1000:.0f} ms API latency, {args.search_latency * 1000:.0f} ms search latency, "
+          f"{args.rate_limit:.0%} rate limited, {args.media_size // 1024} KB per track, {args.workers} workers\n")
+    print(f"{'scenario':<10} {'seconds':>9} {'tracks':>7} {'tracks/s':>9} {'first':>7} {'p50':>7} {'p95':>7} "
+          f"{'p99':>7} {'429s':>5} {'retries':>7} {'rss MB':>7}")
+
+    try:
+        for name in names:
+            result = run_scenario(name, base_url, args)
+            results.append(result)
+
+            print(f"{name:<10} {result['seconds']:>9.2f} {result['tracks']:>7} {result['tracks_per_second']:>9.2f} "
+                  f"{format_seconds(result['first_completion']):>7} {format_seconds(result['latency_p50']):>7} "
+                  f"{format_seconds(result['latency_p95']):>7} {format_seconds(result['latency_p99']):>7} "
+                  f"{result['rate_limited']:>5} {result['retries']:>7} {result.get('peak_rss_mb', '-'):>7}")
+    finally:
+        server.terminate()
+
+    print()
+    for result in results:
+        stages = sorted(result['stage_p50'].items(), key=lambda stage: stage[1], reverse=True)[:4]
+        details = ', '.join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in stages)
+        print(f"{result['scenario']:<10} stage p50: {details or '-'}")
+
+        if result['scenario'] == 'batch':
+            print(f"{'':<10} ingest {result['ingest_seconds']:.2f} s for {result['batch_size']} lines")
+        elif result['scenario'] == 'cache':
+            print(f"{'':<10} cold {result['cold_seconds']:.2f} s with {result['cold_cache_misses']} misses, "
+                  f"warm {result['seconds']:.2f} s with {result['cache_misses']} misses")
+        if result['stragglers']:
+            print(f"{'':<10} {result['stragglers']} stragglers, {result['hedges_won']} won by the hedge, "
+                  f"{result['hedge_saved_seconds']:.1f} s saved")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+
+        if regressions:
+            print(f"\nRegressions against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+
+        print(f"\nNo regressions against {args.compare}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SpotiFX benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    scheduler = subparsers.add_parser('scheduler', help='Simulate time-to-start of small jobs queued behind giant ones')
+    scheduler.add_argument('--workers', type=int, default=3)
+    scheduler.add_argument('--giant-jobs', type=int, default=4)
+    scheduler.add_argument('--giant-tracks', type=int, default=5000)
+    scheduler.add_argument('--small-jobs', type=int, default=200)
+    scheduler.add_argument('--horizon', type=float, default=2000.0)
+    scheduler.add_argument('--seed', type=int, default=1)
+    scheduler.set_defaults(func=bench_scheduler)
+
+    engines = subparsers.add_parser('engines', help='Compare thread and asyncio engines on metadata lookups against a local fake Spotify API')
+    engines.add_argument('--tracks', type=int, default=1000)
+    engines.add_argument('--latency', type=float, default=0.05)
+    engines.add_argument('--thread-workers', type=int, nargs='+', default=[3, 50])
+    engines.add_argument('--lookups', type=int, default=200)
+    engines.set_defaults(func=bench_engines)
+
+    startup = subparsers.add_parser('startup', help='Measure cold-start import time and quick CLI commands')
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--top', type=int, default=10)
+    startup.set_defaults(func=bench_startup)
+
+    scenarios = subparsers.add_parser('scenarios', help='Run end-to-end download scenarios against local fake Spotify and YouTube services')
+    scenarios.add_argument('--only', nargs='+', choices=list(SCENARIOS))
+    scenarios.add_argument('--workers', type=int, default=3)
+    scenarios.add_argument('--engine', choices=[spotifx.ENGINE_THREADS, spotifx.ENGINE_ASYNCIO], default=spotifx.ENGINE_THREADS)
+    scenarios.add_argument('--latency', type=float, default=0.05)
+    scenarios.add_argument('--search-latency', type=float, default=0.05)
+    scenarios.add_argument('--resolve-latency', type=float, default=0.1, help='Time for one full video extraction')
+    scenarios.add_argument('--no-resolve-on-match', dest='resolve_on_match', action='store_false',
+                           help='Extract again at download time instead of reusing the match-phase info')
+    scenarios.add_argument('--rate-limit', type=float, default=0.0, help='Fraction of API requests answered with 429')
+    scenarios.add_argument('--media-size', type=int, default=512 * 1024)
+    scenarios.add_argument('--straggler-rate', type=float, default=0.0, help='Fraction of media downloads that trickle out slowly')
+    scenarios.add_argument('--hedge', choices=[spotifx.HEDGE_RESTART, spotifx.HEDGE_ALTERNATE, spotifx.HEDGE_OFF],
+                           default=spotifx.HEDGE_OFF, help='What to do about straggling downloads')
+    scenarios.add_argument('--max-bandwidth', default='0', help="Shared download budget, e.g. 2M (bytes per second, 0 = unlimited)")
+    scenarios.add_argument('--host-connections', type=int, default=0, help='Connections per host (0 = unlimited)')
+    scenarios.add_argument('--prefetch-depth', type=int, default=spotifx.PREFETCH_DEPTH, help='Upcoming track jobs to resolve ahead (0 = off)')
+    scenarios.add_argument('--playlist-size', type=int, default=500)
+    scenarios.add_argument('--batch-size', type=int, default=50000)
+    scenarios.add_argument('--cache-tracks', type=int, default=50)
+    scenarios.add_argument('--duration', type=float, default=60.0, help='Measurement window for the batch scenario')
+    scenarios.add_argument('--timeout', type=float, default=600.0)
+    scenarios.add_argument('--tracemalloc', action='store_true', help='Also report the tracemalloc peak (slower)')
+    scenarios.add_argument('--json', metavar='FILE', help='Save results as JSON')
+    scenarios.add_argument('--compare', metavar='FILE', help='Exit 1 if results regress against a saved run')
+    scenarios.add_argument('--tolerance', type=float, default=0.2)
+    scenarios.add_argument('-v', '--verbose', action='store_true')
+    scenarios.set_defaults(func=bench_scenarios)
+
+    args = parser.parse_args()
+
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,651 @@
+"""
+SpotiFX unit tests
+
+Scheduling, retries, leases, deduplication, cancellation, playlist sync and
+the local API, against stand-ins for Spotify and YouTube. No network access,
+ffmpeg or credentials are needed.
+
+    python -m pytest -q test_spotifx.py
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+import configparser
+import http.client
+
+import pytest
+
+import spotifx
+
+
+class StubSpotify:
+    # Playlists by ID; counts the calls a sync is meant to avoid
+    def __init__(self, playlists=None):
+        self.playlists = playlists or {}
+        self.playlist_fetches = 0
+
+    def cached_track_ids(self, item_type, spotify_id):
+        return None
+
+    def get_playlist_snapshot(self, playlist_id):
+        return self.playlists[playlist_id]['snapshot_id']
+
+    def get_playlist(self, playlist_id, use_cache=True):
+        self.playlist_fetches += 1
+        return self.playlists[playlist_id]
+
+
+class StubYouTube:
+    # Every track matches, every download writes a small file
+    loudness = None
+
+    def __init__(self):
+        self.downloaded = []
+
+    def find_best_match(self, track):
+        return {'id': f"yt-{track['id']}"}
+
+    def download_audio(self, video_url, output_path=None, metadata=None, progress=None, alternates=None):
+        with open(output_path, 'wb') as f:
+            f.write(b'audio')
+
+        self.downloaded.append(video_url)
+        return output_path
+
+
+class ScratchConfig(spotifx.ConfigManager):
+    # Default settings saved in the test's scratch directory, never ~/.spotifx
+    def __init__(self, workdir):
+        self.config = configparser.ConfigParser()
+        self.config_file = os.path.join(workdir, 'config.ini')
+        self._create_default_config()
+
+        self.config.set('General', 'download_dir', os.path.join(workdir, 'downloads'))
+        self.config.set('General', 'adaptive_concurrency', 'false')
+        self.config.set('General', 'prefetch_depth', '0')
+        self.config.set('Audio', 'normalize_audio', 'false')
+
+
+class IdleManager(spotifx.DownloadManager):
+    # No worker threads: tests claim and run jobs themselves
+    def resize_workers(self, count):
+        self.max_concurrent = count
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    managers = []
+
+    def make(queue_items=None, spotify=None, youtube=None):
+        db_file = os.path.join(tmp_path, 'database.json')
+        if queue_items is not None:
+            with open(db_file, 'w', encoding='utf-8') as f:
+                json.dump({'queue': queue_items}, f)
+
+        manager = IdleManager(
+            spotify or StubSpotify(),
+            youtube or StubYouTube(),
+            spotifx.DatabaseManager(db_file, save_interval=0),
+            ScratchConfig(str(tmp_path)),
+            spotifx.LibraryIndex(os.path.join(tmp_path, 'library.json'), save_interval=0)
+        )
+        managers.append(manager)
+        return manager
+
+    yield make
+
+    for manager in managers:
+        manager.shutdown()
+
+
+@pytest.fixture
+def manager(make_manager):
+    return make_manager()
+
+
+def claim_next(manager):
+    item_id, task_type, task_data = manager.download_queue.get_nowait()
+    assert manager._claim_job(item_id)
+    return item_id
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# Scheduler
+
+def drain(scheduler):
+    tasks = []
+    while True:
+        try:
+            tasks.append(scheduler.get_nowait())
+        except queue.Empty:
+            return tasks
+
+
+def test_scheduler_serves_higher_priority_first():
+    scheduler = spotifx.JobScheduler()
+    scheduler.put('low', priority='low')
+    scheduler.put('normal')
+    scheduler.put('high', priority='high')
+
+    assert drain(scheduler) == ['high', 'normal', 'low']
+
+
+def test_scheduler_keeps_fifo_order_within_a_source():
+    scheduler = spotifx.JobScheduler()
+    for i in range(5):
+        scheduler.put(i, source='cli')
+
+    assert drain(scheduler) == [0, 1, 2, 3, 4]
+
+
+def test_scheduler_shares_turns_between_sources():
+    scheduler = spotifx.JobScheduler()
+    for i in range(4):
+        scheduler.put(f"bulk{i}", source='batch')
+    scheduler.put('user0', source='api')
+    scheduler.put('user1', source='api')
+
+    assert drain(scheduler) == ['bulk0', 'user0', 'bulk1', 'user1', 'bulk2', 'bulk3']
+
+
+def test_scheduler_gives_a_late_source_the_next_turn():
+    scheduler = spotifx.JobScheduler()
+    for i in range(100):
+        scheduler.put(f"bulk{i}", source='batch')
+
+    assert [scheduler.get_nowait() for _ in range(10)] == [f"bulk{i}" for i in range(10)]
+
+    scheduler.put('user', source='api')
+    assert scheduler.get_nowait() == 'user'
+
+
+def test_scheduler_holds_delayed_tasks_until_due():
+    scheduler = spotifx.JobScheduler()
+    scheduler.put('later', delay=0.2)
+
+    with pytest.raises(queue.Empty):
+        scheduler.get_nowait()
+
+    assert scheduler.get(timeout=2) == 'later'
+
+
+def test_scheduler_reports_waiting_work_of_other_sources():
+    scheduler = spotifx.JobScheduler()
+    scheduler.put(('a', 'playlist', {}), source='batch')
+    assert not scheduler.has_waiting('normal', 'batch')
+
+    scheduler.put(('b', 'track', {}), source='api')
+    assert scheduler.has_waiting('normal', 'batch')
+    assert not scheduler.has_waiting('high', 'api')
+
+
+def test_scheduler_remove_drops_tasks_and_their_count():
+    scheduler = spotifx.JobScheduler()
+    scheduler.put(('a', 'track', {}))
+    scheduler.put(('b', 'track', {}), delay=60)
+    scheduler.put(('c', 'track', {}))
+
+    assert scheduler.remove({'a', 'b'}) == 2
+    assert drain(scheduler) == [('c', 'track', {})]
+    assert scheduler.unfinished_tasks == 1
+
+
+# Retry classification
+
+def http_error(status, headers=None):
+    response = spotifx.requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return spotifx.requests.exceptions.HTTPError(f"{status} error", response=response)
+
+
+@pytest.mark.parametrize('error, expected', [
+    (spotifx.NoMatchError('no match'), (spotifx.ERROR_NO_MATCH, None)),
+    (http_error(429, {'Retry-After': '7'}), (spotifx.ERROR_RATE_LIMIT, 7.0)),
+    (http_error(429, {'Retry-After': 'soon'}), (spotifx.ERROR_RATE_LIMIT, None)),
+    (http_error(503), (spotifx.ERROR_TRANSIENT, None)),
+    (http_error(404), (spotifx.ERROR_PERMANENT, None)),
+    (ConnectionResetError('reset by peer'), (spotifx.ERROR_TRANSIENT, None)),
+    (TimeoutError(), (spotifx.ERROR_TRANSIENT, None)),
+    (spotifx.requests.exceptions.ConnectionError('refused'), (spotifx.ERROR_TRANSIENT, None)),
+    (Exception('HTTP Error 429: Too Many Requests'), (spotifx.ERROR_RATE_LIMIT, None)),
+    (Exception('Video unavailable'), (spotifx.ERROR_PERMANENT, None)),
+])
+def test_classify_error(error, expected):
+    assert spotifx.classify_error(error) == expected
+
+
+def test_classify_error_reads_spotify_status_and_headers():
+    error = spotifx.spotipy.exceptions.SpotifyException(429, -1, 'rate limited', headers={'Retry-After': '3'})
+    assert spotifx.classify_error(error) == (spotifx.ERROR_RATE_LIMIT, 3.0)
+
+    error = spotifx.spotipy.exceptions.SpotifyException(502, -1, 'bad gateway')
+    assert spotifx.classify_error(error) == (spotifx.ERROR_TRANSIENT, None)
+
+
+def test_retry_delay_backs_off_with_jitter_and_honours_retry_after(manager):
+    for attempt in range(1, 5):
+        full = spotifx.RETRY_BASE_DELAY * 2 ** (attempt - 1)
+        assert full / 2 <= manager._retry_delay(spotifx.ERROR_TRANSIENT, attempt) <= full
+
+    assert manager._retry_delay(spotifx.ERROR_RATE_LIMIT, 1) >= spotifx.RATE_LIMIT_BASE_DELAY / 2
+    assert manager._retry_delay(spotifx.ERROR_RATE_LIMIT, 1, retry_after=12) == 12
+    assert manager._retry_delay(spotifx.ERROR_RATE_LIMIT, 1, retry_after=10 ** 6) == spotifx.RETRY_MAX_DELAY
+
+
+def test_transient_failure_is_retried_until_attempts_run_out(manager):
+    handle = manager.queue_track('track1')
+
+    for attempt in range(1, spotifx.MAX_RETRY_COUNT + 1):
+        manager.db.update_queue_item(handle.id, {'status': 'downloading'})
+        manager._handle_failure(handle.id, ConnectionResetError('reset by peer'))
+
+        item = manager.db.get_queue_item(handle.id)
+        assert item['status'] == 'retrying'
+        assert item['attempts'] == attempt
+        assert item['next_retry_at'] > time.time()
+
+    manager.db.update_queue_item(handle.id, {'status': 'downloading'})
+    manager._handle_failure(handle.id, ConnectionResetError('reset by peer'))
+
+    item = manager.db.get_queue_item(handle.id)
+    assert item['status'] == 'failed'
+    assert item['dead_letter']
+    assert handle.done()
+
+
+def test_permanent_failure_fails_at_once(manager):
+    handle = manager.queue_track('track1')
+    manager.db.update_queue_item(handle.id, {'status': 'downloading'})
+
+    manager._handle_failure(handle.id, http_error(404))
+
+    item = manager.db.get_queue_item(handle.id)
+    assert item['status'] == 'failed'
+    assert item['error_kind'] == spotifx.ERROR_PERMANENT
+    assert 'attempts' not in item
+
+
+# Leases
+
+def downloading_item(item_id, owner, lease_expires_at):
+    return {
+        'id': item_id, 'type': 'track', 'spotify_id': f"sp-{item_id}", 'status': 'downloading',
+        'priority': 'normal', 'source': 'default', 'lease_owner': owner, 'lease_expires_at': lease_expires_at
+    }
+
+
+def test_restart_resumes_downloads_whose_lease_expired(make_manager):
+    manager = make_manager([
+        downloading_item('stale', 'old-instance', time.time() - 10),
+        downloading_item('live', 'other-instance', time.time() + 600)
+    ])
+
+    stale = manager.db.get_queue_item('stale')
+    assert stale['status'] == 'pending'
+    assert stale['note'] == 'Resumed after restart'
+    assert manager.download_queue.peek(5) == [('stale', 'track', {'spotify_id': 'sp-stale'})]
+
+    assert manager.db.get_queue_item('live')['status'] == 'downloading'
+
+
+def test_lease_monitor_reclaims_expired_leases(make_manager, monkeypatch):
+    monkeypatch.setattr(spotifx, 'LEASE_CHECK_INTERVAL', 0.05)
+    manager = make_manager([downloading_item('live', 'other-instance', time.time() + 0.3)])
+
+    assert manager.db.get_queue_item('live')['status'] == 'downloading'
+    assert wait_for(lambda: manager.db.get_queue_item('live')['status'] == 'pending')
+
+    item = manager.db.get_queue_item('live')
+    assert item['note'] == 'Reclaimed after lease expired'
+    assert item['lease_owner'] is None
+    assert manager.download_queue.peek(5) == [('live', 'track', {'spotify_id': 'sp-live'})]
+
+
+def test_lease_monitor_renews_leases_of_live_local_jobs(make_manager, monkeypatch):
+    monkeypatch.setattr(spotifx, 'LEASE_CHECK_INTERVAL', 0.05)
+    manager = make_manager()
+    handle = manager.queue_track('track1')
+    item_id = claim_next(manager)
+
+    # Our worker is alive but has not heartbeated in a while
+    release = threading.Event()
+    worker = threading.Thread(target=release.wait)
+    worker.start()
+    manager.job_threads[item_id] = worker
+    manager.lease_renewals[item_id] = 0
+    manager.db.update_queue_item(item_id, {'lease_expires_at': time.time() - 1})
+
+    try:
+        assert wait_for(lambda: manager.db.get_queue_item(item_id)['lease_expires_at'] > time.time())
+        assert manager.db.get_queue_item(handle.id)['status'] == 'downloading'
+    finally:
+        release.set()
+        worker.join()
+
+
+def test_claim_fails_for_jobs_already_claimed(manager):
+    handle = manager.queue_track('track1')
+    assert manager._claim_job(handle.id)
+    assert not manager._claim_job(handle.id)
+
+    item = manager.db.get_queue_item(handle.id)
+    assert item['lease_owner'] == manager.instance_id
+    assert item['lease_expires_at'] > time.time()
+
+
+# Deduplication
+
+def test_repeat_request_attaches_to_the_queued_job(manager):
+    first = manager.queue_track('track1')
+    second = manager.queue_track('https://open.spotify.com/track/track1')
+
+    assert second is first
+    assert len(manager.db.get_queue()) == 1
+    assert manager.download_queue.qsize() == 1
+
+
+def test_repeat_request_can_raise_priority(manager):
+    handle = manager.queue_track('track1', priority='low')
+    manager.queue_track('track1', priority='high')
+
+    assert manager.db.get_queue_item(handle.id)['priority'] == 'high'
+    assert manager.download_queue.qsize() == 1
+
+    manager.queue_track('track1', priority='low')
+    assert manager.db.get_queue_item(handle.id)['priority'] == 'high'
+
+
+def test_track_request_attaches_to_a_playlist_that_covers_it(manager):
+    playlist = manager.queue_playlist('list1')
+    manager._cover_tracks(playlist.id, ['track1', 'track2'])
+
+    assert manager.queue_track('track2') is playlist
+    assert manager.queue_track('track3') is not playlist
+
+
+def test_sync_run_is_kept_apart_from_a_plain_download(manager):
+    plain = manager.queue_playlist('list1')
+    sync = manager.queue_playlist('list1', sync=True)
+
+    assert sync is not plain
+    assert manager.queue_playlist('list1', sync=True) is sync
+
+
+def test_finished_job_no_longer_takes_repeat_requests(manager):
+    first = manager.queue_track('track1')
+    manager.db.update_queue_item(first.id, {'status': 'completed'})
+
+    assert first.done()
+    assert manager.queue_track('track1') is not first
+
+
+def test_batch_counts_duplicates_within_and_across_requests(manager):
+    queued = manager.queue_track('track1')
+    lines = [
+        'https://open.spotify.com/track/track1',
+        'https://open.spotify.com/track/track2',
+        'https://open.spotify.com/track/track2',
+        'spotify:album:album1',
+        'not a url'
+    ]
+
+    counts, handles = manager.queue_many(lines)
+
+    assert counts == {'track': 1, 'album': 1, 'playlist': 0, 'unknown': 1, 'duplicate': 2}
+    assert queued in handles
+    assert len(handles) == 3
+    assert len(manager.db.get_queue()) == 3
+
+
+# Cancel and complete
+
+def test_cancel_pending_job_leaves_the_scheduler(manager):
+    handle = manager.queue_track('track1')
+
+    assert manager.cancel_download(handle.id[:8])
+    assert manager.download_queue.qsize() == 0
+    assert handle.done()
+    assert handle.item['status'] == 'canceled'
+    assert manager.cancel_tokens == {}
+
+
+def test_cancel_signals_only_jobs_running_here(make_manager):
+    manager = make_manager([downloading_item('remote', 'other-instance', time.time() + 600)])
+    handle = manager.queue_track('track1')
+    item_id = claim_next(manager)
+    token = manager.cancel_tokens[item_id]
+
+    canceled = manager.cancel_many()
+
+    assert sorted(canceled) == sorted([handle.id, 'remote'])
+    assert token.is_set()
+    assert list(manager.cancel_tokens) == [item_id]
+    with pytest.raises(spotifx.JobCanceled):
+        manager._check_job(item_id)
+
+
+def test_cancel_skips_finished_jobs(manager):
+    handle = manager.queue_track('track1')
+    manager.db.update_queue_item(handle.id, {'status': 'completed'})
+
+    assert not manager.cancel_download(handle.id)
+    assert manager.db.get_queue_item(handle.id)['status'] == 'completed'
+
+
+def test_canceled_job_cannot_complete(manager):
+    handle = manager.queue_track('track1')
+    item_id = claim_next(manager)
+    manager.cancel_download(item_id)
+
+    with pytest.raises(spotifx.JobCanceled):
+        manager._complete_job(item_id, {'progress': 100})
+
+    assert manager.db.get_queue_item(item_id)['status'] == 'canceled'
+    assert handle.item['status'] == 'canceled'
+
+
+def test_job_canceled_while_downloading_is_noted(manager):
+    handle = manager.queue_track('track1')
+    item_id = claim_next(manager)
+
+    def download(item_id, task_data, **resolved):
+        manager.cancel_download(item_id)
+        manager._check_job(item_id)
+
+    manager._download_track = download
+    manager._run_task(item_id, 'track', {'spotify_id': 'track1'})
+
+    item = manager.db.get_queue_item(handle.id)
+    assert item['status'] == 'canceled'
+    assert item['note'] == 'Canceled while downloading'
+    assert manager.cancel_tokens == {}
+
+
+def test_reclaimed_job_is_not_noted_as_canceled(manager):
+    handle = manager.queue_track('track1')
+    item_id = claim_next(manager)
+
+    def download(item_id, task_data, **resolved):
+        # The lease lapsed mid-download and another worker's claim is pending
+        manager.db.transition_queue_item(item_id, ('downloading',), {'status': 'pending', 'lease_owner': None})
+        manager._complete_job(item_id, {'progress': 100})
+
+    manager._download_track = download
+    manager._run_task(item_id, 'track', {'spotify_id': 'track1'})
+
+    item = manager.db.get_queue_item(handle.id)
+    assert item['status'] == 'pending'
+    assert 'note' not in item
+    assert not handle.done()
+
+
+# Playlist sync
+
+def playlist(playlist_id, snapshot_id, track_ids):
+    return {
+        'id': playlist_id,
+        'name': f"Playlist {playlist_id}",
+        'snapshot_id': snapshot_id,
+        'owner': {'display_name': 'Owner'},
+        'tracks': {'items': [
+            {'track': {'id': track_id, 'name': f"Song {track_id}", 'artists': [{'name': 'Artist'}], 'album': {}}}
+            for track_id in track_ids
+        ]}
+    }
+
+
+def run_sync(manager, playlist_id):
+    handle = manager.queue_playlist(playlist_id, sync=True)
+    item_id, task_type, task_data = manager.download_queue.get_nowait()
+    assert manager._claim_job(item_id)
+
+    manager._run_task(item_id, task_type, task_data)
+    return manager.db.get_queue_item(handle.id)
+
+
+def test_sync_skips_a_playlist_whose_snapshot_is_unchanged(make_manager):
+    spotify = StubSpotify({'list1': playlist('list1', 'snap1', ['a', 'b'])})
+    youtube = StubYouTube()
+    manager = make_manager(spotify=spotify, youtube=youtube)
+
+    first = run_sync(manager, 'list1')
+    assert first['status'] == 'completed'
+    assert sorted(youtube.downloaded) == ['yt-a', 'yt-b']
+
+    second = run_sync(manager, 'list1')
+    assert second['status'] == 'completed'
+    assert second['note'] == 'Playlist unchanged since last sync'
+    assert spotify.playlist_fetches == 1
+    assert len(youtube.downloaded) == 2
+
+
+def test_sync_fetches_only_tracks_added_since_the_last_snapshot(make_manager):
+    spotify = StubSpotify({'list1': playlist('list1', 'snap1', ['a', 'b'])})
+    youtube = StubYouTube()
+    manager = make_manager(spotify=spotify, youtube=youtube)
+    run_sync(manager, 'list1')
+
+    spotify.playlists['list1'] = playlist('list1', 'snap2', ['b', 'c'])
+    item = run_sync(manager, 'list1')
+
+    assert item['status'] == 'completed'
+    assert youtube.downloaded == ['yt-a', 'yt-b', 'yt-c']
+
+    manifest = manager.db.get_playlist_manifest('list1')
+    assert manifest['snapshot_id'] == 'snap2'
+    # Not pruned, so the removed track stays known for a later --prune
+    assert sorted(manifest['tracks']) == ['a', 'b', 'c']
+
+
+def test_sync_downloads_again_when_a_synced_file_is_gone(make_manager):
+    spotify = StubSpotify({'list1': playlist('list1', 'snap1', ['a', 'b'])})
+    youtube = StubYouTube()
+    manager = make_manager(spotify=spotify, youtube=youtube)
+    run_sync(manager, 'list1')
+
+    os.remove(manager.db.get_playlist_manifest('list1')['tracks']['a'])
+    item = run_sync(manager, 'list1')
+
+    assert item['status'] == 'completed'
+    assert spotify.playlist_fetches == 2
+    assert os.path.exists(manager.db.get_playlist_manifest('list1')['tracks']['a'])
+
+
+# Local API
+
+class StubApp:
+    def __init__(self, manager):
+        self.download_manager = manager
+        self.db = manager.db
+
+
+@pytest.fixture
+def make_api(manager):
+    servers = []
+
+    def make(host='127.0.0.1', token=''):
+        api = spotifx.ApiServer(StubApp(manager), host=host, port=0, token=token)
+        api.start()
+        servers.append(api)
+        return api
+
+    yield make
+
+    for api in servers:
+        api.stop()
+
+
+def api_request(api, method, path, headers=None, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', api.server.server_address[1], timeout=5)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'{}')
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('headers, status', [
+    ({}, 200),
+    ({'Host': 'localhost:8765'}, 200),
+    ({'Origin': 'http://localhost:3000'}, 200),
+    ({'Origin': 'http://127.0.0.1:8765'}, 200),
+    ({'Origin': 'https://evil.example'}, 403),
+    ({'Origin': 'null'}, 403),
+    ({'Host': 'evil.example'}, 403),
+    ({'Host': 'evil.example:8765', 'Origin': 'http://evil.example:8765'}, 403),
+])
+def test_api_refuses_requests_from_other_origins_and_hosts(make_api, headers, status):
+    api = make_api()
+    assert api_request(api, 'GET', '/api/status', headers)[0] == status
+
+
+def test_api_refused_requests_change_nothing(make_api, manager):
+    api = make_api()
+    body = json.dumps({'url': 'https://open.spotify.com/track/track1'})
+
+    status, _ = api_request(api, 'POST', '/api/queue', {'Origin': 'https://evil.example', 'Content-Type': 'application/json'}, body)
+
+    assert status == 403
+    assert manager.db.get_queue() == []
+
+
+def test_api_only_takes_json_bodies(make_api, manager):
+    api = make_api()
+    body = json.dumps({'url': 'https://open.spotify.com/track/track1'})
+
+    assert api_request(api, 'POST', '/api/queue', {'Content-Type': 'text/plain'}, body)[0] == 415
+    assert manager.db.get_queue() == []
+
+    status, reply = api_request(api, 'POST', '/api/queue', {'Content-Type': 'application/json'}, body)
+    assert status == 202
+    assert reply['type'] == 'track'
+    assert manager.db.get_queue_item(reply['id'])['spotify_id'] == 'track1'
+
+
+def test_api_checks_the_token_when_set(make_api):
+    api = make_api(token='secret')
+
+    assert api_request(api, 'GET', '/api/status')[0] == 401
+    assert api_request(api, 'GET', '/api/status', {'Authorization': 'Bearer wrong'})[0] == 401
+    assert api_request(api, 'GET', '/api/status', {'Authorization': 'Bearer secret'})[0] == 200
+
+
+def test_api_on_a_public_bind_accepts_any_host(make_api):
+    api = make_api(host='0.0.0.0', token='secret')
+    headers = {'Host': 'nas.local:8765', 'Authorization': 'Bearer secret'}
+
+    assert api_request(api, 'GET', '/api/status', headers)[0] == 200
+    assert api_request(api, 'GET', '/api/status', dict(headers, Origin='https://evil.example'))[0] == 403